@@ -0,0 +1,344 @@
+import json
+import argparse
+import gzip
+import sys
+import threading
+import io
+import ipaddress
+import codecs
+import urllib.request
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from target_set import BloomFilter, PackedHashSet
+from bt_backup import TorrentRecord
+from qb_client import connect
+
+# 设置控制台输出编码为UTF-8
+if sys.platform.startswith('win'):
+    try:
+        import codecs
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer)
+    except (AttributeError, io.UnsupportedOperation):
+        pass  # 如果无法设置编码，保持默认设置
+
+DEFAULT_PORT = 8765
+DEFAULT_HOST = "127.0.0.1"
+
+# 等待首次同步种子列表的最长时间（秒）
+READY_TIMEOUT = 120
+
+# 目标数量超过该值时改为发送布隆过滤器
+BLOOM_THRESHOLD = 5000
+
+# sync_maindata 中索引需要保留的字段
+INDEX_FIELDS = ("name", "size", "save_path", "content_path", "tags", "category", "progress")
+
+class AgentIndex:
+    """运行在种子服务器旁的种子索引
+
+    通过 sync_maindata 增量更新保持索引常驻内存；使用 snapshot 时从 JSON 快照加载，
+    不需要 qBittorrent，可作为本地替身测试完整流程。
+    """
+
+    def __init__(self, server_config=None, snapshot=None, refresh_interval=30,
+                 throttle_settings=None, keep_shared_payload=False):
+        self.server_config = server_config
+        self.snapshot = snapshot
+        self.refresh_interval = refresh_interval
+        self.throttle_settings = throttle_settings
+        self.keep_shared_payload = keep_shared_payload
+        self.torrents = {}
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self.qb = None
+
+    def start(self):
+        if self.snapshot:
+            with open(self.snapshot, "r", encoding="utf-8") as f:
+                for torrent in json.load(f):
+                    self.torrents[torrent["hash"]] = {k: torrent.get(k) for k in INDEX_FIELDS}
+            self.ready.set()
+            return
+        self.qb = connect(self.server_config)
+        threading.Thread(target=self._sync_loop, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _sync_loop(self):
+        rid = 0
+        while not self._stop.is_set():
+            try:
+                data = self.qb.sync_maindata(rid=rid)
+                rid = data.get("rid", 0)
+                with self.lock:
+                    if data.get("full_update"):
+                        self.torrents = {}
+                    for torrent_hash, changes in (data.get("torrents") or {}).items():
+                        entry = self.torrents.setdefault(torrent_hash, {})
+                        entry.update({k: v for k, v in changes.items() if k in INDEX_FIELDS})
+                    for torrent_hash in data.get("torrents_removed") or []:
+                        self.torrents.pop(torrent_hash, None)
+                self.ready.set()
+            except Exception as e:
+                print(f"同步种子列表时发生错误: {str(e)}")
+                rid = 0
+            self._stop.wait(self.refresh_interval)
+
+    def _records(self):
+        with self.lock:
+            return [TorrentRecord(hash=h, **entry) for h, entry in self.torrents.items()]
+
+    def _content_index(self, records):
+        if self.qb is None:
+            return None
+        from content_index import ContentIndex
+        return ContentIndex(self.qb, records)
+
+    def _wait_ready(self):
+        if not self.ready.wait(READY_TIMEOUT):
+            raise RuntimeError(f"种子列表在 {READY_TIMEOUT} 秒内未完成同步")
+
+    def match(self, names=None, hashes=None, bloom=None, key="name", packed_hashes=None):
+        """返回命中的种子及可释放空间"""
+        self._wait_ready()
+        records = self._records()
+        if bloom is not None:
+            bloom = BloomFilter.from_dict(bloom)
+            matched = [r for r in records if (r.name if key == "name" else r.hash) in bloom]
+        elif packed_hashes is not None:
+            hash_set = PackedHashSet.from_base64(packed_hashes)
+            matched = [r for r in records if r.hash in hash_set]
+        else:
+            names = set(names or [])
+            hashes = set(hashes or [])
+            matched = [r for r in records if r.name in names or r.hash in hashes]
+
+        index = self._content_index(records) if matched else None
+        removed = set()
+        result = []
+        for record in matched:
+            freed = index.freed_by(record.hash, removed) if index else record.size
+            removed.add(record.hash)
+            result.append({"hash": record.hash, "name": record.name, "size": record.size, "freed": freed})
+        return {
+            "matches": result,
+            "count": len(result),
+            "bytes": sum(r["freed"] for r in result)
+        }
+
+    def delete(self, hashes):
+        """删除给定的种子
+
+        返回 {"deleted": 已删除的 hash 列表, "delete_files": {hash: 是否同时删除了文件}, "failed": {hash: 错误信息}}；
+        单个种子删除失败不影响其余种子，已删除的种子同样会从索引中移除。
+        """
+        self._wait_ready()
+        hashes = [h for h in hashes if h in self.torrents]
+        if self.qb is None:
+            with self.lock:
+                for torrent_hash in hashes:
+                    self.torrents.pop(torrent_hash, None)
+            return {"deleted": hashes, "delete_files": {h: True for h in hashes}, "failed": {}}
+
+        from delete_throttle import DeletionThrottle
+        from content_index import save_files_cache
+        records = self._records()
+        index = self._content_index(records)
+        by_hash = {r.hash: r for r in records}
+        throttle = DeletionThrottle(self.throttle_settings, self.server_config.get("name", ""))
+        removed = set()
+        deleted = []
+        delete_files_by_hash = {}
+        failed = {}
+        try:
+            for torrent_hash in hashes:
+                removed.add(torrent_hash)
+                try:
+                    delete_files = not self.keep_shared_payload or index.can_delete_files(torrent_hash, removed)
+                    record = by_hash[torrent_hash]
+                    throttle.delete(self.qb, torrent_hash, record.size, record.content_path, delete_files)
+                except Exception as e:
+                    # 未删除的种子仍然引用共享的文件
+                    removed.discard(torrent_hash)
+                    failed[torrent_hash] = str(e)
+                    print(f"删除种子 {torrent_hash} 时发生错误: {str(e)}")
+                    continue
+                deleted.append(torrent_hash)
+                delete_files_by_hash[torrent_hash] = delete_files
+        finally:
+            throttle.close()
+            save_files_cache()
+            with self.lock:
+                for torrent_hash in deleted:
+                    self.torrents.pop(torrent_hash, None)
+        return {"deleted": deleted, "delete_files": delete_files_by_hash, "failed": failed}
+
+def make_handler(index, token):
+    class AgentHandler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body)
+                self.send_response(status)
+                self.send_header("Content-Encoding", "gzip")
+            else:
+                self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _authorized(self):
+            if token and self.headers.get("Authorization") != f"Bearer {token}":
+                self._send(401, {"error": "unauthorized"})
+                return False
+            return True
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            return json.loads(body or b"{}")
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            if self.path == "/status":
+                self._send(200, {"ready": index.ready.is_set(), "torrents": len(index.torrents)})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            try:
+                payload = self._read_json()
+                if self.path == "/match":
+                    self._send(200, index.match(payload.get("names"), payload.get("hashes"),
+                                                payload.get("bloom"), payload.get("key", "name"),
+                                                payload.get("packed_hashes")))
+                elif self.path == "/delete":
+                    self._send(200, index.delete(payload.get("hashes", [])))
+                else:
+                    self._send(404, {"error": "not found"})
+            except Exception as e:
+                self._send(500, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return AgentHandler
+
+class AgentClient:
+    """协调端使用的代理客户端"""
+
+    def __init__(self, url, token=None, timeout=60):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def _request(self, path, payload=None):
+        body = None
+        headers = {"Accept-Encoding": "gzip"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if payload is not None:
+            body = gzip.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            headers["Content-Type"] = "application/json"
+            headers["Content-Encoding"] = "gzip"
+        request = urllib.request.Request(self.url + path, data=body, headers=headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data = response.read()
+            if response.headers.get("Content-Encoding") == "gzip":
+                data = gzip.decompress(data)
+        return json.loads(data)
+
+    def status(self):
+        return self._request("/status")
+
+    def match(self, targets, key="name"):
+        """发送目标集合（名称集合或 PackedHashSet），返回精确核对后的匹配结果"""
+        if len(targets) > BLOOM_THRESHOLD:
+            payload = {"bloom": BloomFilter.from_items(targets).to_dict(), "key": key}
+        elif key == "hash":
+            if not isinstance(targets, PackedHashSet):
+                targets = PackedHashSet(targets)
+            payload = {"packed_hashes": targets.to_base64()}
+        else:
+            payload = {"names": sorted(targets)}
+        result = self._request("/match", payload)
+        # 布隆过滤器可能误判，在本地再核对一次
+        return [m for m in result["matches"] if m[key] in targets]
+
+    def delete(self, hashes):
+        """返回代理的删除结果：deleted、delete_files 和 failed"""
+        return self._request("/delete", {"hashes": list(hashes)})
+
+def load_config():
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            config = json.load(f)
+            if not isinstance(config, dict):
+                raise ValueError("配置文件格式错误：根对象必须是字典类型")
+            return config
+    except json.JSONDecodeError as e:
+        raise ValueError(f"配置文件JSON格式错误: {str(e)}")
+    except FileNotFoundError:
+        raise FileNotFoundError("找不到配置文件 config.json")
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def run_agent(index, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None):
+    """启动代理 HTTP 服务（阻塞）
+
+    代理可以删除种子及其文件，监听非本机地址时必须设置访问令牌。
+    """
+    if not token and not is_loopback(host):
+        raise ValueError(f"监听 {host} 时必须使用 --token 设置访问令牌")
+    index.start()
+    server = ThreadingHTTPServer((host, port), make_handler(index, token))
+    print(f"代理已启动: http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        index.stop()
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='种子服务器代理：在服务器本地完成匹配，只返回精简结果')
+    parser.add_argument('--server', '-s', default='local', help='代理的服务器名称（默认本地服务器）')
+    parser.add_argument('--snapshot', help='从 JSON 快照加载种子列表（本地测试用，不连接 qBittorrent）')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='监听地址（默认只监听本机，其他地址需要同时设置 --token）')
+    parser.add_argument('--port', '-p', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--token', help='访问令牌')
+    parser.add_argument('--interval', type=int, default=30, help='同步种子列表的间隔（秒）')
+    args = parser.parse_args()
+
+    try:
+        if args.snapshot:
+            agent_index = AgentIndex(snapshot=args.snapshot)
+        else:
+            config = load_config()
+            if args.server in ("local", "本地服务器"):
+                server_config = dict(config["local_server"], name="本地服务器")
+            else:
+                server_config = next(s for s in config.get("remote_servers", []) if s["name"] == args.server)
+            agent_index = AgentIndex(server_config, refresh_interval=args.interval,
+                                     throttle_settings=config.get("delete_throttle"),
+                                     keep_shared_payload=config.get("keep_shared_payload", False))
+        run_agent(agent_index, args.host, args.port, args.token)
+    except StopIteration:
+        print(f"配置文件中找不到服务器: {args.server}")
+    except Exception as e:
+        print(f"程序执行过程中发生错误: {str(e)}")
@@ -0,0 +1,567 @@
+import argparse
+import glob
+import gzip
+import itertools
+import ipaddress
+import json
+import os
+import re
+import sys
+import threading
+import time
+import io
+import codecs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from jobs import JobQueue, READ, WRITE, STATE_NAMES, MAX_PARALLEL_JOBS
+
+DEFAULT_PORT = 8766
+
+DEFAULT_API_SETTINGS = {
+    "host": "127.0.0.1",          # 默认只监听本机
+    "port": DEFAULT_PORT,
+    "token": "",                  # 不为空时请求需要带 Authorization: Bearer <token>；未设置时不允许删除
+    "allowed_hosts": [],          # 除本机外允许出现在 Host / Origin 中的主机名（从其他机器访问时）
+    "max_parallel": MAX_PARALLEL_JOBS,
+    "keep_jobs": 100              # 保留的已完成任务数
+}
+
+# 检查站点删除的结果文件
+DELETED_TORRENTS_PATTERN = "logs/deleted_torrents_*"
+
+# 事件流检查任务新日志的间隔（秒），以及没有新内容时发送心跳的间隔
+EVENT_POLL_INTERVAL = 0.25
+EVENT_KEEPALIVE = 15
+
+# 结果分页的默认和最大条数
+RESULT_PAGE_SIZE = 1000
+RESULT_PAGE_MAX = 50000
+
+JOB_PATH = re.compile(r"/api/jobs/(\d+)(/events)?")
+
+# 始终允许的 Host / Origin 主机名；其他主机名的请求可能来自网页（DNS 重绑定、跨站请求），一律拒绝
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+# 设置控制台输出编码为UTF-8
+if sys.platform.startswith('win'):
+    try:
+        import codecs
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer)
+    except (AttributeError, io.UnsupportedOperation):
+        pass
+
+def get_api_settings(settings=None):
+    """合并用户配置与默认配置"""
+    merged = dict(DEFAULT_API_SETTINGS)
+    if isinstance(settings, dict):
+        merged.update(settings)
+    return merged
+
+def load_config():
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            config = json.load(f)
+            if not isinstance(config, dict):
+                raise ValueError("配置文件格式错误：根对象必须是字典类型")
+            return config
+    except json.JSONDecodeError as e:
+        raise ValueError(f"配置文件JSON格式错误: {str(e)}")
+    except FileNotFoundError:
+        raise FileNotFoundError("找不到配置文件 config.json")
+
+def server_resources(config, names, mode):
+    """服务器名称 -> 任务资源（与图形界面相同）"""
+    local_name = config.get("local_server", {}).get("name", "本地服务器")
+    return {f"server:{local_name if name in ('local', '本地服务器') else name}": mode for name in names}
+
+def host_name(value):
+    """从 Host 头（"127.0.0.1:8766"、"[::1]:8766"）或 Origin（"http://localhost:3000"）中取出主机名"""
+    if "//" not in value:
+        value = "//" + value
+    try:
+        return urlsplit(value).hostname
+    except ValueError:
+        return None
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def allowed_host_names(settings):
+    allowed = set(LOCAL_HOSTS) | {name.lower() for name in settings.get("allowed_hosts") or []}
+    if settings["host"] not in ("", "0.0.0.0", "::"):
+        allowed.add(settings["host"].lower())
+    return allowed
+
+def latest_deleted_torrents_file():
+    files = [path for path in glob.glob(DELETED_TORRENTS_PATTERN) if path.endswith((".json", ".qbl"))]
+    return max(files, key=os.path.getmtime) if files else None
+
+class ResultCache:
+    """扫描结果的进程内缓存
+
+    每种结果只缓存最新的文件；文件的修改时间和大小没有变化时直接返回内存中的记录，
+    不再重复解析。记录列表在替换时整体换掉，读取方拿到的列表不会被修改。
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind, path):
+        """返回 (标识, 文件头, 记录列表)，标识在文件变化后改变，可用作 ETag"""
+        from interchange import load_list
+        stat = os.stat(path)
+        tag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        with self._lock:
+            entry = self._entries.get(kind)
+            if entry is not None and entry[0] == (path, tag):
+                return tag, entry[1], entry[2]
+        header, records = load_list(path)
+        records = list(records)
+        with self._lock:
+            self._entries[kind] = ((path, tag), header, records)
+        return tag, header, records
+
+class ControlService:
+    """HTTP 接口背后的状态：任务队列、结果缓存，所有请求线程共用
+
+    扫描、计划（调试模式）和删除都作为任务提交到 JobQueue，调度规则与图形界面相同：
+    访问同一服务器的任务按提交顺序执行，相同的任务未完成时不会重复提交。
+    每次请求重新读取 config.json，修改配置后不需要重启。
+    """
+
+    def __init__(self, settings=None):
+        self.settings = get_api_settings(settings)
+        self.jobs = JobQueue(self.settings["max_parallel"])
+        self.results = ResultCache()
+        self.site_deleted_file = None
+        self._run_numbers = itertools.count(1)
+
+    def new_run_id(self):
+        # 同一秒内提交的多个任务也使用不同的运行ID
+        from profiling import new_run_id
+        return f"{new_run_id()}_{next(self._run_numbers)}"
+
+    def submit(self, label, function, resources, key=None, on_done=None, profile_label=None, config=None):
+        if profile_label and config and config.get("profile"):
+            from profiling import run_profiled
+            inner = function
+            function = lambda: run_profiled(profile_label, inner)
+        job, created = self.jobs.submit(label, function, resources, key, on_done)
+        self.jobs.forget_finished(self.settings["keep_jobs"])
+        return job, created
+
+    def warm(self, kind, path):
+        """任务完成后立即载入结果，之后的查询直接使用缓存"""
+        if path and os.path.exists(path):
+            self.results.get(kind, path)
+
+    def result_file(self, kind):
+        if kind == "local":
+            from delete_remote_torrents import find_targets_file
+            try:
+                return find_targets_file()
+            except FileNotFoundError:
+                return None
+        if kind == "site_deleted":
+            if self.site_deleted_file and os.path.exists(self.site_deleted_file):
+                return self.site_deleted_file
+            return latest_deleted_torrents_file()
+        raise ValueError(f"未知的结果类型: {kind}")
+
+    def scan(self, payload):
+        """扫描：local 为本地待迁移种子，site_deleted 为被站点删除的种子"""
+        config = load_config()
+        target = payload.get("target", "local")
+        if target == "local":
+            from check_local_torrents import check_local_torrents, get_source_servers
+            refresh = payload.get("refresh")
+            resources = server_resources(config, [source["name"] for source in get_source_servers(config)], READ)
+            resources["file:torrents_to_delete"] = WRITE
+            return self.submit("检查本地待迁移种子", lambda: {"file": check_local_torrents(refresh=refresh)},
+                               resources, on_done=lambda job: self.warm("local", (job.result or {}).get("file")),
+                               profile_label="check_local_torrents", config=config)
+        if target == "site_deleted":
+            from check_deleted_torrents import check_deleted_torrents
+            servers = self._servers(payload)
+            deadline = self._deadline(payload)
+            run_id = self.new_run_id()
+
+            def run():
+                return {"file": check_deleted_torrents(
+                    config["local_server"], servers, config.get("remote_servers", []), config.get("tracker_cache"),
+                    full_rescan=bool(payload.get("full_rescan")), tracker_rules=config.get("tracker_rules"),
+                    output_format=config.get("output_format", "json"), pipeline_settings=config.get("pipeline"),
+                    run_id=run_id, deadline=deadline, deadline_settings=config.get("deadline"))}
+
+            def done(job):
+                path = (job.result or {}).get("file")
+                if path:
+                    self.site_deleted_file = path
+                    self.warm("site_deleted", path)
+
+            resources = server_resources(config, servers, READ)
+            resources["file:tracker_cache"] = WRITE
+            return self.submit(f"检查站点删除 ({', '.join(servers)})", run, resources,
+                               key=f"check_deleted:{sorted(servers)}", on_done=done,
+                               profile_label="check_deleted_torrents", config=config)
+        raise ValueError(f"未知的扫描类型: {target}")
+
+    def plan(self, payload):
+        """只检查不删除（调试模式），任务结果为将要删除的种子"""
+        return self._delete(payload, debug_mode=True)
+
+    def delete(self, payload):
+        return self._delete(payload, debug_mode=False)
+
+    def _delete(self, payload, debug_mode):
+        config = load_config()
+        target = payload.get("target", "remote")
+        hashes = payload.get("hashes")
+        selected = set(hashes) if hashes is not None else None
+        selected_key = f":{sorted(selected)}" if selected is not None else ""
+        run_id = self.new_run_id()
+        action_str = "检查" if debug_mode else "删除"
+
+        if target == "remote":
+            from delete_remote_torrents import delete_remote_torrents
+            deadline = self._deadline(payload)
+            resources = server_resources(config, [server["name"] for server in config.get("remote_servers", [])],
+                                         READ if debug_mode else WRITE)
+            resources["file:torrents_to_delete"] = READ
+            return self.submit(
+                "检查远程种子" if debug_mode else "删除远程种子",
+                lambda: {"run_id": run_id, "records": delete_remote_torrents(
+                    debug_mode=debug_mode, selected_hashes=selected, run_id=run_id, deadline=deadline)},
+                resources, key=f"remote:{debug_mode}{selected_key}",
+                profile_label="delete_remote_torrents", config=config)
+
+        if target == "site_deleted":
+            if debug_mode:
+                raise ValueError("站点删除的种子请使用 /api/scan 检查")
+            from check_deleted_torrents import delete_site_deleted_torrents
+            servers = self._servers(payload)
+            path = payload.get("file") or self.result_file("site_deleted")
+            if not path:
+                raise ValueError("请先检查站点删除的种子")
+            # 同一 hash 可能出现在多台服务器上，必须同时指定服务器
+            if hashes is not None:
+                raise ValueError("站点删除的种子请使用 torrents 指定 [{\"server\": ..., \"hash\": ...}]")
+            torrents = payload.get("torrents")
+            try:
+                selected = ({(torrent["server"], torrent["hash"]) for torrent in torrents}
+                            if torrents is not None else None)
+            except (KeyError, TypeError):
+                raise ValueError("torrents 的每一项必须包含 server 和 hash")
+            selected_key = f":{sorted(selected)}" if selected is not None else ""
+
+            def run():
+                delete_site_deleted_torrents(path, config["local_server"], servers, config.get("remote_servers", []),
+                                             config.get("delete_throttle"), config.get("keep_shared_payload", False),
+                                             selected_torrents=selected, run_id=run_id)
+                return {"run_id": run_id, "records": self._history_records(run_id)}
+
+            return self.submit(f"删除站点删除的种子 ({', '.join(servers)})", run,
+                               server_resources(config, servers, WRITE),
+                               key=f"delete_deleted:{path}:{sorted(servers)}{selected_key}",
+                               profile_label="delete_site_deleted_torrents", config=config)
+
+        if target == "free_space":
+            from free_space import free_space, find_server, parse_size
+            server_config = find_server(config, payload.get("server", "local"))
+            if bool(payload.get("free")) == bool(payload.get("until_free")):
+                raise ValueError("请指定 free 或 until_free 其中之一")
+            free_bytes = parse_size(payload["free"]) if payload.get("free") else None
+            until_free = parse_size(payload["until_free"]) if payload.get("until_free") else None
+            return self.submit(
+                f"按目标空间{action_str} ({server_config['name']})",
+                lambda: {"run_id": run_id, "records": free_space(
+                    server_config, free_bytes=free_bytes, until_free=until_free,
+                    settings=config.get("space_target"), debug_mode=debug_mode,
+                    throttle_settings=config.get("delete_throttle"),
+                    keep_shared_payload=config.get("keep_shared_payload", False))},
+                server_resources(config, [server_config["name"]], READ if debug_mode else WRITE),
+                key=f"free_space:{server_config['name']}:{debug_mode}")
+        raise ValueError(f"未知的删除类型: {target}")
+
+    def _servers(self, payload):
+        servers = payload.get("servers")
+        if not servers or not isinstance(servers, list):
+            raise ValueError("请在 servers 中指定服务器名称列表（本地服务器为 local）")
+        return servers
+
+    def _deadline(self, payload):
+        if payload.get("deadline") is None:
+            return None
+        from deadline import parse_duration
+        return parse_duration(payload["deadline"])
+
+    def _history_records(self, run_id):
+        from history import DeletionHistory
+        with DeletionHistory() as history:
+            return history.search(run_id=run_id, limit=RESULT_PAGE_MAX)
+
+    def status(self):
+        """任务、结果文件、服务器连接状态和推迟的工作"""
+        from qb_client import circuit_state
+        from deadline import load_deferred
+        config = load_config()
+        servers = {}
+        for server in [dict(config.get("local_server", {}), name="本地服务器")] + config.get("remote_servers", []):
+            state, entry = circuit_state(server)
+            servers[server["name"]] = dict(entry or {}, state=state)
+        results = {}
+        for kind in ("local", "site_deleted"):
+            path = self.result_file(kind)
+            results[kind] = {"file": path, "modified": os.path.getmtime(path)} if path else None
+        return {
+            "jobs": {state: sum(1 for job in self.jobs.jobs if job.state == state) for state in STATE_NAMES},
+            "results": results,
+            "servers": servers,
+            "deferred": load_deferred()
+        }
+
+    def history(self, query):
+        from history import DeletionHistory, parse_query, DEFAULT_LIMIT
+        criteria = parse_query(query["q"]) if query.get("q") else {}
+        with DeletionHistory() as history:
+            return history.search(torrent_hash=query.get("hash") or criteria.get("torrent_hash"),
+                                  name=query.get("name") or criteria.get("name"), server=query.get("server"),
+                                  since=query.get("since"), until=query.get("until"),
+                                  limit=min(int(query.get("limit", DEFAULT_LIMIT)), RESULT_PAGE_MAX),
+                                  run_id=query.get("run_id"))
+
+class UnsupportedMediaType(ValueError):
+    pass
+
+def job_info(job):
+    info = {
+        "id": job.id,
+        "label": job.label,
+        "state": job.state,
+        "state_name": STATE_NAMES[job.state],
+        "queued": job.queued,
+        "started": job.started,
+        "finished": job.finished,
+        "elapsed": round(job.elapsed, 3),
+        "line_count": job.line_count,
+        "last_line": job.last_line,
+        "error": str(job.error) if job.error is not None else None
+    }
+    if not job.active:
+        info["result"] = job.result
+    return info
+
+def make_handler(service, token, allowed_hosts=LOCAL_HOSTS):
+    class ApiHandler(BaseHTTPRequestHandler):
+        def _send(self, status, payload, headers=None):
+            body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+            self.send_response(status)
+            if len(body) > 1024 and "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body)
+                self.send_header("Content-Encoding", "gzip")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _authorized(self):
+            if token and self.headers.get("Authorization") != f"Bearer {token}":
+                self._send(401, {"error": "unauthorized"})
+                return False
+            return True
+
+        def _same_origin(self):
+            """拒绝 Host 不是本机（或 allowed_hosts）以及带有其他来源 Origin 的请求"""
+            if host_name(self.headers.get("Host", "")) not in allowed_hosts:
+                self._send(403, {"error": "forbidden host"})
+                return False
+            origin = self.headers.get("Origin")
+            if origin is not None and host_name(origin) not in allowed_hosts:
+                self._send(403, {"error": "forbidden origin"})
+                return False
+            return True
+
+        def _read_json(self):
+            # 只接受 application/json：网页发出这种请求前浏览器必须先做 CORS 预检，而接口不响应预检
+            if self.headers.get_content_type() != "application/json":
+                raise UnsupportedMediaType("请求的 Content-Type 必须是 application/json")
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("请求内容必须是 JSON 对象")
+            return payload
+
+        def _dispatch(self, handler):
+            if not self._same_origin() or not self._authorized():
+                return
+            try:
+                handler()
+            except UnsupportedMediaType as e:
+                self._send(415, {"error": str(e)})
+            except (ValueError, KeyError) as e:
+                self._send(400, {"error": str(e)})
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            except Exception as e:
+                self._send(500, {"error": str(e)})
+
+        def do_GET(self):
+            self._dispatch(self._get)
+
+        def do_POST(self):
+            self._dispatch(self._post)
+
+        def _get(self):
+            url = urlsplit(self.path)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            match = JOB_PATH.fullmatch(url.path)
+            if url.path == "/api/status":
+                self._send(200, service.status())
+            elif url.path == "/api/jobs":
+                self._send(200, {"jobs": [job_info(job) for job in service.jobs.jobs]})
+            elif match:
+                job = service.jobs.get(int(match.group(1)))
+                if job is None:
+                    self._send(404, {"error": "job not found"})
+                elif match.group(2):
+                    since = self.headers.get("Last-Event-ID", query.get("since", 0))
+                    self._stream_events(job, int(since))
+                else:
+                    info = job_info(job)
+                    if "since" in query:
+                        info["lines"], _ = job.lines_since(int(query["since"]))
+                    self._send(200, info)
+            elif url.path.startswith("/api/results/"):
+                self._send_results(url.path[len("/api/results/"):], query)
+            elif url.path == "/api/history":
+                self._send(200, {"records": service.history(query)})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def _post(self):
+            operations = {"/api/scan": service.scan, "/api/plan": service.plan, "/api/delete": service.delete}
+            path = urlsplit(self.path).path
+            operation = operations.get(path)
+            if operation is None:
+                self._send(404, {"error": "not found"})
+                return
+            if path == "/api/delete" and not token:
+                self._send(403, {"error": "删除需要在配置或命令行中设置访问令牌（token）"})
+                return
+            job, created = operation(self._read_json())
+            self._send(202 if created else 200, dict(job_info(job), created=created),
+                       {"Location": f"/api/jobs/{job.id}"})
+
+        def _send_results(self, kind, query):
+            """返回缓存中的扫描结果，支持分页（offset/limit）、按服务器筛选和 ETag"""
+            path = service.result_file(kind)
+            if path is None:
+                self._send(404, {"error": "no results"})
+                return
+            tag, header, records = service.results.get(kind, path)
+            server = query.get("server")
+            etag = f'"{tag}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            if server:
+                records = [record for record in records
+                           if record.get("server") == server or server in (record.get("sources") or ())]
+            offset = int(query.get("offset", 0))
+            limit = min(int(query.get("limit", RESULT_PAGE_SIZE)), RESULT_PAGE_MAX)
+            self._send(200, {
+                "file": path,
+                "header": header,
+                "total": len(records),
+                "offset": offset,
+                "records": records[offset:offset + limit]
+            }, {"ETag": etag})
+
+        def _event(self, event, data, event_id=None):
+            message = f"event: {event}\n"
+            if event_id is not None:
+                message += f"id: {event_id}\n"
+            message += f"data: {data}\n\n"
+            self.wfile.write(message.encode("utf-8"))
+
+        def _stream_events(self, job, since):
+            """以 server-sent events 推送任务日志（event: log，id 为行号）和状态变化，任务结束时发送 done"""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            state = None
+            last_sent = time.monotonic()
+            while True:
+                # 先判断是否结束再取日志，结束前写入的日志不会漏掉
+                finished = job.finished is not None
+                sent = False
+                if job.state != state:
+                    state = job.state
+                    self._event("state", json.dumps({"state": state, "state_name": STATE_NAMES[state]},
+                                                     ensure_ascii=False))
+                    sent = True
+                lines, count = job.lines_since(since)
+                for offset, line in enumerate(lines):
+                    self._event("log", line, count - len(lines) + offset + 1)
+                since = count
+                sent = sent or bool(lines)
+                if finished:
+                    self._event("done", json.dumps(job_info(job), ensure_ascii=False, default=str))
+                    self.wfile.flush()
+                    return
+                if sent:
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= EVENT_KEEPALIVE:
+                    self.wfile.write(b": keepalive\n\n")
+                    last_sent = time.monotonic()
+                self.wfile.flush()
+                time.sleep(EVENT_POLL_INTERVAL)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ApiHandler
+
+def run_api(service, host, port, token=None):
+    """启动控制接口 HTTP 服务（阻塞）
+
+    未设置访问令牌时只能监听本机，并且不接受删除请求。
+    """
+    if not token and not is_loopback(host):
+        raise ValueError(f"监听 {host} 时必须设置访问令牌（token）")
+    allowed_hosts = allowed_host_names(dict(service.settings, host=host))
+    server = ThreadingHTTPServer((host, port), make_handler(service, token, allowed_hosts))
+    print(f"控制接口已启动: http://{host}:{port}/api/status")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='本地 HTTP/JSON 控制接口：触发扫描、计划和删除任务，读取结果')
+    parser.add_argument('--host', help=f'监听地址（默认 {DEFAULT_API_SETTINGS["host"]}）')
+    parser.add_argument('--port', '-p', type=int, help=f'端口（默认 {DEFAULT_PORT}）')
+    parser.add_argument('--token', help='访问令牌')
+    args = parser.parse_args()
+
+    try:
+        settings = get_api_settings(load_config().get("api"))
+        for name in ("host", "port", "token"):
+            if getattr(args, name) is not None:
+                settings[name] = getattr(args, name)
+        run_api(ControlService(settings), settings["host"], settings["port"], settings["token"] or None)
+    except Exception as e:
+        print(f"程序执行过程中发生错误: {str(e)}")
@@ -1,15 +1,26 @@
+import startup_timer
 import sys
 import json
 import os
+
+if "--startup-report" in sys.argv:
+    sys.argv.remove("--startup-report")
+    startup_timer.enable()
+
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QPushButton, QWidget, 
-                            QVBoxLayout, QHBoxLayout, QTextEdit, QLabel, 
+                            QVBoxLayout, QHBoxLayout, QTextEdit, QPlainTextEdit, QLabel, 
                             QDialog, QLineEdit, QFormLayout, QMessageBox,
-                            QTabWidget, QScrollArea, QStyleFactory, QFrame)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+                            QTabWidget, QScrollArea, QStyleFactory, QFrame,
+                            QCheckBox, QTableWidget, QTableWidgetItem, QHeaderView,
+                            QAbstractItemView, QSplitter)
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QFont, QPalette, QColor, QIcon
-from check_local_torrents import check_local_torrents
-from delete_remote_torrents import delete_remote_torrents
-from check_deleted_torrents import check_deleted_torrents, delete_site_deleted_torrents
+from results_view import ResultsView, KIND_LOCAL, KIND_SITE_DELETED
+from history_view import HistoryView
+from jobs import READ, WRITE, STATE_NAMES, STATE_RUNNING
+from job_manager import JobManager
+
+# 各功能模块（以及 qbittorrentapi）在首次使用时才导入，以加快窗口显示
 
 DEFAULT_CONFIG = {
     "local_server": {
@@ -104,18 +115,61 @@ def set_dark_theme(app):
         QTabBar::tab:selected {
             background-color: #424242;
         }
-        QLineEdit, QTextEdit {
+        QLineEdit, QTextEdit, QPlainTextEdit {
             background-color: #2b2b2b;
             border: 1px solid #424242;
             border-radius: 4px;
             padding: 5px;
             color: #ffffff;
         }
-        QLineEdit:focus, QTextEdit:focus {
+        QLineEdit:focus, QTextEdit:focus, QPlainTextEdit:focus {
             border: 1px solid #2a82da;
         }
+        QTableView {
+            background-color: #2b2b2b;
+            alternate-background-color: #323232;
+            gridline-color: #424242;
+            border: 1px solid #424242;
+        }
+        QHeaderView::section {
+            background-color: #353535;
+            color: #ffffff;
+            padding: 4px;
+            border: none;
+            border-right: 1px solid #424242;
+        }
     """)
 
+# 日志最多保留的行数
+LOG_MAX_LINES = 5000
+
+def load_results(path):
+    """读取扫描结果文件，返回 (结果类型, 记录列表, 文件路径)，没有结果时返回 None
+
+    在工作线程中调用，避免在界面线程中解析大文件。
+    """
+    if not path:
+        return None
+    from interchange import load_list
+    header, records = load_list(path)
+    return header.get("kind"), list(records), path
+
+def profiled(label, function, config=None):
+    """设置中启用了性能分析时，返回带 CPU/内存分析的 function"""
+    if config is None:
+        try:
+            with open("config.json", "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            config = {}
+    if not config.get("profile"):
+        return function
+    
+    def wrapper(*args, **kwargs):
+        from profiling import run_profiled
+        return run_profiled(label, function, *args, **kwargs)
+    return wrapper
+
 class ConfigDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -169,6 +223,16 @@ class ConfigDialog(QDialog):
         remote_widget.setLayout(remote_layout)
         tab_widget.addTab(remote_widget, "远程服务器")
         
+        # 高级设置
+        advanced_widget = QWidget()
+        advanced_layout = QFormLayout()
+        
+        self.profile_checkbox = QCheckBox("记录CPU和内存分析结果到 logs/（会降低运行速度）")
+        advanced_layout.addRow("性能分析:", self.profile_checkbox)
+        
+        advanced_widget.setLayout(advanced_layout)
+        tab_widget.addTab(advanced_widget, "高级")
+        
         layout.addWidget(tab_widget)
         
         # 按钮
@@ -202,21 +266,31 @@ class ConfigDialog(QDialog):
                 self.remote_servers_text.setText(
                     json.dumps(remote_servers, ensure_ascii=False, indent=4)
                 )
+                
+                self.profile_checkbox.setChecked(bool(config.get("profile", False)))
         except FileNotFoundError:
             pass
 
     def save_config(self):
         try:
-            config = {
-                "local_server": {
-                    "url": self.local_url.text(),
-                    "username": self.local_username.text(),
-                    "password": self.local_password.text(),
-                    "tag": self.local_tag.text(),
-                    "category": self.local_category.text()
-                },
-                "remote_servers": json.loads(self.remote_servers_text.toPlainText())
-            }
+            # 保留界面中未编辑的其他配置项
+            try:
+                with open("config.json", "r", encoding="utf-8") as f:
+                    config = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                config = {}
+            
+            local_server = config.get("local_server", {})
+            local_server.update({
+                "url": self.local_url.text(),
+                "username": self.local_username.text(),
+                "password": self.local_password.text(),
+                "tag": self.local_tag.text(),
+                "category": self.local_category.text()
+            })
+            config["local_server"] = local_server
+            config["remote_servers"] = json.loads(self.remote_servers_text.toPlainText())
+            config["profile"] = self.profile_checkbox.isChecked()
             
             with open("config.json", "w", encoding="utf-8") as f:
                 json.dump(config, f, ensure_ascii=False, indent=4)
@@ -228,93 +302,6 @@ class ConfigDialog(QDialog):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"保存配置时发生错误: {str(e)}")
 
-class WorkerThread(QThread):
-    output = pyqtSignal(str)
-    
-    def __init__(self, function, debug_mode=None):
-        super().__init__()
-        self.function = function
-        self.debug_mode = debug_mode
-        
-    def run(self):
-        # 重定向标准输出到自定义输出
-        class StreamWrapper:
-            def __init__(self, output_signal):
-                self.output_signal = output_signal
-                
-            def write(self, text):
-                if text.strip():
-                    self.output_signal.emit(text.strip())
-                    
-            def flush(self):
-                pass
-        
-        # 保存原始的标准输出
-        old_stdout = sys.stdout
-        sys.stdout = StreamWrapper(self.output)
-        
-        try:
-            if self.debug_mode is not None:
-                self.function(debug_mode=self.debug_mode)
-            else:
-                self.function()
-        except Exception as e:
-            self.output.emit(f"发生错误: {str(e)}")
-        finally:
-            # 恢复原始的标准输出
-            sys.stdout = old_stdout
-
-    def check_deleted(self):
-        """检查被站点删除的种子"""
-        self.log_output.clear()
-        try:
-            with open("config.json", "r", encoding="utf-8") as f:
-                config = json.load(f)
-            
-            def worker_function():
-                return check_deleted_torrents(config["local_server"])
-            
-            self.worker = WorkerThread(worker_function)
-            self.worker.output.connect(self.append_log)
-            self.worker.start()
-            
-            # 在线程完成时更新文件路径
-            def update_file_path():
-                self.current_deleted_torrents_file = self.worker.function()
-            self.worker.finished.connect(update_file_path)
-            
-        except Exception as e:
-            self.append_log(f"发生错误: {str(e)}")
-
-    def delete_deleted(self):
-        """删除被站点删除的种子"""
-        if not self.current_deleted_torrents_file:
-            QMessageBox.warning(self, "警告", "请先检查站点删除的种子！")
-            return
-            
-        reply = QMessageBox.question(
-            self,
-            "确认删除",
-            "确定要删除这些被站点删除的种子吗？\n这将同时删除种子文件！",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-            QMessageBox.StandardButton.No
-        )
-        
-        if reply == QMessageBox.StandardButton.Yes:
-            self.log_output.clear()
-            try:
-                with open("config.json", "r", encoding="utf-8") as f:
-                    config = json.load(f)
-                
-                def worker_function():
-                    delete_site_deleted_torrents(self.current_deleted_torrents_file, config["local_server"])
-                
-                self.worker = WorkerThread(worker_function)
-                self.worker.output.connect(self.append_log)
-                self.worker.start()
-            except Exception as e:
-                self.append_log(f"发生错误: {str(e)}")
-
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -322,6 +309,11 @@ class MainWindow(QMainWindow):
         ensure_config_exists()
         self.setWindowTitle("qBittorrent Batch Cleaner")
         self.setMinimumSize(800, 600)
+        self.jobs = JobManager(self)
+        self.jobs.job_added.connect(self.add_job_row)
+        self.jobs.job_started.connect(self.follow_job)
+        self.log_job_id = None
+        self.log_line_count = 0
         self.setup_ui()
         self.current_deleted_torrents_file = None
 
@@ -371,6 +363,10 @@ class MainWindow(QMainWindow):
         remote_buttons.addWidget(check_remote_btn)
         remote_buttons.addWidget(delete_remote_btn)
         remote_layout.addLayout(remote_buttons)
+        
+        # 来源的扫描结果会在一段时间内复用，勾选后重新扫描所有来源
+        self.refresh_sources_checkbox = QCheckBox("检查本地种子时重新扫描所有来源（不使用缓存的结果）")
+        remote_layout.addWidget(self.refresh_sources_checkbox)
         layout.addWidget(remote_group)
         
         # 站点删种功能区域
@@ -436,73 +432,200 @@ class MainWindow(QMainWindow):
         # layout.addWidget(add_separator())
         layout.addWidget(add_separator())
         
-        # 日志输出区域
-        log_group = QWidget()
-        log_layout = QVBoxLayout(log_group)
-        log_layout.setSpacing(5)
-        
-        log_title = QLabel("运行日志")
-        log_title.setStyleSheet("font-size: 14px; font-weight: bold; color: #2a82da; margin-bottom: 5px;")
-        log_layout.addWidget(log_title)
-        
-        self.log_output = QTextEdit()
+        # 任务列表：每个任务的状态、耗时和最新输出，选中任务后显示其日志
+        self.job_table = QTableWidget(0, 4)
+        self.job_table.setHorizontalHeaderLabels(["任务", "状态", "耗时", "进度"])
+        self.job_table.verticalHeader().hide()
+        self.job_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.job_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.job_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.job_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.job_table.horizontalHeader().setStretchLastSection(True)
+        self.job_table.itemSelectionChanged.connect(self.on_job_selected)
+        
+        # 日志输出和扫描结果
+        self.output_tabs = QTabWidget()
+        
+        self.log_output = QPlainTextEdit()
         self.log_output.setReadOnly(True)
-        log_layout.addWidget(self.log_output)
-        
-        layout.addWidget(log_group)
+        self.log_output.setMaximumBlockCount(LOG_MAX_LINES)
+        self.output_tabs.addTab(self.log_output, "运行日志")
+        
+        # 扫描结果表格，勾选的种子用于后续删除
+        self.results_view = ResultsView()
+        self.output_tabs.addTab(self.results_view, "扫描结果")
+        
+        # 删除历史查询
+        self.history_view = HistoryView()
+        self.output_tabs.addTab(self.history_view, "删除历史")
+        
+        splitter = QSplitter(Qt.Orientation.Vertical)
+        splitter.addWidget(self.job_table)
+        splitter.addWidget(self.output_tabs)
+        splitter.setSizes([120, 400])
+        layout.addWidget(splitter)
+        
+        # 日志和任务状态定时刷新，避免每行输出都重绘一次
+        self._log_timer = QTimer(self)
+        self._log_timer.setInterval(200)
+        self._log_timer.timeout.connect(self.refresh_jobs)
+        self._log_timer.start()
 
     def show_settings(self):
         dialog = ConfigDialog(self)
         dialog.exec()
 
     def append_log(self, text):
-        self.log_output.append(text)
+        """界面自身的提示信息（不属于任何任务）"""
+        self.log_output.appendPlainText(text)
+
+    def add_job_row(self, job_id):
+        job = self.jobs.get(job_id)
+        row = self.job_table.rowCount()
+        self.job_table.insertRow(row)
+        for column, text in enumerate((f"#{job.id} {job.label}", STATE_NAMES[job.state], "", "")):
+            self.job_table.setItem(row, column, QTableWidgetItem(text))
+        if self.log_job_id is None:
+            self.select_job(job_id)
+
+    def follow_job(self, job_id):
+        """新任务开始时切换到该任务的日志"""
+        self.select_job(job_id)
+
+    def select_job(self, job_id):
+        row = next(row for row, job in enumerate(self.jobs.jobs) if job.id == job_id)
+        self.job_table.selectRow(row)
+
+    def on_job_selected(self):
+        rows = self.job_table.selectionModel().selectedRows()
+        if not rows:
+            return
+        job = self.jobs.jobs[rows[0].row()]
+        if job.id == self.log_job_id:
+            return
+        self.log_job_id = job.id
+        self.log_line_count = 0
+        self.log_output.clear()
+        self.output_tabs.setCurrentWidget(self.log_output)
+        self.flush_log()
+
+    def flush_log(self):
+        """把选中任务的新日志写入日志窗口"""
+        job = self.jobs.get(self.log_job_id) if self.log_job_id is not None else None
+        if job is None:
+            return
+        lines, self.log_line_count = job.lines_since(self.log_line_count)
+        if not lines:
+            return
+        self.log_output.appendPlainText("\n".join(lines))
         # 滚动到底部
         self.log_output.verticalScrollBar().setValue(
             self.log_output.verticalScrollBar().maximum()
         )
 
+    def refresh_jobs(self):
+        for row, job in enumerate(self.jobs.jobs):
+            if job.finished is not None and self.job_table.item(row, 1).text() == STATE_NAMES[job.state]:
+                continue
+            self.job_table.item(row, 1).setText(STATE_NAMES[job.state])
+            self.job_table.item(row, 2).setText(f"{int(job.elapsed) // 60}:{int(job.elapsed) % 60:02d}"
+                                                if job.started else "")
+            self.job_table.item(row, 3).setText(job.last_line)
+        self.flush_log()
+
+    def submit_job(self, label, function, resources, key=None, on_done=None):
+        job, created = self.jobs.submit(label, function, resources, key, on_done)
+        if not created:
+            self.select_job(job.id)
+            self.statusBar().showMessage(f"相同的任务 #{job.id} 尚未完成，未重复提交", 5000)
+        elif job.state != STATE_RUNNING:
+            self.statusBar().showMessage(f"任务 #{job.id} 与正在运行的任务冲突，已排队等待", 5000)
+        return job
+
+    def server_resources(self, config, names, mode):
+        """服务器名称 -> 任务资源"""
+        local_name = config.get("local_server", {}).get("name", "本地服务器")
+        return {f"server:{local_name if name in ('local', '本地服务器') else name}": mode for name in names}
+
+    def load_config(self):
+        with open("config.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def show_results(self, results):
+        """在结果表格中显示扫描结果"""
+        if not results:
+            return
+        kind, records, path = results
+        self.results_view.set_results(kind, records, path)
+        if records:
+            self.output_tabs.setCurrentWidget(self.results_view)
+
     def check_local(self):
-        self.log_output.clear()
-        self.worker = WorkerThread(check_local_torrents)
-        self.worker.output.connect(self.append_log)
-        self.worker.start()
+        from check_local_torrents import check_local_torrents, get_source_servers
+        config = self.load_config()
+        check = profiled("check_local_torrents", check_local_torrents, config)
+        refresh = [] if self.refresh_sources_checkbox.isChecked() else None
+        
+        resources = self.server_resources(config, [source["name"] for source in get_source_servers(config)], READ)
+        resources["file:torrents_to_delete"] = WRITE
+        self.submit_job("检查本地待迁移种子", lambda: load_results(check(refresh=refresh)), resources,
+                        on_done=lambda job: self.show_results(job.result))
 
     def delete_remote(self, debug_mode):
-        self.log_output.clear()
-        self.worker = WorkerThread(delete_remote_torrents, debug_mode)
-        self.worker.output.connect(self.append_log)
-        self.worker.start()
+        from delete_remote_torrents import delete_remote_torrents
+        config = self.load_config()
+        # 结果表格中取消勾选的种子不处理
+        selected = self.results_view.selection(KIND_LOCAL)
+        if selected is not None and not debug_mode:
+            reply = QMessageBox.question(
+                self,
+                "确认删除",
+                f"只删除扫描结果中勾选的 {len(selected)} 个种子对应的远程种子，是否继续？",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+        function = profiled("delete_remote_torrents", delete_remote_torrents, config)
+        
+        resources = self.server_resources(config, [server["name"] for server in config.get("remote_servers", [])],
+                                          READ if debug_mode else WRITE)
+        resources["file:torrents_to_delete"] = READ
+        self.submit_job("检查远程种子" if debug_mode else "删除远程种子",
+                        lambda: function(debug_mode=debug_mode, selected_hashes=selected), resources)
+
+    def selected_servers(self):
+        return [checkbox["name"] for checkbox in self.server_checkboxes if checkbox["button"].isChecked()]
 
     def check_deleted(self):
         """检查被站点删除的种子"""
-        self.log_output.clear()
-        
         # 获取选中的服务器
-        selected_servers = []
-        for checkbox in self.server_checkboxes:
-            if checkbox["button"].isChecked():
-                selected_servers.append(checkbox["name"])
-        
+        selected_servers = self.selected_servers()
         if not selected_servers:
             QMessageBox.warning(self, "警告", "请至少选择一个服务器！")
             return
         
         try:
-            with open("config.json", "r", encoding="utf-8") as f:
-                config = json.load(f)
+            config = self.load_config()
             
             def worker_function():
-                return check_deleted_torrents(config["local_server"], selected_servers, config.get("remote_servers", []))
+                from check_deleted_torrents import check_deleted_torrents
+                return check_deleted_torrents(config["local_server"], selected_servers, config.get("remote_servers", []),
+                                              config.get("tracker_cache"), tracker_rules=config.get("tracker_rules"),
+                                              output_format=config.get("output_format", "json"))
             
-            self.worker = WorkerThread(worker_function)
-            self.worker.output.connect(self.append_log)
-            self.worker.start()
+            check = profiled("check_deleted_torrents", worker_function, config)
             
-            # 在线程完成时更新文件路径
-            def update_file_path():
-                self.current_deleted_torrents_file = self.worker.function()
-            self.worker.finished.connect(update_file_path)
+            # 在任务完成时更新文件路径并显示结果
+            def update_file_path(job):
+                results = job.result
+                self.current_deleted_torrents_file = results[2] if results else None
+                self.show_results(results)
+            
+            resources = self.server_resources(config, selected_servers, READ)
+            resources["file:tracker_cache"] = WRITE
+            self.submit_job(f"检查站点删除 ({', '.join(selected_servers)})", lambda: load_results(check()), resources,
+                            key=f"check_deleted:{sorted(selected_servers)}", on_done=update_file_path)
             
         except Exception as e:
             self.append_log(f"发生错误: {str(e)}")
@@ -514,39 +637,63 @@ class MainWindow(QMainWindow):
             return
         
         # 获取选中的服务器
-        selected_servers = []
-        for checkbox in self.server_checkboxes:
-            if checkbox["button"].isChecked():
-                selected_servers.append(checkbox["name"])
-        
+        selected_servers = self.selected_servers()
         if not selected_servers:
             QMessageBox.warning(self, "警告", "请至少选择一个服务器！")
             return
             
+        # 结果表格中取消勾选的种子不删除
+        selected = self.results_view.selection(KIND_SITE_DELETED)
+        count_str = f"勾选的 {len(selected)} 个" if selected is not None else "这些"
+        
         reply = QMessageBox.question(
             self,
             "确认删除",
-            "确定要删除这些被站点删除的种子吗？\n这将同时删除种子文件！",
+            f"确定要删除{count_str}被站点删除的种子吗？\n这将同时删除种子文件！",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
             QMessageBox.StandardButton.No
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            self.log_output.clear()
             try:
-                with open("config.json", "r", encoding="utf-8") as f:
-                    config = json.load(f)
+                config = self.load_config()
+                deleted_torrents_file = self.current_deleted_torrents_file
                 
                 def worker_function():
-                    delete_site_deleted_torrents(self.current_deleted_torrents_file, config["local_server"], selected_servers, config.get("remote_servers", []))
+                    from check_deleted_torrents import delete_site_deleted_torrents
+                    delete_site_deleted_torrents(deleted_torrents_file, config["local_server"], selected_servers,
+                                                 config.get("remote_servers", []), config.get("delete_throttle"),
+                                                 config.get("keep_shared_payload", False),
+                                                 selected_torrents=selected)
                 
-                self.worker = WorkerThread(worker_function)
-                self.worker.output.connect(self.append_log)
-                self.worker.start()
+                self.submit_job(f"删除站点删除的种子 ({', '.join(selected_servers)})",
+                                profiled("delete_site_deleted_torrents", worker_function, config),
+                                self.server_resources(config, selected_servers, WRITE),
+                                key=f"delete_deleted:{deleted_torrents_file}:{sorted(selected_servers)}")
             except Exception as e:
                 self.append_log(f"发生错误: {str(e)}")
 
+    def closeEvent(self, event):
+        # 等待运行中的任务结束，避免线程在窗口销毁后仍在运行
+        if self.jobs.running():
+            reply = QMessageBox.question(
+                self,
+                "任务仍在运行",
+                "还有任务正在运行，关闭窗口将等待这些任务完成。是否继续？",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                event.ignore()
+                return
+            self.jobs.wait_all()
+        event.accept()
+
 def main():
+    # BT_backup 读取使用多进程，打包后需要此调用
+    import multiprocessing
+    multiprocessing.freeze_support()
+    startup_timer.mark("模块导入完成")
     app = QApplication(sys.argv)
     
     # 设置深色主题
@@ -555,9 +702,13 @@ def main():
     # 设置应用程序范围的字体
     font = QFont("Microsoft YaHei UI", 9)
     app.setFont(font)
+    startup_timer.mark("QApplication 初始化完成")
     
     window = MainWindow()
     window.show()
+    startup_timer.mark("主窗口已显示")
+    # 事件循环开始后（窗口完成首次绘制）输出启动报告
+    QTimer.singleShot(0, startup_timer.report)
     sys.exit(app.exec())
 
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+import mmap
+import os
+import sys
+import time
+import argparse
+
+# 每个子进程一次处理的文件数
+CHUNK_SIZE = 500
+
+class BencodeError(ValueError):
+    pass
+
+def _decode(data, index):
+    token = data[index:index + 1]
+    if token == b"d":
+        index += 1
+        result = {}
+        while data[index:index + 1] != b"e":
+            key, index = _decode(data, index)
+            value, index = _decode(data, index)
+            result[key.decode("utf-8", "replace")] = value
+        return result, index + 1
+    if token == b"l":
+        index += 1
+        result = []
+        while data[index:index + 1] != b"e":
+            value, index = _decode(data, index)
+            result.append(value)
+        return result, index + 1
+    if token == b"i":
+        end = data.find(b"e", index)
+        if end < 0:
+            raise BencodeError("整数未结束")
+        return int(data[index + 1:end]), end + 1
+    if token.isdigit():
+        colon = data.find(b":", index)
+        if colon < 0:
+            raise BencodeError("字符串长度未结束")
+        length = int(data[index:colon])
+        start = colon + 1
+        return data[start:start + length], start + length
+    raise BencodeError(f"无效的bencode数据，位置 {index}")
+
+def bdecode(data):
+    """解码bencode数据，字典的键解码为str，字符串值保留为bytes"""
+    try:
+        value, _ = _decode(data, 0)
+    except (IndexError, ValueError) as e:
+        raise BencodeError(str(e))
+    return value
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return value or ""
+
+def _read_bencoded(path):
+    """使用内存映射读取并解码文件，文件不存在或为空时返回 None"""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return bdecode(mm)
+    except FileNotFoundError:
+        return None
+
+def _file_tree_size(tree):
+    """计算 BitTorrent v2 file tree 的总大小"""
+    total = 0
+    for name, node in tree.items():
+        if name == "":
+            total += node.get("length", 0)
+        elif isinstance(node, dict):
+            total += _file_tree_size(node)
+    return total
+
+def _file_tree_files(tree, prefix):
+    files = []
+    for name, node in tree.items():
+        if name == "":
+            files.append([prefix, node.get("length", 0)])
+        elif isinstance(node, dict):
+            files.extend(_file_tree_files(node, f"{prefix}/{name}" if prefix else name))
+    return files
+
+def _info_files(info, name):
+    """返回种子内的文件列表 [[相对保存目录的路径, 大小], ...]"""
+    if "length" in info:
+        return [[name, info["length"]]]
+    if "files" in info:
+        return [
+            ["/".join([name] + [_text(part) for part in f.get("path", [])]), f.get("length", 0)]
+            for f in info["files"]
+        ]
+    if "file tree" in info:
+        return _file_tree_files(info["file tree"], name)
+    return []
+
+def _info_size(info):
+    if "length" in info:
+        return info["length"]
+    if "files" in info:
+        return sum(f.get("length", 0) for f in info["files"])
+    if "file tree" in info:
+        return _file_tree_size(info["file tree"])
+    return 0
+
+class TorrentRecord(dict):
+    """与 torrents_info 返回的种子对象兼容的记录，支持属性访问"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+def parse_resume(fastresume_path, with_files=False):
+    """将单个 .fastresume（及同名 .torrent）解析为种子记录
+
+    with_files 为 True 时附带文件列表 files（已应用 qBittorrent 中的重命名）。
+    """
+    resume = _read_bencoded(fastresume_path)
+    if not isinstance(resume, dict):
+        return None
+    torrent_hash = os.path.splitext(os.path.basename(fastresume_path))[0]
+    info = resume.get("info")
+    if info is None:
+        metadata = _read_bencoded(os.path.splitext(fastresume_path)[0] + ".torrent")
+        info = metadata.get("info", {}) if isinstance(metadata, dict) else {}
+
+    pieces = resume.get("pieces")
+    if pieces:
+        progress = sum(1 for b in pieces if b & 1) / len(pieces)
+    else:
+        progress = 1.0 if resume.get("seed_mode") else 0.0
+
+    tags = [_text(tag) for tag in resume.get("qBt-tags", [])]
+    save_path = _text(resume.get("qBt-savePath") or resume.get("save_path"))
+    name = _text(resume.get("qBt-name")) or _text(info.get("name"))
+    trackers = [_text(url) for tier in resume.get("trackers", []) for url in tier]
+
+    record = TorrentRecord(
+        hash=torrent_hash,
+        name=name,
+        size=_info_size(info),
+        progress=progress,
+        tags=",".join(tags),
+        category=_text(resume.get("qBt-category")),
+        save_path=save_path,
+        content_path=os.path.join(save_path, name) if save_path and name else save_path,
+        trackers=trackers
+    )
+    if with_files:
+        files = _info_files(info, _text(info.get("name")) or name)
+        for idx, mapped in enumerate(resume.get("mapped_files", [])[:len(files)]):
+            if mapped:
+                files[idx][0] = _text(mapped)
+        record["files"] = files
+    return record
+
+def _parse_chunk(paths, with_files=False):
+    records = []
+    errors = 0
+    for path in paths:
+        try:
+            record = parse_resume(path, with_files)
+        except (BencodeError, OSError):
+            record = None
+        if record is None:
+            errors += 1
+        else:
+            records.append(record)
+    return records, errors
+
+def read_bt_backup(bt_backup_dir, workers=None, with_files=False):
+    """并行读取 BT_backup 目录，返回种子记录列表"""
+    if not os.path.isdir(bt_backup_dir):
+        raise FileNotFoundError(f"找不到 BT_backup 目录: {bt_backup_dir}")
+    paths = [
+        entry.path for entry in os.scandir(bt_backup_dir)
+        if entry.name.endswith(".fastresume")
+    ]
+    chunks = [paths[i:i + CHUNK_SIZE] for i in range(0, len(paths), CHUNK_SIZE)]
+    records = []
+    errors = 0
+    if len(chunks) <= 1:
+        for chunk in chunks:
+            chunk_records, chunk_errors = _parse_chunk(chunk, with_files)
+            records.extend(chunk_records)
+            errors += chunk_errors
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk_records, chunk_errors in executor.map(_parse_chunk, chunks, [with_files] * len(chunks)):
+                records.extend(chunk_records)
+                errors += chunk_errors
+    if errors:
+        print(f"有 {errors} 个 fastresume 文件无法解析，已跳过")
+    return records
+
+def default_bt_backup_dir():
+    """返回当前平台上 qBittorrent 默认的 BT_backup 目录"""
+    if sys.platform.startswith('win'):
+        base = os.environ.get("LOCALAPPDATA", "")
+        return os.path.join(base, "qBittorrent", "BT_backup")
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Application Support/qBittorrent/BT_backup")
+    base = os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share"))
+    return os.path.join(base, "qBittorrent", "BT_backup")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='离线读取 qBittorrent BT_backup 目录')
+    parser.add_argument('path', nargs='?', default=None, help='BT_backup 目录（默认使用 qBittorrent 默认位置）')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='并行进程数')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    torrents = read_bt_backup(args.path or default_bt_backup_dir(), args.workers)
+    print(f"共读取 {len(torrents)} 个种子，耗时 {time.perf_counter() - start:.2f} 秒")
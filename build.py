@@ -53,6 +53,12 @@ def build():
         '--hidden-import=PyQt6.QtCore',
         '--hidden-import=PyQt6.QtGui',
         '--hidden-import=PyQt6.QtWidgets',
+        # 以下模块在函数内延迟导入
+        '--hidden-import=qbittorrentapi',
+        '--hidden-import=check_local_torrents',
+        '--hidden-import=delete_remote_torrents',
+        '--hidden-import=check_deleted_torrents',
+        '--hidden-import=history',
     ]
     
     # 移除None值
@@ -1,4 +1,4 @@
-from qbittorrentapi import Client
+import startup_timer
 import json
 import datetime
 import os
@@ -6,7 +6,21 @@ import sys
 import io
 import codecs
 import threading
+import time
+import argparse
+import functools
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from qb_client import connect
+from tracker_cache import (load_tracker_cache, save_tracker_cache, get_cache_settings,
+                           get_server_cache, needs_check, update_entry, prune_server_cache,
+                           STATUS_OK, STATUS_ERROR, STATUS_DELETED, STATUS_SUSPECT)
+from tracker_classifier import TrackerClassifier, CATEGORY_UNREGISTERED
+from delete_throttle import DeletionThrottle
+from pipeline import DeletionPipeline, get_pipeline_settings
+from content_index import ContentIndex, save_files_cache
+from interchange import write_list, load_list, compact_path, KIND_DELETED_TORRENTS
+from history import open_history, record_deletion
+from deadline import DeadlineScheduler, parse_duration
 
 # 设置控制台输出编码为UTF-8
 if sys.platform.startswith('win'):
@@ -36,88 +50,300 @@ def load_config():
     except FileNotFoundError:
         raise FileNotFoundError("找不到配置文件 config.json")
 
+def deletion_record(server_name, torrent_hash, name, size, freed, delete_files):
+    """删除历史中的一条记录（与 delete_records.json 的格式相同）"""
+    return {
+        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "server_name": server_name,
+        "torrent_name": name,
+        "torrent_hash": torrent_hash,
+        "torrent_size": size,
+        "freed_size": freed,
+        "action": "deleted" if delete_files else "removed"
+    }
+
 def create_log_directory():
     if not os.path.exists("logs"):
         os.makedirs("logs")
 
-def check_deleted_torrents(local_config, selected_servers, remote_servers):
-    """检查被站点删除的种子"""
+def classify_trackers(trackers, classifier):
+    """根据Tracker列表判断种子状态，返回 (状态, Tracker消息)"""
+    status, status_msg = STATUS_OK, ""
+    for tracker in trackers:
+        if isinstance(tracker, dict) and "msg" in tracker:
+            msg = tracker.get("msg", "")
+            category = classifier.classify_tracker(tracker)
+            if category == CATEGORY_UNREGISTERED:
+                return STATUS_DELETED, msg
+            # 被禁止、临时错误或Tracker状态为 4（不可用）都视为报错
+            if status == STATUS_OK and (category is not None or tracker.get("status") == 4):
+                status, status_msg = STATUS_ERROR, msg
+    return status, status_msg
+
+class ServerScan:
+    """站点删种检查中单个服务器的状态
+
+    各服务器先获取种子列表，按 hash 汇总后每个 hash 只在一个服务器上查询 Tracker，
+    结论通过 apply 共享给持有该种子的所有服务器，由各服务器自己打标签或删除。
+    """
+
+    def __init__(self, server_name, qb, torrents, server_cache, latency):
+        self.name = server_name
+        self.qb = qb
+        self.torrents = {torrent.hash: torrent for torrent in torrents}
+        self.cache = server_cache
+        self.latency = latency        # 每次请求的预计耗时，用于选择查询 Tracker 的服务器
+        self.index = ContentIndex(qb, torrents)
+        self.lock = threading.Lock()
+        self.deleted = []
+        self.size = 0
+        self.to_tag = []
+        self.removed = set()
+        self.pipeline = None
+        self.throttle = None
+        self.delete_qb = None
+        self.keep_shared_payload = False
+        self.queried = 0
+        self.query_seconds = 0.0
+        self.failed = False
+
+    def needs_check(self, torrent_hash, settings, full_rescan, hashes):
+        if hashes is not None:
+            return torrent_hash in hashes.get(self.name, ())
+        return full_rescan or needs_check(self.cache.get(torrent_hash), settings)
+
+    def apply(self, torrent_hash, status, msg):
+        """记录 Tracker 检查结论，确认被站点删除时交给删除线程或等待打标签"""
+        with self.lock:
+            update_entry(self.cache, torrent_hash, status, msg)
+            if status != STATUS_DELETED:
+                return
+            torrent = self.torrents[torrent_hash]
+            record = {
+                "name": torrent.name,
+                "hash": torrent.hash,
+                "size": torrent.size,
+                "tracker_msg": msg,
+                "server": self.name
+            }
+            self.deleted.append(record)
+            self.size += torrent.size
+            if self.pipeline is not None:
+                # 立即交给删除线程，不再打标签
+                self.removed.add(torrent.hash)
+                delete_files = not self.keep_shared_payload or self.index.can_delete_files(torrent.hash, self.removed)
+                self.pipeline.submit((torrent, record, delete_files))
+            elif "站点删种" not in (torrent.tags.split(",") if torrent.tags else []):
+                self.to_tag.append(torrent.hash)
+
+def assign_queries(holders, to_query, exclude=(), value=None):
+    """为每个需要查询的 hash 选择一个持有它的服务器
+
+    持有者少的 hash 先分配；每个 hash 分给 (已分配数量 + 1) × 请求耗时最小的服务器，
+    使查询分散到各服务器并偏向响应快的服务器。返回 {服务器: [hash, ...]}。
+    value 不为 None 时每个服务器的 hash 按 value(hash) 从大到小排列。
+    """
+    assignments = {}
+    for torrent_hash in sorted(to_query, key=lambda h: len(holders[h])):
+        candidates = [scan for scan in holders[torrent_hash] if scan not in exclude and not scan.failed]
+        if not candidates:
+            continue
+        scan = min(candidates, key=lambda s: (len(assignments.get(s, ())) + 1) * max(s.latency, 0.001))
+        assignments.setdefault(scan, []).append(torrent_hash)
+    if value is not None:
+        for server_hashes in assignments.values():
+            server_hashes.sort(key=value, reverse=True)
+    return assignments
+
+def check_deleted_torrents(local_config, selected_servers, remote_servers, cache_settings=None, full_rescan=False,
+                           tracker_rules=None, output_format="json", delete_confirmed=False, throttle_settings=None,
+                           keep_shared_payload=False, pipeline_settings=None, hashes=None, run_id=None,
+                           deadline=None, deadline_settings=None):
+    """检查被站点删除的种子
+    
+    Tracker状态会按 (服务器, hash) 缓存，再次扫描时只查询新增、过期或疑似删除的种子。
+    full_rescan 为 True 时忽略缓存重新检查所有种子。
+    同一个种子在多个服务器上辅种时只在其中一个服务器上查询Tracker，结论共享给其他服务器。
+    tracker_rules 为 config.json 中的 tracker_rules 配置，用于识别各站点的删种消息。
+    output_format 为 "compact" 时结果保存为紧凑格式（.qbl），否则保存为 JSON。
+    delete_confirmed 为 True 时边检查边删除：确认被站点删除的种子立即交给独立的删除线程，
+    已删除的种子在结果中标记 deleted，并以 run_id 写入删除历史。
+    hashes 为 {服务器名称: hash 集合} 时只检查其中的种子且不使用缓存（监视模式中状态发生变化的种子）。
+    deadline 为本次运行的时间预算（秒）：各服务器先查询体积最大的种子，到达截止时间后停止查询，
+    未查询的种子不更新缓存，下一次运行时继续检查；推迟的数量记录在 cache/deferred_work.json 中。
+    每个服务器每次查询的耗时会被记录，之后的运行据此（而不是登录耗时）分配查询。
+    """
     try:
         deleted_torrents = []
         total_size = 0
+        total_reclaimable = 0
+        total_removed = 0
+        pipeline_settings = get_pipeline_settings(pipeline_settings)
         lock = threading.Lock()
+        settings = get_cache_settings(cache_settings)
+        if not settings["enabled"]:
+            full_rescan = True
+        cache = load_tracker_cache()
+        classifier = TrackerClassifier(tracker_rules)
+        for name in selected_servers:
+            get_server_cache(cache, "本地服务器" if name == "local" else name)
+        if run_id is None:
+            from profiling import new_run_id
+            run_id = new_run_id()
+        history = open_history(run_id, "check_deleted_torrents") if delete_confirmed else None
+        scheduler = DeadlineScheduler("check_deleted_torrents", deadline, deadline_settings, run_id)
+        scheduler.report_previous()
         
-        def process_server(server_config, is_local=False):
-            nonlocal total_size
+        def open_server(server_config, is_local=False):
+            """连接服务器并获取种子列表"""
             server_name = "本地服务器" if is_local else server_config["name"]
-            
             try:
                 print(f"\n正在连接服务器: {server_name}")
                 
                 # 连接qBittorrent
-                qb = Client(
-                    host=server_config["url"],
-                    username=server_config["username"],
-                    password=server_config["password"]
-                )
-                
-                server_deleted = []
-                server_size = 0
+                started = time.perf_counter()
+                qb = connect(dict(server_config, name=server_name))
+                latency = scheduler.seconds_per_item(server_name) or time.perf_counter() - started
                 
                 try:
-                    qb.auth_log_in()
                     with lock:
                         print(f"已成功连接到服务器 {server_name}")
                     
                     print(f"正在获取服务器 {server_name} 的种子列表...")
                     torrents = qb.torrents_info()
+                    scan = ServerScan(server_name, qb, torrents, get_server_cache(cache, server_name), latency)
+                    prune_server_cache(scan.cache, set(scan.torrents))
                     
-                    print(f"正在检查服务器 {server_name} 的种子状态...")
-                    for torrent in torrents:
-                        trackers = qb.torrents_trackers(torrent.hash)
-                        is_deleted = False
+                    if delete_confirmed:
+                        # 删除使用独立的连接，与Tracker检查同时进行
+                        scan.delete_qb = connect(dict(server_config, name=server_name))
+                        scan.throttle = DeletionThrottle(throttle_settings, server_name)
+                        scan.keep_shared_payload = keep_shared_payload
                         
-                        for tracker in trackers:
-                            if isinstance(tracker, dict) and "msg" in tracker:
-                                msg = tracker.get("msg", "").lower()
-                                if "torrent not found" in msg or "torrent not exists" in msg or "unregistered torrent" in msg:
-                                    is_deleted = True
-                                    break
+                        def consume(item):
+                            torrent, record, delete_files = item
+                            scan.throttle.delete(scan.delete_qb, torrent.hash, torrent.size, torrent.content_path,
+                                                 delete_files)
+                            record["deleted"] = True
+                            # 可释放空间在检查结束后才汇总，删除历史中不记录
+                            record_deletion(history, deletion_record(server_name, torrent.hash, torrent.name,
+                                                                     torrent.size, None, delete_files),
+                                            record["tracker_msg"])
+                            with lock:
+                                print(f"已删除: [{server_name}] {torrent.name} (大小: {format_size(torrent.size)})")
                         
-                        if is_deleted:
-                            # 为种子添加标签
-                            current_tags = torrent.tags.split(",") if torrent.tags else []
-                            if "站点删种" not in current_tags:
-                                new_tags = current_tags + ["站点删种"]
-                                qb.torrents_add_tags(tags="站点删种", torrent_hashes=torrent.hash)
-                            
-                            server_deleted.append({
-                                "name": torrent.name,
-                                "hash": torrent.hash,
-                                "size": torrent.size,
-                                "tracker_msg": msg,
-                                "server": server_name
-                            })
-                            server_size += torrent.size
+                        scan.pipeline = DeletionPipeline(consume, pipeline_settings["queue_size"], server_name)
+                    return scan
                     
-                    with lock:
-                        if server_deleted:
-                            deleted_torrents.extend(server_deleted)
-                            total_size += server_size
-                            print(f"\n在服务器 {server_name} 上找到 {len(server_deleted)} 个被站点删除的种子")
-                            print(f"服务器 {server_name} 总大小: {format_size(server_size)}")
-                        else:
-                            print(f"\n在服务器 {server_name} 上未找到被站点删除的种子")
-                    
-                except Exception as e:
-                    with lock:
-                        print(f"处理服务器 {server_name} 时发生错误: {str(e)}")
-                finally:
+                except Exception:
                     qb.auth_log_out()
+                    raise
                     
             except Exception as e:
                 with lock:
                     print(f"连接服务器 {server_name} 时发生错误: {str(e)}")
+                return None
+        
+        def publish(torrent_hash, status, msg):
+            for scan in holders[torrent_hash]:
+                scan.apply(torrent_hash, status, msg)
+        
+        def query_server(scan, server_hashes):
+            """在 scan 上查询分配给它的种子，返回未能完成查询的 hash"""
+            done = 0
+            started = time.perf_counter()
+            waited = 0
+            try:
+                if len(scans) > 1:
+                    with lock:
+                        print(f"正在通过服务器 {scan.name} 检查 {len(server_hashes)} 个种子的Tracker状态...")
+                else:
+                    print(f"正在检查服务器 {scan.name} 的种子状态...")
+                suspects = []
+                for torrent_hash in server_hashes:
+                    if scheduler.expired():
+                        scheduler.defer(scan.name, len(server_hashes) - done)
+                        return []
+                    status, msg = classify_trackers(scan.qb.torrents_trackers(torrent_hash), classifier)
+                    scan.queried += 1
+                    done += 1
+                    previously_deleted = any(s.cache.get(torrent_hash, {}).get("status") == STATUS_DELETED
+                                             for s in holders[torrent_hash])
+                    if status != STATUS_DELETED:
+                        publish(torrent_hash, status, msg)
+                    elif previously_deleted or not settings["reannounce"]:
+                        # 之前已确认删除，或未启用重新汇报，直接确认
+                        publish(torrent_hash, STATUS_DELETED, msg)
+                    else:
+                        publish(torrent_hash, STATUS_SUSPECT, msg)
+                        suspects.append(torrent_hash)
+                
+                # 对疑似删除的种子重新汇报，确认后再标记；没有时间时留到下一次运行（缓存中为疑似删除）
+                if suspects and scheduler.remaining() < settings["reannounce_wait"]:
+                    scheduler.defer(scan.name, len(suspects))
+                elif suspects:
+                    print(f"服务器 {scan.name} 有 {len(suspects)} 个疑似被删除的种子，正在重新汇报确认...")
+                    scan.qb.torrents_reannounce(torrent_hashes=suspects)
+                    time.sleep(settings["reannounce_wait"])
+                    waited = settings["reannounce_wait"]
+                    for torrent_hash in suspects:
+                        status, msg = classify_trackers(scan.qb.torrents_trackers(torrent_hash), classifier)
+                        scan.queried += 1
+                        publish(torrent_hash, status, msg)
+                return []
+            except Exception as e:
+                scan.failed = True
+                with lock:
+                    print(f"处理服务器 {scan.name} 时发生错误: {str(e)}")
+                return server_hashes[done:]
+            finally:
+                with lock:
+                    # 重新汇报后的等待不计入查询耗时
+                    scan.query_seconds += time.perf_counter() - started - waited
+        
+        def finish_server(scan):
+            """等待删除完成、批量打标签并汇总单个服务器的结果"""
+            nonlocal total_size, total_reclaimable, total_removed
+            try:
+                if scan.pipeline is not None:
+                    scan.pipeline.close()
+                    scan.pipeline.check()
+                
+                if scan.queried:
+                    scheduler.record(scan.name, scan.query_seconds, scan.size, scan.queried)
+                
+                # 为种子添加标签
+                if scan.to_tag:
+                    scan.qb.torrents_add_tags(tags="站点删种", torrent_hashes=scan.to_tag)
+                
+                # 辅种共享的文件只计算一次
+                server_reclaimable = 0
+                if scan.deleted:
+                    server_reclaimable = scan.index.reclaimable([t["hash"] for t in scan.deleted])
+                
+                with lock:
+                    if scan.deleted:
+                        deleted_torrents.extend(scan.deleted)
+                        total_size += scan.size
+                        total_reclaimable += server_reclaimable
+                        print(f"\n在服务器 {scan.name} 上找到 {len(scan.deleted)} 个被站点删除的种子")
+                        print(f"服务器 {scan.name} 总大小: {format_size(scan.size)}，"
+                              f"实际可释放: {format_size(server_reclaimable)}")
+                        if scan.pipeline is not None:
+                            total_removed += scan.pipeline.processed
+                            print(f"已删除 {scan.pipeline.processed} 个种子")
+                    else:
+                        print(f"\n在服务器 {scan.name} 上未找到被站点删除的种子")
+                
+            except Exception as e:
+                with lock:
+                    print(f"处理服务器 {scan.name} 时发生错误: {str(e)}")
+            finally:
+                if scan.pipeline is not None:
+                    scan.pipeline.close()
+                    scan.throttle.close()
+                    scan.delete_qb.auth_log_out()
+                scan.qb.auth_log_out()
         
         # 使用线程池处理所有选中的服务器
         with ThreadPoolExecutor() as executor:
@@ -125,20 +351,60 @@ def check_deleted_torrents(local_config, selected_servers, remote_servers):
             
             # 处理本地服务器
             if "local" in selected_servers:
-                futures.append(executor.submit(process_server, local_config, True))
+                futures.append(executor.submit(open_server, local_config, True))
             
             # 处理远程服务器
             for server in remote_servers:
                 if server["name"] in selected_servers:
-                    futures.append(executor.submit(process_server, server))
+                    futures.append(executor.submit(open_server, server))
             
-            # 等待所有任务完成
-            for future in as_completed(futures):
+            scans = [future.result() for future in futures]
+            scans = [scan for scan in scans if scan is not None]
+            
+            # 按 hash 汇总持有该种子的服务器，每个需要检查的 hash 只查询一次
+            holders = {}
+            for scan in scans:
+                for torrent_hash in scan.torrents:
+                    holders.setdefault(torrent_hash, []).append(scan)
+            to_query = [torrent_hash for torrent_hash, servers in holders.items()
+                        if any(scan.needs_check(torrent_hash, settings, full_rescan, hashes) for scan in servers)]
+            for scan in scans:
+                skipped = sum(1 for torrent_hash in scan.torrents
+                              if not scan.needs_check(torrent_hash, settings, full_rescan, hashes))
+                if skipped and hashes is None:
+                    print(f"服务器 {scan.name} 有 {skipped} 个种子的Tracker状态在缓存有效期内，已跳过")
+            
+            # 查询失败的服务器上剩余的种子改由其他持有该种子的服务器查询
+            # 有截止时间时各服务器先查询体积最大的种子：每次查询的耗时相近，大种子被删除时释放的空间更多
+            value = None
+            if deadline is not None:
+                value = lambda torrent_hash: holders[torrent_hash][0].torrents[torrent_hash].size
+            assignments = assign_queries(holders, to_query, value=value)
+            while assignments:
+                query_futures = [executor.submit(query_server, scan, server_hashes)
+                                 for scan, server_hashes in assignments.items()]
+                remaining = [torrent_hash for future in query_futures for torrent_hash in future.result()]
+                assignments = assign_queries(holders, remaining, value=value)
+            
+            if len(scans) > 1:
+                print(f"\n{len(scans)} 个服务器共 {sum(len(scan.torrents) for scan in scans)} 个种子"
+                      f"（{len(holders)} 个不同的 hash），本次查询Tracker {sum(scan.queried for scan in scans)} 次")
+            
+            for future in as_completed([executor.submit(finish_server, scan) for scan in scans]):
                 try:
                     future.result()
                 except Exception as e:
                     print(f"处理服务器时发生错误: {str(e)}")
         
+        if history is not None:
+            history.close()
+        scheduler.finish(complete=hashes is None)
+        save_files_cache()
+        try:
+            save_tracker_cache(cache)
+        except OSError as e:
+            print(f"保存Tracker状态缓存时发生错误: {str(e)}")
+        
         if deleted_torrents:
             # 创建日志目录
             create_log_directory()
@@ -146,22 +412,32 @@ def check_deleted_torrents(local_config, selected_servers, remote_servers):
             # 保存删除种子列表
             current_time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             json_file = f"logs/deleted_torrents_{current_time}.json"
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            with open(json_file, "w", encoding="utf-8") as f:
-                json.dump({
-                    "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "total_torrents": len(deleted_torrents),
-                    "total_size": total_size,
-                    "torrents": deleted_torrents
-                }, f, ensure_ascii=False, indent=4)
+            if output_format == "compact":
+                json_file = write_list(compact_path(json_file), KIND_DELETED_TORRENTS, deleted_torrents,
+                                       timestamp=timestamp, reclaimable_size=total_reclaimable)
+            else:
+                with open(json_file, "w", encoding="utf-8") as f:
+                    json.dump({
+                        "timestamp": timestamp,
+                        "total_torrents": len(deleted_torrents),
+                        "total_size": total_size,
+                        "reclaimable_size": total_reclaimable,
+                        "torrents": deleted_torrents
+                    }, f, ensure_ascii=False, indent=4)
             
             # 打印总结
             print(f"\n=== 总结 ===")
             print(f"所有服务器共找到 {len(deleted_torrents)} 个被站点删除的种子")
             print(f"总大小: {format_size(total_size)}")
+            print(f"实际可释放空间: {format_size(total_reclaimable)}")
+            if delete_confirmed:
+                print(f"已删除 {total_removed} 个种子")
             print("\n种子列表:")
             for idx, torrent in enumerate(deleted_torrents, 1):
-                print(f"{idx}. [{torrent['server']}] {torrent['name']} (大小: {format_size(torrent['size'])})")
+                deleted_str = "（已删除）" if torrent.get("deleted") else ""
+                print(f"{idx}. [{torrent['server']}] {torrent['name']} (大小: {format_size(torrent['size'])}){deleted_str}")
                 print(f"   Tracker消息: {torrent['tracker_msg']}")
             
             print(f"\n种子列表已保存至: {json_file}")
@@ -174,20 +450,26 @@ def check_deleted_torrents(local_config, selected_servers, remote_servers):
         print(f"程序执行过程中发生错误: {str(e)}")
         return None
 
-def delete_site_deleted_torrents(json_file_path, local_config, selected_servers, remote_servers):
-    """删除被站点删除的种子及其文件"""
+def delete_site_deleted_torrents(json_file_path, local_config, selected_servers, remote_servers, throttle_settings=None,
+                                 keep_shared_payload=False, selected_torrents=None, run_id=None):
+    """删除被站点删除的种子及其文件
+    
+    throttle_settings 为 config.json 中的 delete_throttle 配置，用于控制删除节奏。
+    keep_shared_payload 为 True 时，文件仍被其他种子引用的种子只从客户端移除，不删除文件。
+    selected_torrents 为 (服务器, hash) 的集合时只删除其中的种子（图形界面中勾选的种子），
+    同一 hash 在未勾选的服务器上的种子不受影响。
+    删除的种子以 run_id 写入删除历史，Tracker消息作为删除原因。
+    """
     if not os.path.exists(json_file_path):
         print(f"找不到种子列表文件: {json_file_path}")
         return
     
     try:
-        with open(json_file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            torrents = data.get("torrents", [])
-        
-        if not torrents:
-            print("没有需要删除的种子")
-            return
+        _, torrents = load_list(json_file_path)
+        # 边检查边删除时已删除的种子不再处理
+        torrents = [torrent for torrent in torrents if not torrent.get("deleted")
+                    and (selected_torrents is None
+                         or (torrent["server"], torrent["hash"]) in selected_torrents)]
         
         # 按服务器分组种子
         torrents_by_server = {}
@@ -197,9 +479,14 @@ def delete_site_deleted_torrents(json_file_path, local_config, selected_servers,
                 torrents_by_server[server_name] = []
             torrents_by_server[server_name].append(torrent)
         
+        if not torrents_by_server:
+            print("没有需要删除的种子")
+            return
+        
         lock = threading.Lock()
         total_deleted = 0
         total_size = 0
+        history = open_history(run_id, "delete_site_deleted_torrents")
         
         def process_server_deletion(server_config, server_torrents, is_local=False):
             nonlocal total_deleted, total_size
@@ -207,28 +494,36 @@ def delete_site_deleted_torrents(json_file_path, local_config, selected_servers,
             
             try:
                 print(f"\n正在连接服务器: {server_name}")
-                qb = Client(
-                    host=server_config["url"],
-                    username=server_config["username"],
-                    password=server_config["password"]
-                )
+                qb = connect(dict(server_config, name=server_name))
+                
+                throttle = DeletionThrottle(throttle_settings, server_name)
                 
                 try:
-                    qb.auth_log_in()
                     with lock:
                         print(f"已成功连接到服务器 {server_name}")
                     
                     print(f"正在删除服务器 {server_name} 的种子...")
                     server_deleted = 0
                     server_size = 0
+                    index = ContentIndex(qb, qb.torrents_info())
+                    removed = set()
                     
                     for torrent in server_torrents:
                         try:
-                            qb.torrents_delete(delete_files=True, torrent_hashes=torrent["hash"])
+                            freed = index.freed_by(torrent["hash"], removed)
+                            removed.add(torrent["hash"])
+                            delete_files = not keep_shared_payload or index.can_delete_files(torrent["hash"], removed)
+                            throttle.delete(qb, torrent["hash"], torrent["size"], delete_files=delete_files)
+                            record_deletion(history, deletion_record(server_name, torrent["hash"], torrent["name"],
+                                                                     torrent["size"], freed, delete_files),
+                                            torrent.get("tracker_msg"))
                             with lock:
-                                print(f"已删除: [{server_name}] {torrent['name']} (大小: {format_size(torrent['size'])})")
+                                size_str = format_size(torrent['size'])
+                                if freed != torrent["size"]:
+                                    size_str += f", 与其他种子共享数据, 可释放: {format_size(freed)}"
+                                print(f"已删除: [{server_name}] {torrent['name']} (大小: {size_str})")
                             server_deleted += 1
-                            server_size += torrent["size"]
+                            server_size += freed
                         except Exception as e:
                             with lock:
                                 print(f"删除种子 {torrent['name']} 时发生错误: {str(e)}")
@@ -244,6 +539,7 @@ def delete_site_deleted_torrents(json_file_path, local_config, selected_servers,
                     with lock:
                         print(f"处理服务器 {server_name} 时发生错误: {str(e)}")
                 finally:
+                    throttle.close()
                     qb.auth_log_out()
                     
             except Exception as e:
@@ -279,6 +575,10 @@ def delete_site_deleted_torrents(json_file_path, local_config, selected_servers,
                 except Exception as e:
                     print(f"处理服务器时发生错误: {str(e)}")
         
+        if history is not None:
+            history.close()
+        save_files_cache()
+        
         print(f"\n=== 总结 ===")
         print(f"所有服务器共删除 {total_deleted} 个种子")
         print(f"总释放空间: {format_size(total_size)}")
@@ -287,10 +587,32 @@ def delete_site_deleted_torrents(json_file_path, local_config, selected_servers,
         print(f"程序执行过程中发生错误: {str(e)}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='检查被站点删除的种子')
+    parser.add_argument('--delete', action='store_true', help='边检查边删除确认被站点删除的种子（不再询问）')
+    parser.add_argument('--profile', action='store_true', help='记录CPU和内存分析结果到 logs/')
+    parser.add_argument('--deadline', type=parse_duration, metavar='DURATION',
+                        help='本次检查的时间预算，例如 30m、1h、600（秒）；到达后停止查询并记录推迟的种子数')
+    args = parser.parse_args()
+    
     try:
+        from profiling import run_profiled, new_run_id
+        run_id = new_run_id()
         config = load_config()
-        json_file = check_deleted_torrents(config["local_server"], ["local"], [])
-        if json_file and input("\n是否删除这些种子？(y/N) ").lower() == 'y':
-            delete_site_deleted_torrents(json_file, config["local_server"], ["local"], [])
+        # 检查和随后的删除使用同一个运行ID，删除历史中可以追溯到本次运行
+        json_file = run_profiled("check_deleted_torrents", functools.partial(check_deleted_torrents, run_id=run_id),
+                                 config["local_server"], ["local"], [], config.get("tracker_cache"),
+                                 enabled=args.profile, run_id=run_id,
+                                 tracker_rules=config.get("tracker_rules"),
+                                 output_format=config.get("output_format", "json"),
+                                 delete_confirmed=args.delete,
+                                 throttle_settings=config.get("delete_throttle"),
+                                 keep_shared_payload=config.get("keep_shared_payload", False),
+                                 pipeline_settings=config.get("pipeline"),
+                                 deadline=args.deadline, deadline_settings=config.get("deadline"))
+        if json_file and not args.delete and input("\n是否删除这些种子？(y/N) ").lower() == 'y':
+            run_profiled("delete_site_deleted_torrents", functools.partial(delete_site_deleted_torrents, run_id=run_id),
+                         json_file, config["local_server"], ["local"], [],
+                         config.get("delete_throttle"), config.get("keep_shared_payload", False),
+                         enabled=args.profile, run_id=run_id)
     except Exception as e:
         print(f"程序执行过程中发生错误: {str(e)}") 
\ No newline at end of file
@@ -1,10 +1,26 @@
-from qbittorrentapi import Client
+import startup_timer
 import json
 import datetime
 import os
+import argparse
 import sys
 import io
 import codecs
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from qb_client import connect
+from bt_backup import read_bt_backup
+from interchange import write_list, compact_path, KIND_TORRENTS_TO_DELETE
+
+TORRENTS_TO_DELETE_FILE = "torrents_to_delete.json"
+
+# 各来源服务器的扫描结果缓存
+SOURCE_CACHE_FILE = "cache/source_targets.json"
+SOURCE_CACHE_VERSION = 1
+
+# 通过 WebUI 获取的扫描结果在该时间（分钟）内直接复用；BT_backup 来源按目录修改时间判断
+DEFAULT_SOURCE_CACHE_TTL = 30
 
 # 设置控制台输出编码为UTF-8
 if sys.platform.startswith('win'):
@@ -14,6 +30,9 @@ if sys.platform.startswith('win'):
     except (AttributeError, io.UnsupportedOperation):
         pass  # 如果无法设置编码，保持默认设置
 
+class SourceScanError(Exception):
+    """有来源扫描失败：不能用缺少该来源的结果覆盖种子列表"""
+
 def format_size(size_bytes):
     """将字节大小转换为人类可读的格式"""
     for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
@@ -22,12 +41,13 @@ def format_size(size_bytes):
         size_bytes /= 1024.0
     return f"{size_bytes:.2f} PB"
 
-def clean_old_files():
-    """删除旧的种子列表文件"""
+def clean_old_files(keep=None):
+    """删除旧的种子列表文件（keep 为本次新写入的文件）"""
     try:
-        if os.path.exists("torrents_to_delete.json"):
-            os.remove("torrents_to_delete.json")
-            print("已删除旧的种子列表文件")
+        for path in (TORRENTS_TO_DELETE_FILE, compact_path(TORRENTS_TO_DELETE_FILE)):
+            if path != keep and os.path.exists(path):
+                os.remove(path)
+                print("已删除旧的种子列表文件")
     except Exception as e:
         print(f"删除旧文件时发生错误: {str(e)}")
 
@@ -38,15 +58,15 @@ def load_config():
             # 验证配置文件格式
             if not isinstance(config, dict):
                 raise ValueError("配置文件格式错误：根对象必须是字典类型")
-            if "local_server" not in config:
+            if "local_server" not in config and not config.get("source_servers"):
                 raise ValueError("配置文件缺少 'local_server' 配置")
             
-            # 验证本地服务器配置
-            local_config = config["local_server"]
-            required_fields = ["url", "username", "password", "tag"]
-            for field in required_fields:
-                if field not in local_config:
-                    raise ValueError(f"本地服务器配置缺少必要字段: {field}")
+            # 验证本地（来源）服务器配置
+            for source in get_source_servers(config):
+                required_fields = ["tag"] if source.get("bt_backup") else ["url", "username", "password", "tag"]
+                for field in required_fields:
+                    if field not in source:
+                        raise ValueError(f"{source['name']} 配置缺少必要字段: {field}")
             
             return config
     except json.JSONDecodeError as e:
@@ -54,54 +74,224 @@ def load_config():
     except FileNotFoundError:
         raise FileNotFoundError("找不到配置文件 config.json")
 
-def check_local_torrents():
+def get_source_servers(config):
+    """返回需要扫描的来源服务器列表
+
+    配置了 source_servers 时使用该列表，否则只扫描 local_server。
+    """
+    sources = config.get("source_servers")
+    if not sources:
+        return [dict(config["local_server"], name=config["local_server"].get("name", "本地服务器"))]
+    return [dict(source, name=source.get("name") or source.get("url") or source.get("bt_backup"))
+            for source in sources]
+
+def is_target_torrent(progress, tags, category, local_config):
+    """进度为0且满足标签/分类条件的种子为待迁移种子"""
+    return (progress == 0 and
+            local_config["tag"] in (tags or "").split(",") and
+            (not local_config.get("category") or category == local_config["category"]))
+
+def select_target_torrents(torrents, local_config):
+    """筛选进度为0且满足标签/分类条件的种子，返回 (种子列表, 总大小)"""
+    target_torrents = []
+    total_size = 0
+    
+    for torrent in torrents:
+        if is_target_torrent(torrent.progress, torrent.tags, torrent.category, local_config):
+            
+            target_torrents.append({
+                "name": torrent.name,
+                "hash": torrent.hash,
+                "size": torrent.size,
+                "category": torrent.category,
+                "tags": torrent.tags
+            })
+            total_size += torrent.size
+    
+    return target_torrents, total_size
+
+def fetch_torrents_webui(local_config):
+    """通过 WebUI 获取本地（来源）服务器的种子列表"""
+    print(f"\n正在连接{local_config.get('name', '本地服务器')}: {local_config['url']}")
+    
+    # 连接本地 qBittorrent
+    qb = connect(local_config)
+    
     try:
-        # 清理旧文件
-        clean_old_files()
+        print("已成功连接到服务器")
         
+        # 获取所有种子
+        print("正在获取种子列表...")
+        return qb.torrents_info()
+    finally:
+        qb.auth_log_out()
+
+def fetch_torrents_bt_backup(bt_backup_dir):
+    """直接读取 BT_backup 目录获取种子列表，无需 WebUI"""
+    print(f"\n正在读取本地 BT_backup 目录: {bt_backup_dir}")
+    torrents = read_bt_backup(bt_backup_dir)
+    print(f"已读取 {len(torrents)} 个种子")
+    return torrents
+
+def load_source_cache(cache_file=SOURCE_CACHE_FILE):
+    """读取来源扫描结果缓存，文件不存在或损坏时返回空缓存"""
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get("version") != SOURCE_CACHE_VERSION:
+            return {"version": SOURCE_CACHE_VERSION, "sources": {}}
+        data.setdefault("sources", {})
+        return data
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"version": SOURCE_CACHE_VERSION, "sources": {}}
+
+def save_source_cache(cache, cache_file=SOURCE_CACHE_FILE):
+    """原子写入来源扫描结果缓存"""
+    cache_dir = os.path.dirname(cache_file)
+    if cache_dir and not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_file, cache_file)
+
+def source_fingerprint(source):
+    """来源的筛选条件及 BT_backup 目录修改时间，任何一项变化时缓存失效"""
+    fingerprint = {"tag": source["tag"], "category": source.get("category") or ""}
+    if source.get("bt_backup"):
+        fingerprint["bt_backup"] = source["bt_backup"]
+        fingerprint["mtime"] = os.stat(source["bt_backup"]).st_mtime_ns
+    else:
+        fingerprint["url"] = source["url"]
+    return fingerprint
+
+def cached_result(entry, source, fingerprint, ttl_minutes, now=None):
+    """缓存仍然有效时返回缓存的种子列表，否则返回 None"""
+    if not entry or entry.get("fingerprint") != fingerprint:
+        return None
+    if not source.get("bt_backup"):
+        now = now if now is not None else time.time()
+        if now - entry.get("scanned", 0) >= ttl_minutes * 60:
+            return None
+    return entry.get("torrents")
+
+def scan_source(source):
+    """扫描单个来源服务器，返回符合条件的种子列表"""
+    if source.get("bt_backup"):
+        torrents = fetch_torrents_bt_backup(source["bt_backup"])
+    else:
+        torrents = fetch_torrents_webui(source)
+    target_torrents, _ = select_target_torrents(torrents, source)
+    return target_torrents
+
+def merge_targets(results):
+    """按 hash 合并各来源的种子，记录每个种子来自哪些来源"""
+    merged = {}
+    for source_name, torrents in results:
+        for torrent in torrents:
+            entry = merged.get(torrent["hash"])
+            if entry is None:
+                merged[torrent["hash"]] = dict(torrent, sources=[source_name])
+            elif source_name not in entry["sources"]:
+                entry["sources"].append(source_name)
+    return list(merged.values())
+
+def collect_targets(sources, refresh=None, ttl_minutes=DEFAULT_SOURCE_CACHE_TTL):
+    """并行扫描各来源服务器并合并结果
+
+    未发生变化的来源直接使用缓存的结果；refresh 为需要强制重新扫描的来源名称集合（None 表示不强制）。
+    任何一个来源扫描失败时抛出 SourceScanError（成功的来源仍然写入缓存），不返回缺少该来源的合并结果。
+    """
+    cache = load_source_cache()
+    results = {}
+    to_scan = []
+    failed = []
+    for source in sources:
+        try:
+            fingerprint = source_fingerprint(source)
+        except OSError as e:
+            print(f"无法读取 {source['name']} 的 BT_backup 目录: {str(e)}")
+            failed.append(source["name"])
+            continue
+        cached = None
+        if refresh is None or source["name"] not in refresh:
+            cached = cached_result(cache["sources"].get(source["name"]), source, fingerprint, ttl_minutes)
+        if cached is not None:
+            entry = cache["sources"][source["name"]]
+            if source.get("bt_backup"):
+                print(f"{source['name']} 未发生变化，使用缓存的结果（{len(cached)} 个种子）")
+            else:
+                age = int((time.time() - entry.get("scanned", 0)) // 60)
+                print(f"{source['name']} 使用 {age} 分钟前缓存的结果（{len(cached)} 个种子），"
+                      f"需要最新结果时请重新扫描该来源")
+            results[source["name"]] = cached
+        else:
+            to_scan.append((source, fingerprint))
+
+    lock = threading.Lock()
+    if to_scan:
+        with ThreadPoolExecutor(max_workers=len(to_scan)) as executor:
+            futures = {executor.submit(scan_source, source): (source, fingerprint) for source, fingerprint in to_scan}
+            for future in as_completed(futures):
+                source, fingerprint = futures[future]
+                try:
+                    torrents = future.result()
+                except Exception as e:
+                    print(f"扫描 {source['name']} 时发生错误: {str(e)}")
+                    failed.append(source["name"])
+                    continue
+                with lock:
+                    results[source["name"]] = torrents
+                    cache["sources"][source["name"]] = {
+                        "fingerprint": fingerprint,
+                        "scanned": time.time(),
+                        "torrents": torrents
+                    }
+        save_source_cache(cache)
+
+    if failed:
+        raise SourceScanError(f"以下来源扫描失败，未更新种子列表（保留上次的结果）: {', '.join(failed)}")
+
+    # 按配置顺序合并，保证输出稳定
+    return merge_targets((source["name"], results[source["name"]])
+                         for source in sources if source["name"] in results)
+
+def check_local_torrents(bt_backup=None, refresh=None):
+    """检查本地（来源）服务器中待迁移的种子
+    
+    配置了 source_servers 时并行扫描所有来源，按 hash 去重合并为一个目标列表，
+    每个种子的 sources 字段记录它来自哪些来源。bt_backup 为 BT_backup 目录时只离线读取该目录
+    （使用 local_server 的筛选条件）。refresh 为需要强制重新扫描的来源名称列表，空列表表示全部。
+    返回保存的种子列表文件路径，未找到种子时返回 None。
+    有来源扫描失败时不写入也不删除种子列表文件，返回 None。
+    """
+    try:
         # 加载配置
         config = load_config()
-        local_config = config["local_server"]
-        
-        print(f"\n正在连接本地服务器: {local_config['url']}")
-        
-        # 连接本地 qBittorrent
-        qb = Client(
-            host=local_config["url"],
-            username=local_config["username"],
-            password=local_config["password"]
-        )
+        if bt_backup:
+            sources = [dict(config["local_server"], name="本地服务器", bt_backup=bt_backup)]
+        else:
+            sources = get_source_servers(config)
+        if refresh is not None:
+            refresh = set(refresh) or {source["name"] for source in sources}
         
         try:
-            qb.auth_log_in()
-            print("已成功连接到服务器")
-            
-            # 获取所有种子
-            print("正在获取种子列表...")
-            torrents = qb.torrents_info()
-            
-            # 筛选进度为0且满足条件的种子
-            target_torrents = []
-            total_size = 0
-            
-            for torrent in torrents:
-                if (torrent.progress == 0 and 
-                    local_config["tag"] in torrent.tags.split(",") and
-                    (not local_config["category"] or torrent.category == local_config["category"])):
-                    
-                    target_torrents.append({
-                        "name": torrent.name,
-                        "hash": torrent.hash,
-                        "size": torrent.size,
-                        "category": torrent.category,
-                        "tags": torrent.tags
-                    })
-                    total_size += torrent.size
+            target_torrents = collect_targets(sources, refresh,
+                                              config.get("source_cache_ttl_minutes", DEFAULT_SOURCE_CACHE_TTL))
+            total_size = sum(torrent["size"] for torrent in target_torrents)
             
             if target_torrents:
                 # 将种子信息写入文件
-                with open("torrents_to_delete.json", "w", encoding="utf-8") as f:
-                    json.dump(target_torrents, f, ensure_ascii=False, indent=4)
+                if config.get("output_format") == "compact":
+                    output_file = write_list(compact_path(TORRENTS_TO_DELETE_FILE), KIND_TORRENTS_TO_DELETE,
+                                             target_torrents,
+                                             timestamp=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                else:
+                    output_file = TORRENTS_TO_DELETE_FILE
+                    with open(output_file, "w", encoding="utf-8") as f:
+                        json.dump(target_torrents, f, ensure_ascii=False, indent=4)
+                # 新文件写入完成后再清理另一种格式的旧文件
+                clean_old_files(keep=output_file)
                 
                 # 打印结果
                 print(f"\n找到 {len(target_torrents)} 个符合条件的种子:")
@@ -110,20 +300,33 @@ def check_local_torrents():
                 for idx, torrent in enumerate(target_torrents, 1):
                     print(f"{idx}. {torrent['name']} (大小: {format_size(torrent['size'])})")
                     print(f"   标签: {torrent['tags']}")
+                    if len(sources) > 1:
+                        print(f"   来源: {', '.join(torrent['sources'])}")
                     if torrent['category']:
-                        print(f"   ��类: {torrent['category']}")
+                        print(f"   分类: {torrent['category']}")
                 
-                print(f"\n种子列表已保存至: torrents_to_delete.json")
+                print(f"\n种子列表已保存至: {output_file}")
+                return output_file
             else:
+                clean_old_files()
                 print("\n未找到符合条件的种子")
             
+        except SourceScanError as e:
+            print(f"\n{str(e)}")
         except Exception as e:
             print(f"处理种子时发生错误: {str(e)}")
-        finally:
-            qb.auth_log_out()
             
     except Exception as e:
         print(f"程序执行过程中发生错误: {str(e)}")
 
 if __name__ == "__main__":
-    check_local_torrents() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='本地种子检查工具')
+    parser.add_argument('--bt-backup', help='直接读取 qBittorrent 的 BT_backup 目录（不经过 WebUI）')
+    parser.add_argument('--refresh', nargs='*', metavar='NAME',
+                        help='忽略缓存，重新扫描指定的来源服务器（不指定名称时重新扫描全部）')
+    parser.add_argument('--profile', action='store_true', help='记录CPU和内存分析结果到 logs/')
+    args = parser.parse_args()
+    
+    from profiling import run_profiled
+    run_profiled("check_local_torrents", check_local_torrents, enabled=args.profile,
+                 bt_backup=args.bt_backup, refresh=args.refresh)
@@ -0,0 +1,190 @@
+import json
+import os
+import posixpath
+import threading
+
+# 种子文件列表缓存（同一 infohash 的文件列表不会变化，可跨服务器共用）
+TORRENT_FILES_CACHE = "cache/torrent_files.json"
+
+_files_cache = None
+_files_cache_dirty = False
+_files_lock = threading.Lock()
+
+def normalize_path(path):
+    """统一路径分隔符并规范化，便于比较"""
+    path = (path or "").replace("\\", "/")
+    return posixpath.normpath(path) if path else ""
+
+def _load_files_cache():
+    global _files_cache
+    if _files_cache is None:
+        try:
+            with open(TORRENT_FILES_CACHE, "r", encoding="utf-8") as f:
+                _files_cache = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            _files_cache = {}
+    return _files_cache
+
+def get_torrent_files(qb, torrent_hash):
+    """获取种子的文件列表 [(相对路径, 大小), ...]，优先使用缓存"""
+    global _files_cache_dirty
+    with _files_lock:
+        cached = _load_files_cache().get(torrent_hash)
+    if cached is not None:
+        return cached
+    files = [[file.name, file.size] for file in qb.torrents_files(torrent_hash=torrent_hash)]
+    with _files_lock:
+        _files_cache[torrent_hash] = files
+        _files_cache_dirty = True
+    return files
+
+def save_files_cache():
+    """将新获取的文件列表写回缓存文件"""
+    global _files_cache_dirty
+    with _files_lock:
+        if not _files_cache_dirty:
+            return
+        cache_dir = os.path.dirname(TORRENT_FILES_CACHE)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        tmp_file = TORRENT_FILES_CACHE + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(_files_cache, f, ensure_ascii=False)
+        os.replace(tmp_file, TORRENT_FILES_CACHE)
+        _files_cache_dirty = False
+
+class ContentIndex:
+    """单个服务器上的种子内容索引，用于识别辅种/共享文件
+
+    先按 content_path 找出可能共享数据的种子（路径相同或互为父子目录），
+    只有这些种子才会通过 torrents_files 获取文件列表；其余种子的可释放空间就是其大小。
+    """
+
+    def __init__(self, qb, torrents):
+        self.qb = qb
+        self.torrents = {torrent.hash: torrent for torrent in torrents}
+        self._group_of = {}
+        self._groups = {}
+        self._file_keys = {}
+        self._refs = {}
+        self._build_groups()
+
+    def _build_groups(self):
+        parent = {}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        by_path = {}
+        for torrent_hash, torrent in self.torrents.items():
+            parent[torrent_hash] = torrent_hash
+            path = normalize_path(torrent.content_path)
+            if path:
+                by_path.setdefault(path, []).append(torrent_hash)
+
+        for path, hashes in by_path.items():
+            # 同一路径下的种子
+            related = list(hashes)
+            # 父目录也是其他种子的内容路径
+            current = posixpath.dirname(path)
+            while current and current != posixpath.dirname(current):
+                if current in by_path:
+                    related.append(by_path[current][0])
+                current = posixpath.dirname(current)
+            root = find(related[0])
+            for torrent_hash in related[1:]:
+                other = find(torrent_hash)
+                if other != root:
+                    parent[other] = root
+
+        for torrent_hash in self.torrents:
+            root = find(torrent_hash)
+            self._group_of[torrent_hash] = root
+            self._groups.setdefault(root, []).append(torrent_hash)
+
+    def is_shared(self, torrent_hash):
+        """种子是否可能与其他种子共享数据"""
+        group = self._group_of.get(torrent_hash)
+        return group is not None and len(self._groups[group]) > 1
+
+    def shared_with(self, torrent_hash):
+        """返回与该种子属于同一内容组的其他种子 hash"""
+        group = self._group_of.get(torrent_hash)
+        if group is None:
+            return []
+        return [h for h in self._groups[group] if h != torrent_hash]
+
+    def _load_group(self, group):
+        if group in self._refs:
+            return
+        refs = {}
+        for torrent_hash in self._groups[group]:
+            torrent = self.torrents[torrent_hash]
+            save_path = normalize_path(torrent.save_path)
+            keys = []
+            for name, size in get_torrent_files(self.qb, torrent_hash):
+                key = (posixpath.join(save_path, normalize_path(name)), size)
+                keys.append(key)
+                refs.setdefault(key, set()).add(torrent_hash)
+            self._file_keys[torrent_hash] = keys
+        self._refs[group] = refs
+
+    def freed_by(self, torrent_hash, removed=()):
+        """在 removed 中的种子已删除的前提下，再删除该种子能释放的字节数"""
+        torrent = self.torrents.get(torrent_hash)
+        if torrent is None:
+            return 0
+        if not self.is_shared(torrent_hash):
+            return torrent.size
+        group = self._group_of[torrent_hash]
+        self._load_group(group)
+        refs = self._refs[group]
+        freed = 0
+        for key in self._file_keys[torrent_hash]:
+            if all(h == torrent_hash or h in removed for h in refs[key]):
+                freed += key[1]
+        return freed
+
+    def deleted_by(self, torrent_hash, removed=()):
+        """连同文件删除该种子时实际删除的字节数
+
+        removed 中的种子已连同文件删除，与它们共享的文件已不存在，不再重复计算；
+        仍被保留的种子引用的文件同样会被删除，计算在内。
+        """
+        torrent = self.torrents.get(torrent_hash)
+        if torrent is None:
+            return 0
+        if not self.is_shared(torrent_hash):
+            return torrent.size
+        group = self._group_of[torrent_hash]
+        self._load_group(group)
+        refs = self._refs[group]
+        deleted = 0
+        for key in self._file_keys[torrent_hash]:
+            if not any(h != torrent_hash and h in removed for h in refs[key]):
+                deleted += key[1]
+        return deleted
+
+    def can_delete_files(self, torrent_hash, removed=()):
+        """该种子的文件是否已不再被其他保留的种子引用"""
+        if not self.is_shared(torrent_hash):
+            return True
+        group = self._group_of[torrent_hash]
+        self._load_group(group)
+        refs = self._refs[group]
+        return all(
+            all(h == torrent_hash or h in removed for h in refs[key])
+            for key in self._file_keys[torrent_hash]
+        )
+
+    def reclaimable(self, hashes):
+        """删除给定的一组种子实际能释放的字节数"""
+        removed = set()
+        total = 0
+        for torrent_hash in hashes:
+            total += self.freed_by(torrent_hash, removed)
+            removed.add(torrent_hash)
+        return total
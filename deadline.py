@@ -0,0 +1,250 @@
+import contextlib
+import json
+import datetime
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+# 各步骤在每个服务器上的历史耗时和处理量，用于估计下一次运行的成本
+RUN_TIMINGS_FILE = "cache/run_timings.json"
+# 因截止时间推迟到下一次运行的工作
+DEFERRED_FILE = "cache/deferred_work.json"
+
+DEFAULT_DEADLINE_SETTINGS = {
+    "workers": 4,       # 有截止时间时同时处理的服务器数
+    "smoothing": 0.5    # 新的耗时在估计值中的权重（指数滑动平均）
+}
+
+DURATION_UNITS = {"S": 1, "M": 60, "H": 3600}
+
+def get_deadline_settings(settings=None):
+    """合并用户配置与默认截止时间配置"""
+    merged = dict(DEFAULT_DEADLINE_SETTINGS)
+    if isinstance(settings, dict):
+        merged.update(settings)
+    return merged
+
+def parse_duration(text):
+    """将 "30m"、"1.5h"、"90s"、"600" 之类的字符串转换为秒数"""
+    match = re.fullmatch(r"\s*([\d.]+)\s*([SMH]?)\s*", str(text).upper())
+    if not match:
+        raise ValueError(f"无法识别的时长: {text}")
+    return float(match.group(1)) * DURATION_UNITS[match.group(2) or "S"]
+
+def format_duration(seconds):
+    if seconds >= 60:
+        return f"{int(seconds // 60)} 分 {int(seconds % 60)} 秒"
+    return f"{seconds:.1f} 秒"
+
+def _load_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_json(path, data):
+    """原子写入；临时文件名唯一，同时写入的进程/线程不会互相覆盖临时文件"""
+    cache_dir = os.path.dirname(path)
+    if cache_dir and not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=cache_dir or ".")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_file)
+        raise
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """以 <path>.lock 作为跨进程的互斥锁，保护“读取-合并-写入”"""
+    lock_dir = os.path.dirname(path)
+    if lock_dir and not os.path.exists(lock_dir):
+        os.makedirs(lock_dir, exist_ok=True)
+    with open(path + ".lock", "a+b") as f:
+        if sys.platform.startswith('win'):
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def load_deferred():
+    """返回 {步骤: 推迟的工作}，没有推迟时为空字典"""
+    return _load_json(DEFERRED_FILE)
+
+class DeadlineScheduler:
+    """按截止时间和历史耗时安排一次运行中各服务器的工作
+
+    每次运行都记录各服务器的耗时（秒）和处理的数据量（字节），以指数滑动平均保存在
+    cache/run_timings.json 中。指定 deadline（秒）时：
+    - order 把上次被推迟的服务器排在最前，其余按“每秒可处理的字节数”从高到低排序，没有历史的服务器按平均值估计
+    - should_start 在到达截止时间后返回 False，尚未开始的服务器整体推迟
+    - 各服务器在处理每一项前调用 expired，到达截止时间后停止并用 defer 记录剩余的工作
+    finish 保存耗时，并把推迟的工作写入 cache/deferred_work.json，供下一次运行优先处理。
+    没有截止时间时不改变任何行为，只记录耗时。
+    """
+
+    def __init__(self, step, deadline=None, settings=None, run_id=None):
+        self.step = step
+        self.deadline = deadline
+        self.settings = get_deadline_settings(settings)
+        self.run_id = run_id
+        self.started = time.monotonic()
+        self.end = self.started + deadline if deadline is not None else None
+        self._lock = threading.Lock()
+        self.estimates = _load_json(RUN_TIMINGS_FILE).get(step, {})
+        self.previous = _load_json(DEFERRED_FILE).get(step)
+        self.deferred = {}
+
+    def remaining(self):
+        if self.end is None:
+            return float("inf")
+        return max(0.0, self.end - time.monotonic())
+
+    def expired(self):
+        return self.end is not None and time.monotonic() >= self.end
+
+    def estimate(self, name):
+        """返回 (预计耗时, 预计字节数)，没有历史记录时返回 None"""
+        entry = self.estimates.get(name)
+        if not entry or entry.get("seconds") is None:
+            return None
+        return entry["seconds"], entry.get("bytes", 0)
+
+    def _rate(self, name, default_rate):
+        estimate = self.estimate(name)
+        if estimate is None:
+            return default_rate
+        seconds, size = estimate
+        return size / max(seconds, 0.001)
+
+    def seconds_per_item(self, name):
+        """每一项（例如一次Tracker查询）的平均耗时，没有历史记录时返回 None"""
+        entry = self.estimates.get(name)
+        if not entry or not entry.get("items"):
+            return None
+        return entry["seconds"] / entry["items"]
+
+    def report_previous(self):
+        if self.previous and self.previous.get("servers"):
+            print(f"上次运行（{self.previous.get('timestamp')}）因截止时间推迟了: "
+                  + "，".join(f"{name}（{info.get('remaining', 0)} 项）" if info.get("remaining") else name
+                             for name, info in self.previous["servers"].items()))
+
+    def order(self, names):
+        """返回处理顺序；没有截止时间时保持原顺序"""
+        names = list(names)
+        self.report_previous()
+        if self.deadline is None:
+            return names
+        known = [self._rate(name, 0) for name in names if self.estimate(name) is not None]
+        default_rate = sum(known) / len(known) if known else 0
+        previous = set((self.previous or {}).get("servers", {}))
+        ordered = sorted(names, key=lambda name: (name not in previous, -self._rate(name, default_rate)))
+        print(f"截止时间: {format_duration(self.deadline)}，处理顺序:")
+        for name in ordered:
+            estimate = self.estimate(name)
+            previous_str = "（上次推迟）" if name in previous else ""
+            if estimate is None:
+                print(f"  {name}: 没有历史耗时{previous_str}")
+            else:
+                print(f"  {name}: 预计耗时 {format_duration(estimate[0])}，"
+                      f"约 {estimate[1] / 1024 ** 3:.2f} GB{previous_str}")
+        return ordered
+
+    def should_start(self, name):
+        """是否还可以开始处理该服务器，已到达截止时间时记录为推迟
+
+        剩余时间少于预计耗时的服务器仍然开始处理：每一项都是独立的，先处理的是价值最高的部分。
+        """
+        if not self.expired():
+            return True
+        self.defer(name, reason="not_started")
+        with self._lock:
+            print(f"已到达截止时间，服务器 {name} 推迟到下一次运行")
+        return False
+
+    def defer(self, name, remaining=0, reason="deadline"):
+        """记录推迟到下一次运行的工作（remaining 为未处理的项数）"""
+        with self._lock:
+            entry = self.deferred.setdefault(name, {"reason": reason, "remaining": 0})
+            entry["remaining"] += remaining
+
+    def record(self, name, seconds, size, items=None):
+        """记录一个服务器本次的耗时、处理的字节数和项数
+
+        被截止时间打断的服务器只处理了一部分，按实际速率折算，不用部分耗时拉低总耗时的估计。
+        """
+        smoothing = self.settings["smoothing"]
+        with self._lock:
+            entry = self.estimates.get(name)
+            if entry is None or entry.get("seconds") is None:
+                entry = {"seconds": seconds, "bytes": size, "runs": 0}
+                if items:
+                    entry["items"] = items
+            elif name in self.deferred:
+                scale = entry["seconds"] / max(seconds, 0.001)
+                entry["bytes"] = (1 - smoothing) * entry["bytes"] + smoothing * size * scale
+                if items and entry.get("items"):
+                    entry["items"] = (1 - smoothing) * entry["items"] + smoothing * items * scale
+            else:
+                entry["seconds"] = (1 - smoothing) * entry["seconds"] + smoothing * seconds
+                entry["bytes"] = (1 - smoothing) * entry["bytes"] + smoothing * size
+                if items:
+                    entry["items"] = (1 - smoothing) * entry.get("items", items) + smoothing * items
+            entry["runs"] = entry.get("runs", 0) + 1
+            self.estimates[name] = entry
+
+    def finish(self, complete=True):
+        """保存耗时和推迟的工作，打印推迟的内容
+
+        complete 为 False 表示本次只处理了部分工作（例如监视模式只检查变化的种子），
+        没有推迟时也保留上次推迟的记录。
+        """
+        if self.deferred:
+            print(f"\n已到达截止时间，推迟到下一次运行的工作（已记录到 {DEFERRED_FILE}）:")
+            for name, info in self.deferred.items():
+                detail = "未开始" if info["reason"] == "not_started" else f"剩余 {info['remaining']} 项"
+                print(f"  {name}: {detail}")
+        try:
+            # 加锁后重新读取，只更新本步骤，避免覆盖同时运行的其他步骤的记录
+            with _file_lock(RUN_TIMINGS_FILE):
+                timings = _load_json(RUN_TIMINGS_FILE)
+                timings[self.step] = self.estimates
+                _save_json(RUN_TIMINGS_FILE, timings)
+            with _file_lock(DEFERRED_FILE):
+                deferred_all = _load_json(DEFERRED_FILE)
+                if self.deferred:
+                    deferred_all[self.step] = {
+                        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        "run_id": self.run_id,
+                        "servers": self.deferred
+                    }
+                elif complete:
+                    deferred_all.pop(self.step, None)
+                _save_json(DEFERRED_FILE, deferred_all)
+        except OSError as e:
+            print(f"保存运行耗时记录时发生错误: {str(e)}")
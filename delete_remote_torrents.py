@@ -1,13 +1,24 @@
-from qbittorrentapi import Client
+import startup_timer
 import json
 import datetime
 import os
 import argparse
 import sys
 import threading
+import time
 import io
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import codecs
+from qb_client import connect
+from delete_throttle import DeletionThrottle
+from pipeline import DeletionPipeline, get_pipeline_settings
+from content_index import ContentIndex, save_files_cache
+from target_set import build_targets
+from interchange import load_list, compact_path, is_compact, read_header, read_targets, KIND_TORRENTS_TO_DELETE
+from history import open_history, record_deletion
+from deadline import DeadlineScheduler, parse_duration
+
+TORRENTS_TO_DELETE_FILE = "torrents_to_delete.json"
 
 # 设置控制台输出编码为UTF-8
 if sys.platform.startswith('win'):
@@ -48,6 +59,14 @@ def get_log_filenames():
     json_file = "logs/delete_records.json"
     return log_file, json_file
 
+def find_targets_file():
+    """返回要删除的种子列表文件，紧凑格式与 JSON 同时存在时使用较新的一个"""
+    candidates = [path for path in (compact_path(TORRENTS_TO_DELETE_FILE), TORRENTS_TO_DELETE_FILE)
+                  if os.path.exists(path)]
+    if not candidates:
+        raise FileNotFoundError(TORRENTS_TO_DELETE_FILE)
+    return max(candidates, key=os.path.getmtime)
+
 def load_existing_records(json_file):
     try:
         with open(json_file, "r", encoding="utf-8") as f:
@@ -56,80 +75,130 @@ def load_existing_records(json_file):
     except (FileNotFoundError, json.JSONDecodeError):
         return []
 
-def process_server(server, torrents_to_delete, debug_mode, log_file, lock):
-    """处理单个服务器的种子删除"""
+def process_server(server, targets, debug_mode, log_file, lock, throttle_settings=None,
+                   keep_shared_payload=False, match_by="name", pipeline_settings=None, history=None,
+                   scheduler=None):
+    """处理单个服务器的种子删除
+    
+    targets 为 build_targets 构建的目标集合，match_by 为 "hash" 时按 infohash 匹配，否则按名称匹配。
+    
+    返回的 server_size 为实际可释放的空间（辅种共享的文件只计算一次）。
+    keep_shared_payload 为 True 时，文件仍被其他种子引用的种子只从客户端移除，不删除文件。
+    pipeline_settings 启用时，匹配到的种子交给独立的删除线程立即删除，检查与删除同时进行。
+    history 不为 None 时每删除一个种子就写入删除历史。
+    scheduler 为 DeadlineScheduler，设置了截止时间时按大小从大到小处理，到达截止时间后停止。
+    """
     mode_str = "[调试模式]" if debug_mode else ""
     server_records = []
     server_found = 0
     server_size = 0
+    server_raw_size = 0
     action_str = "找到" if debug_mode else "删除"
+    pipeline_settings = get_pipeline_settings(pipeline_settings)
+    
+    def record(torrent, freed, action):
+        """记录一个已处理（删除或找到）的种子"""
+        nonlocal server_found, server_size, server_raw_size
+        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        # 准备日志记录
+        log_entry = {
+            "timestamp": current_time,
+            "server_name": server["name"],
+            "torrent_name": torrent.name,
+            "torrent_hash": torrent.hash,
+            "torrent_size": torrent.size,
+            "freed_size": freed,
+            "action": action,
+            "debug_mode": debug_mode
+        }
+        
+        # 打印和写入文本日志
+        size_str = format_size(torrent.size)
+        if freed != torrent.size:
+            size_str += f", 与其他种子共享数据, 可释放: {format_size(freed)}"
+        log_message = f"[{current_time}] {mode_str}服务器[{server['name']}] {action_str}种子: {torrent.name} (大小: {size_str})"
+        with lock:
+            server_records.append(log_entry)
+            server_size += freed
+            server_raw_size += torrent.size
+            server_found += 1
+            print(log_message)
+            if not debug_mode:  # 使用锁来保护文件写入
+                with open(log_file, "a", encoding="utf-8") as f:
+                    f.write(log_message + "\n")
+        if not debug_mode:
+            record_deletion(history, log_entry)
     
     try:
         print(f"\n{mode_str}正在连接服务器 {server['name']}: {server['url']}")
         
         # 连接远程 qBittorrent
-        qb = Client(
-            host=server["url"],
-            username=server["username"],
-            password=server["password"]
-        )
+        qb = connect(server)
+        throttle = DeletionThrottle(throttle_settings, server["name"])
+        pipeline = None
         
         try:
-            qb.auth_log_in()
             with lock:
                 print(f"已成功连接到服务器 {server['name']}")
             
+            if pipeline_settings["enabled"] and not debug_mode:
+                # 删除使用独立的连接，与检查同时进行
+                delete_qb = connect(server)
+                
+                def consume(item):
+                    torrent, freed, delete_files = item
+                    if scheduler is not None and scheduler.expired():
+                        # 到达截止时间后队列中剩余的种子不再删除
+                        scheduler.defer(server["name"], 1)
+                        return
+                    throttle.delete(delete_qb, torrent.hash, torrent.size, torrent.content_path, delete_files)
+                    record(torrent, freed, "deleted" if delete_files else "removed")
+                
+                pipeline = DeletionPipeline(consume, pipeline_settings["queue_size"], server["name"])
+            
             torrents = qb.torrents_info()
             with lock:
                 print(f"正在检查服务器 {server['name']} 的种子...")
             
-            # 创建要删除的种子名称集合
-            target_names = set()
-            for target in torrents_to_delete:
-                target_names.add(target.get("name", "") if isinstance(target, dict) else target)
+            # 内容索引，用于识别辅种共享的文件
+            index = ContentIndex(qb, torrents)
+            removed = set()
             
             # 检查/删除匹配的种子
-            for torrent in torrents:
-                if torrent.name in target_names:  # 使用集合来提高查找效率
-                    current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    
-                    # 在调试模式下只检查不删除
-                    if not debug_mode:
-                        qb.torrents_delete(delete_files=True, torrent_hashes=torrent.hash)
-                        action = "deleted"
-                    else:
-                        action = "found"
-                    
-                    # 准备日志记录
-                    log_entry = {
-                        "timestamp": current_time,
-                        "server_name": server["name"],
-                        "torrent_name": torrent.name,
-                        "torrent_hash": torrent.hash,
-                        "torrent_size": torrent.size,
-                        "action": action,
-                        "debug_mode": debug_mode
-                    }
-                    
-                    server_records.append(log_entry)
-                    server_size += torrent.size
-                    
-                    # 打印和写入文本日志
-                    size_str = format_size(torrent.size)
-                    log_message = f"[{current_time}] {mode_str}服务器[{server['name']}] {action_str}种子: {torrent.name} (大小: {size_str})"
-                    with lock:
-                        print(log_message)
-                    
-                    if not debug_mode:
-                        with lock:  # 使用锁来保护文件写入
-                            with open(log_file, "a", encoding="utf-8") as f:
-                                f.write(log_message + "\n")
-                    
-                    server_found += 1
+            matches = [torrent for torrent in torrents
+                       if (torrent.hash if match_by == "hash" else torrent.name) in targets]
+            if scheduler is not None and scheduler.deadline is not None:
+                # 每次删除的API耗时相近，有截止时间时先处理最大的种子
+                matches.sort(key=lambda torrent: torrent.size, reverse=True)
+            for position, torrent in enumerate(matches):
+                if scheduler is not None and scheduler.expired():
+                    scheduler.defer(server["name"], len(matches) - position)
+                    break
+                freed = index.freed_by(torrent.hash, removed)
+                removed.add(torrent.hash)
+                
+                # 在调试模式下只检查不删除
+                if debug_mode:
+                    record(torrent, freed, "found")
+                    continue
+                delete_files = not keep_shared_payload or index.can_delete_files(torrent.hash, removed)
+                if pipeline is not None:
+                    pipeline.submit((torrent, freed, delete_files))
+                else:
+                    throttle.delete(qb, torrent.hash, torrent.size, torrent.content_path, delete_files)
+                    record(torrent, freed, "deleted" if delete_files else "removed")
+            
+            if pipeline is not None:
+                pipeline.close()
+                pipeline.check()
             
             with lock:
                 if server_found > 0:
-                    print(f"在服务器 {server['name']} 上{action_str}了 {server_found} 个种子 (总大小: {format_size(server_size)})")
+                    print(f"在服务器 {server['name']} 上{action_str}了 {server_found} 个种子 "
+                          f"(总大小: {format_size(server_raw_size)}, 实际可释放: {format_size(server_size)})")
+                    if pipeline is not None and pipeline.first_done is not None:
+                        print(f"开始检查后 {pipeline.first_done:.1f} 秒删除了第一个种子")
                 else:
                     print(f"在服务器 {server['name']} 上未找到需要{action_str}的种子")
             
@@ -142,6 +211,10 @@ def process_server(server, torrents_to_delete, debug_mode, log_file, lock):
                     with open(log_file, "a", encoding="utf-8") as f:
                         f.write(error_message + "\n")
         finally:
+            if pipeline is not None:
+                pipeline.close()
+                delete_qb.auth_log_out()
+            throttle.close()
             qb.auth_log_out()
             
     except Exception as e:
@@ -150,7 +223,95 @@ def process_server(server, torrents_to_delete, debug_mode, log_file, lock):
     
     return server_records, server_found, server_size
 
-def delete_remote_torrents(debug_mode=False):
+def process_server_via_agent(server, targets, debug_mode, log_file, lock, throttle_settings=None,
+                             keep_shared_payload=False, match_by="name", pipeline_settings=None, history=None,
+                             scheduler=None):
+    """通过服务器旁运行的代理处理种子删除，只传输目标集合和精简结果
+    
+    限速和辅种处理使用代理端的配置，throttle_settings、keep_shared_payload 与 pipeline_settings 在此忽略。
+    匹配和删除由代理一次完成，截止时间只在开始前（delete_remote_torrents 中）检查，scheduler 在此忽略。
+    """
+    mode_str = "[调试模式]" if debug_mode else ""
+    action_str = "找到" if debug_mode else "删除"
+    server_records = []
+    server_size = 0
+    
+    try:
+        print(f"\n{mode_str}正在连接服务器 {server['name']} 的代理: {server['agent_url']}")
+        from agent import AgentClient
+        client = AgentClient(server["agent_url"], server.get("agent_token"))
+        
+        matches = client.match(targets, match_by)
+        deleted = set()
+        delete_files = {}
+        if matches and not debug_mode:
+            result = client.delete(m["hash"] for m in matches)
+            deleted = set(result["deleted"])
+            delete_files = result.get("delete_files", {})
+            for torrent_hash, error in result.get("failed", {}).items():
+                error_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                error_message = f"[{error_time}] 代理删除服务器 {server['name']} 的种子 {torrent_hash} 时发生错误: {error}"
+                with lock:
+                    print(error_message)
+                    with open(log_file, "a", encoding="utf-8") as f:
+                        f.write(error_message + "\n")
+        
+        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for match in matches:
+            if not debug_mode and match["hash"] not in deleted:
+                continue
+            if debug_mode:
+                action = "found"
+            else:
+                # 辅种共享的文件仍被使用时代理只从客户端移除种子
+                action = "deleted" if delete_files.get(match["hash"], True) else "removed"
+            log_entry = {
+                "timestamp": current_time,
+                "server_name": server["name"],
+                "torrent_name": match["name"],
+                "torrent_hash": match["hash"],
+                "torrent_size": match["size"],
+                "freed_size": match["freed"],
+                "action": action,
+                "debug_mode": debug_mode
+            }
+            server_records.append(log_entry)
+            if not debug_mode:
+                record_deletion(history, log_entry)
+            server_size += match["freed"]
+            log_message = f"[{current_time}] {mode_str}服务器[{server['name']}] {action_str}种子: {match['name']} (大小: {format_size(match['size'])})"
+            with lock:
+                print(log_message)
+                if not debug_mode:
+                    with open(log_file, "a", encoding="utf-8") as f:
+                        f.write(log_message + "\n")
+        
+        with lock:
+            if server_records:
+                print(f"在服务器 {server['name']} 上{action_str}了 {len(server_records)} 个种子 (实际可释放: {format_size(server_size)})")
+            else:
+                print(f"在服务器 {server['name']} 上未找到需要{action_str}的种子")
+    
+    except Exception as e:
+        error_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        error_message = f"[{error_time}] {mode_str}处理服务器 {server['name']} 的代理时发生错误: {str(e)}"
+        with lock:
+            print(error_message)
+            if not debug_mode:
+                with open(log_file, "a", encoding="utf-8") as f:
+                    f.write(error_message + "\n")
+    
+    return server_records, len(server_records), server_size
+
+def delete_remote_torrents(debug_mode=False, selected_hashes=None, run_id=None, deadline=None):
+    """删除远程服务器上与本地待迁移种子对应的种子
+    
+    selected_hashes 为本地种子 hash 的集合时只处理其中的种子（图形界面中勾选的种子）。
+    删除的种子同时写入删除历史（history.py），run_id 为发起删除的运行ID。
+    deadline 为本次运行的时间预算（秒）：按历史耗时估计每个服务器的成本，先处理每秒可释放空间最多的服务器，
+    到达截止时间后停止，未完成的工作记录在 cache/deferred_work.json 中，下一次运行优先处理。
+    返回本次运行的删除记录列表（调试模式下为找到的种子），出错时返回 None。
+    """
     create_log_directory()
     log_file, json_file = get_log_filenames()
     
@@ -159,12 +320,36 @@ def delete_remote_torrents(debug_mode=False):
         existing_records = load_existing_records(json_file)
         deletion_records = existing_records
         
-        # 读取要删除的种子列表
+        # 加载配置
+        config = load_config()
+        remote_servers = config["remote_servers"]
+        match_by = config.get("match_by", "name")
+        if run_id is None:
+            from profiling import new_run_id
+            run_id = new_run_id()
+        # 截止时间从此刻开始计算；调试模式不删除，耗时与实际删除不同，分开记录
+        scheduler = DeadlineScheduler("delete_remote_torrents" + (":debug" if debug_mode else ""), deadline,
+                                      config.get("deadline"), run_id)
+        
+        # 读取要删除的种子列表（优先使用紧凑格式），目标集合只构建一次，各服务器线程共用
         try:
-            with open("torrents_to_delete.json", "r", encoding="utf-8") as f:
-                torrents_to_delete = json.load(f)
-                if not isinstance(torrents_to_delete, list):
-                    raise ValueError("torrents_to_delete.json 格式错误：必须是数组类型")
+            targets_file = find_targets_file()
+            # 紧凑格式且不需要按勾选筛选时直接读取打包好的目标集合，不解析记录
+            direct = selected_hashes is None and is_compact(targets_file)
+            if direct:
+                header, torrents_to_delete = read_header(targets_file), None
+            else:
+                header, torrents_to_delete = load_list(targets_file)
+            if header.get("kind") != KIND_TORRENTS_TO_DELETE:
+                raise ValueError(f"{targets_file} 类型错误：应为待迁移种子列表（{KIND_TORRENTS_TO_DELETE}），"
+                                 f"实际为 {header.get('kind') or '未知类型'}")
+            if direct:
+                targets = read_targets(targets_file, match_by)
+            else:
+                if selected_hashes is not None:
+                    torrents_to_delete = [t for t in torrents_to_delete
+                                          if isinstance(t, dict) and t.get("hash") in selected_hashes]
+                targets = build_targets(torrents_to_delete, match_by)
         except FileNotFoundError:
             print("未找到要删除的种子列表文件")
             return
@@ -172,44 +357,64 @@ def delete_remote_torrents(debug_mode=False):
             print(f"种子列表文件JSON格式错误: {str(e)}")
             return
         
-        # 加载配置
-        config = load_config()
-        remote_servers = config["remote_servers"]
-        
         mode_str = "[调试模式]" if debug_mode else ""
         total_found = 0
         total_size = 0
+        run_records = []
         action_str = "找到" if debug_mode else "删除"
         
         # 创建线程锁
         lock = threading.Lock()
+        history = None if debug_mode else open_history(run_id, "delete_remote_torrents")
+        servers_by_name = {server["name"]: server for server in remote_servers}
+        ordered_servers = [servers_by_name[name] for name in scheduler.order(servers_by_name)]
         
-        # 使用线程池同时处理多个服务器
-        with ThreadPoolExecutor(max_workers=len(remote_servers)) as executor:
-            # 提交所有任务
-            future_to_server = {
-                executor.submit(
-                    process_server, server, torrents_to_delete, debug_mode, log_file, lock
-                ): server for server in remote_servers
-            }
-            
-            # 收集结果
-            for future in as_completed(future_to_server):
-                server = future_to_server[future]
-                try:
-                    server_records, server_found, server_size = future.result()
-                    if not debug_mode:
-                        deletion_records.extend(server_records)
-                    total_found += server_found
-                    total_size += server_size
-                except Exception as e:
-                    with lock:
-                        print(f"处理服务器 {server['name']} 时发生错误: {str(e)}")
+        def run_server(server):
+            """到达截止时间或剩余时间不足时跳过，否则处理并记录耗时"""
+            if not scheduler.should_start(server["name"]):
+                return [], 0, 0
+            started = time.perf_counter()
+            result = (process_server_via_agent if server.get("agent_url") else process_server)(
+                server, targets, debug_mode, log_file, lock,
+                config.get("delete_throttle"), config.get("keep_shared_payload", False), match_by,
+                config.get("pipeline"), history, scheduler
+            )
+            scheduler.record(server["name"], time.perf_counter() - started, result[2])
+            return result
+        
+        try:
+            # 使用线程池同时处理多个服务器，有截止时间时按优先顺序限制同时处理的数量
+            workers = len(remote_servers) if deadline is None else scheduler.settings["workers"]
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                # 提交所有任务
+                future_to_server = {
+                    executor.submit(run_server, server): server for server in ordered_servers
+                }
+                
+                # 收集结果
+                for future in as_completed(future_to_server):
+                    server = future_to_server[future]
+                    try:
+                        server_records, server_found, server_size = future.result()
+                        run_records.extend(server_records)
+                        if not debug_mode:
+                            deletion_records.extend(server_records)
+                        total_found += server_found
+                        total_size += server_size
+                    except Exception as e:
+                        with lock:
+                            print(f"处理服务器 {server['name']} 时发生错误: {str(e)}")
+        finally:
+            if history is not None:
+                history.close()
+            scheduler.finish(complete=selected_hashes is None)
+        
+        save_files_cache()
         
         # 打印总结
         print(f"\n=== 总结 ===")
         print(f"所有服务器共{action_str}了 {total_found} 个种子")
-        print(f"总大小: {format_size(total_size)}")
+        print(f"实际可释放空间: {format_size(total_size)}")
         
         # 只在非调试模式下���新JSON记录
         if not debug_mode and total_found > 0:
@@ -224,6 +429,7 @@ def delete_remote_torrents(debug_mode=False):
             print(f"JSON记录已更新至: {json_file}")
         elif debug_mode:
             print(f"\n调试模式检查完成！未执行任何删除操作")
+        return run_records
             
     except Exception as e:
         print(f"程序执行过程中发生错误: {str(e)}")
@@ -231,6 +437,11 @@ def delete_remote_torrents(debug_mode=False):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='远程种子删除工具')
     parser.add_argument('--debug', '-d', action='store_true', help='启用调试模式（只检查不删除）')
+    parser.add_argument('--profile', action='store_true', help='记录CPU和内存分析结果到 logs/')
+    parser.add_argument('--deadline', type=parse_duration, metavar='DURATION',
+                        help='本次运行的时间预算，例如 30m、1h、600（秒）；到达后停止并记录推迟的工作')
     args = parser.parse_args()
     
-    delete_remote_torrents(debug_mode=args.debug) 
\ No newline at end of file
+    from profiling import run_profiled
+    run_profiled("delete_remote_torrents", delete_remote_torrents, enabled=args.profile, debug_mode=args.debug,
+                 deadline=args.deadline) 
\ No newline at end of file
@@ -0,0 +1,272 @@
+import json
+import os
+import sys
+import threading
+import time
+import argparse
+import io
+import codecs
+
+# 设置控制台输出编码为UTF-8
+if sys.platform.startswith('win'):
+    try:
+        import codecs
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer)
+    except (AttributeError, io.UnsupportedOperation):
+        pass  # 如果无法设置编码，保持默认设置
+
+# 延迟删除文件的待处理队列
+PENDING_UNLINK_FILE = "cache/pending_unlink.json"
+
+DEFAULT_THROTTLE_SETTINGS = {
+    "bytes_per_second": 0,        # 每秒删除的数据量上限，0 表示不限
+    "files_per_second": 0,        # 每秒删除的文件数上限，0 表示不限
+    "max_latency": 2.0,           # 删除请求耗时超过该值（秒）时降速
+    "max_queued_io_jobs": 64,     # 服务器磁盘队列超过该值时暂停
+    "disk_check_interval": 20,    # 每删除多少个种子检查一次磁盘状态
+    "deferred_unlink": False,     # 先从客户端移除，稍后分批删除文件
+    "unlink_batch_size": 20,
+    "unlink_interval": 30,
+    "path_map": {}                # 服务器路径到本机路径的映射
+}
+
+# 降速系数的下限
+MIN_FACTOR = 0.05
+
+_pending_lock = threading.Lock()
+
+def format_size(size_bytes):
+    """将字节大小转换为人类可读的格式"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.2f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.2f} PB"
+
+def get_throttle_settings(settings=None):
+    """合并用户配置与默认限速配置"""
+    merged = dict(DEFAULT_THROTTLE_SETTINGS)
+    if isinstance(settings, dict):
+        merged.update(settings)
+    return merged
+
+def load_pending(pending_file=PENDING_UNLINK_FILE):
+    try:
+        with open(pending_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+            return data if isinstance(data, list) else []
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+def save_pending(entries, pending_file=PENDING_UNLINK_FILE):
+    """原子写入待删除文件队列"""
+    pending_dir = os.path.dirname(pending_file)
+    if pending_dir and not os.path.exists(pending_dir):
+        os.makedirs(pending_dir)
+    tmp_file = pending_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_file, pending_file)
+
+class DeletionThrottle:
+    """单个服务器的删除限速器
+
+    按字节/文件数预算控制删除节奏，并根据删除请求耗时和服务器磁盘队列自动降速。
+    启用 deferred_unlink 时只从客户端移除种子，种子自己的文件列表写入待删除队列，由 unlink_pending 分批删除。
+    """
+
+    def __init__(self, settings=None, server_name=""):
+        self.settings = get_throttle_settings(settings)
+        self.server_name = server_name
+        self.factor = 1.0
+        self.pending = []
+        self._next_time = time.monotonic()
+        self._count = 0
+
+    @property
+    def enabled(self):
+        return bool(self.settings["bytes_per_second"] or self.settings["files_per_second"])
+
+    def _file_count(self, qb, torrent_hash):
+        if not self.settings["files_per_second"]:
+            return 0
+        try:
+            return len(qb.torrents_files(torrent_hash=torrent_hash))
+        except Exception:
+            return 1
+
+    def _wait(self, size, files):
+        cost = 0.0
+        if self.settings["bytes_per_second"]:
+            cost = max(cost, size / self.settings["bytes_per_second"])
+        if self.settings["files_per_second"]:
+            cost = max(cost, files / self.settings["files_per_second"])
+        now = time.monotonic()
+        if self._next_time > now:
+            time.sleep(self._next_time - now)
+        self._next_time = max(now, self._next_time) + cost / self.factor
+
+    def _adapt(self, qb, latency):
+        if latency > self.settings["max_latency"]:
+            self.factor = max(MIN_FACTOR, self.factor / 2)
+            print(f"服务器 {self.server_name} 删除请求耗时 {latency:.1f} 秒，降低删除速度")
+        else:
+            self.factor = min(1.0, self.factor * 1.1)
+
+        self._count += 1
+        if self._count % self.settings["disk_check_interval"]:
+            return
+        # 服务器磁盘队列积压时暂停，直到队列回落
+        try:
+            while True:
+                state = qb.sync_maindata().get("server_state", {})
+                queued = state.get("queued_io_jobs", 0)
+                if queued <= self.settings["max_queued_io_jobs"]:
+                    break
+                self.factor = max(MIN_FACTOR, self.factor / 2)
+                print(f"服务器 {self.server_name} 磁盘队列积压 ({queued})，暂停删除...")
+                time.sleep(5)
+        except Exception:
+            pass
+
+    def delete(self, qb, torrent_hash, size, content_path=None, delete_files=True):
+        """删除单个种子及其文件，delete_files 为 False 时只从客户端移除种子"""
+        deferred = self.settings["deferred_unlink"]
+        if not delete_files or (not self.enabled and not deferred):
+            qb.torrents_delete(delete_files=delete_files, torrent_hashes=torrent_hash)
+            return
+
+        if deferred:
+            # 移除种子前记录它自己的文件：不带子文件夹添加的多文件种子 content_path 就是保存目录，
+            # 不能按目录删除
+            info = qb.torrents_info(torrent_hashes=torrent_hash)[0]
+            files = [f.name for f in qb.torrents_files(torrent_hash=torrent_hash)]
+            qb.torrents_delete(delete_files=False, torrent_hashes=torrent_hash)
+            self.pending.append({
+                "server": self.server_name,
+                "hash": torrent_hash,
+                "path": content_path or info.content_path,
+                "save_path": info.save_path,
+                "files": files,
+                "size": size,
+                "queued": time.time()
+            })
+            return
+
+        self._wait(size, self._file_count(qb, torrent_hash))
+        start = time.perf_counter()
+        qb.torrents_delete(delete_files=True, torrent_hashes=torrent_hash)
+        self._adapt(qb, time.perf_counter() - start)
+
+    def close(self):
+        """将延迟删除的文件追加到待删除队列"""
+        if not self.pending:
+            return
+        with _pending_lock:
+            save_pending(load_pending() + self.pending)
+        print(f"服务器 {self.server_name} 有 {len(self.pending)} 个种子的文件已加入待删除队列")
+        self.pending = []
+
+def map_path(path, path_map):
+    """将服务器上的路径映射为本机路径"""
+    for remote_prefix, local_prefix in path_map.items():
+        if path.startswith(remote_prefix):
+            return local_prefix + path[len(remote_prefix):]
+    return path
+
+def entry_files(entry, path_map):
+    """待删除条目对应的本机文件路径和保存目录，文件名不合法（包含 ..）时抛出 ValueError"""
+    save_path = map_path(entry["save_path"], path_map)
+    paths = []
+    for name in entry["files"]:
+        parts = name.replace("\\", "/").split("/")
+        if ".." in parts or os.path.isabs(name):
+            raise ValueError(f"文件名不合法: {name}")
+        paths.append(os.path.join(save_path, *parts))
+    return paths, save_path
+
+def remove_empty_dirs(path, stop):
+    """从 path 向上删除空目录，直到（不包括）stop"""
+    stop = os.path.normpath(stop)
+    path = os.path.normpath(path)
+    while path != stop and path.startswith(stop + os.sep):
+        try:
+            os.rmdir(path)
+        except OSError:
+            return
+        path = os.path.dirname(path)
+
+def unlink_entry(entry, path_map):
+    """删除一个待删除条目的文件，返回是否已删除；失败或找不到文件时返回 False，条目保留在队列中重试"""
+    if "files" not in entry:
+        # 旧版本加入的条目没有文件列表，只删除单个文件，目录需要手动确认
+        path = map_path(entry["path"], path_map)
+        if os.path.isfile(path):
+            os.remove(path)
+            print(f"已删除文件: [{entry['server']}] {path}")
+            return True
+        if os.path.isdir(path):
+            print(f"条目没有文件列表，不自动删除目录，请手动处理: [{entry['server']}] {path}")
+        else:
+            print(f"路径不存在，保留在队列中: [{entry['server']}] {path}")
+        return False
+
+    paths, save_path = entry_files(entry, path_map)
+    existing = [path for path in paths if os.path.isfile(path)]
+    if paths and not existing:
+        print(f"文件不存在（请检查 path_map），保留在队列中: [{entry['server']}] {entry['path']}")
+        return False
+    for path in existing:
+        os.remove(path)
+    for directory in sorted({os.path.dirname(path) for path in existing}, key=len, reverse=True):
+        remove_empty_dirs(directory, save_path)
+    print(f"已删除 {len(existing)} 个文件: [{entry['server']}] {entry['path']}")
+    return True
+
+def unlink_pending(settings=None):
+    """分批删除待删除队列中的文件，每批之间暂停以分散磁盘压力"""
+    settings = get_throttle_settings(settings)
+    with _pending_lock:
+        entries = load_pending()
+    if not entries:
+        print("待删除队列为空")
+        return
+
+    print(f"待删除队列中共有 {len(entries)} 项")
+    batch_size = max(1, settings["unlink_batch_size"])
+    removed_size = 0
+    while entries:
+        batch, entries = entries[:batch_size], entries[batch_size:]
+        done = set()
+        for entry in batch:
+            try:
+                if unlink_entry(entry, settings["path_map"]):
+                    done.add((entry["server"], entry["hash"], entry["path"]))
+                    removed_size += entry.get("size", 0)
+            except (OSError, ValueError) as e:
+                print(f"删除文件 [{entry['server']}] {entry['path']} 时发生错误: {str(e)}")
+
+        with _pending_lock:
+            # 只移除已删除的条目：失败的条目留待下次重试，其他进程在处理期间新加入的条目也保留
+            current = load_pending()
+            save_pending([entry for entry in current
+                          if (entry.get("server"), entry.get("hash"), entry.get("path")) not in done])
+
+        if entries:
+            wait = settings["unlink_interval"]
+            if settings["bytes_per_second"]:
+                wait = max(wait, sum(entry.get("size", 0) for entry in batch) / settings["bytes_per_second"])
+            time.sleep(wait)
+
+    print(f"\n待删除队列处理完成，共释放 {format_size(removed_size)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='处理延迟删除的种子文件')
+    parser.parse_args()
+
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            throttle_settings = json.load(f).get("delete_throttle")
+    except (FileNotFoundError, json.JSONDecodeError):
+        throttle_settings = None
+    unlink_pending(throttle_settings)
@@ -0,0 +1,305 @@
+import csv
+import argparse
+import datetime
+import glob
+import os
+import re
+import sys
+import io
+import codecs
+from collections import OrderedDict
+from interchange import (is_compact, read_header, iter_records, iter_json_array,
+                         KIND_TORRENTS_TO_DELETE, KIND_DELETED_TORRENTS)
+
+KIND_DELETE_RECORDS = "delete_records"
+
+# Parquet 每个行组（以及内存中缓存）的最大行数
+ROW_GROUP_SIZE = 65536
+
+# 分区导出时所有分区合计最多缓存的行数，超过后先写出缓存最多的分区
+MAX_BUFFERED_ROWS = ROW_GROUP_SIZE * 4
+
+# 分区导出时同时打开的文件数上限（Windows C 运行库默认最多 512 个），超过后关闭最久未写入的分区
+MAX_OPEN_SINKS = 64
+
+# 各类型导出的列：(列名, 类型)，类型为 string / int64 / bool / timestamp
+COLUMNS = {
+    KIND_TORRENTS_TO_DELETE: [
+        ("scanned", "timestamp"), ("name", "string"), ("hash", "string"), ("size", "int64"),
+        ("category", "string"), ("tags", "string"), ("sources", "string")
+    ],
+    KIND_DELETED_TORRENTS: [
+        ("scanned", "timestamp"), ("server", "string"), ("name", "string"), ("hash", "string"),
+        ("size", "int64"), ("tracker_msg", "string"), ("deleted", "bool")
+    ],
+    KIND_DELETE_RECORDS: [
+        ("timestamp", "timestamp"), ("server_name", "string"), ("torrent_name", "string"),
+        ("torrent_hash", "string"), ("torrent_size", "int64"), ("freed_size", "int64"),
+        ("action", "string"), ("debug_mode", "bool")
+    ]
+}
+
+# 按日期/服务器分区时使用的列
+PARTITION_COLUMNS = {
+    KIND_TORRENTS_TO_DELETE: {"date": "scanned", "server": "sources"},
+    KIND_DELETED_TORRENTS: {"date": "scanned", "server": "server"},
+    KIND_DELETE_RECORDS: {"date": "timestamp", "server": "server_name"}
+}
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 分区目录名中不能使用的字符
+UNSAFE_PATH_CHARS = re.compile(r'[\\/:*?"<>|]')
+
+# 设置控制台输出编码为UTF-8
+if sys.platform.startswith('win'):
+    try:
+        import codecs
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer)
+    except (AttributeError, io.UnsupportedOperation):
+        pass
+
+def detect_json_kind(path):
+    """根据文件开头判断 JSON 文件的类型"""
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(65536)
+    if head.lstrip().startswith("["):
+        return KIND_TORRENTS_TO_DELETE
+    positions = {kind: match.start() for kind, match in (
+        (KIND_DELETED_TORRENTS, re.search(r'"torrents"\s*:\s*\[', head)),
+        (KIND_DELETE_RECORDS, re.search(r'"records"\s*:\s*\[', head))
+    ) if match}
+    if not positions:
+        raise ValueError(f"无法识别的文件: {path}")
+    return min(positions, key=positions.get)
+
+def open_source(path):
+    """返回 (类型, 记录迭代器)，扫描结果的记录附带扫描时间 scanned"""
+    mtime = datetime.datetime.fromtimestamp(os.path.getmtime(path)).strftime(TIMESTAMP_FORMAT)
+    if is_compact(path):
+        header = read_header(path)
+        kind, records = header["kind"], iter_records(path)
+        scanned = header.get("timestamp") or mtime
+    else:
+        kind = detect_json_kind(path)
+        key = {KIND_TORRENTS_TO_DELETE: None, KIND_DELETED_TORRENTS: "torrents", KIND_DELETE_RECORDS: "records"}[kind]
+        records = iter_json_array(path, key)
+        scanned = mtime
+        if kind == KIND_DELETED_TORRENTS:
+            # 文件头中的 timestamp 位于 torrents 数组之前
+            with open(path, "r", encoding="utf-8") as f:
+                match = re.search(r'"timestamp"\s*:\s*"([^"]+)"', f.read(4096).split('"torrents"')[0])
+            scanned = match.group(1) if match else mtime
+    if kind == KIND_DELETE_RECORDS:
+        return kind, records
+    return kind, (dict(record, scanned=scanned) for record in records)
+
+def to_row(record, columns):
+    row = []
+    for name, column_type in columns:
+        value = record.get(name)
+        if isinstance(value, list):
+            value = ",".join(str(v) for v in value)
+        if column_type == "int64":
+            value = int(value or 0)
+        elif column_type == "bool":
+            value = bool(value)
+        elif value is None:
+            value = ""
+        row.append(value)
+    return row
+
+def partition_key(record, kind, partition):
+    """分区目录，例如 ("date=2024-01-01", "server=服务器1")"""
+    parts = []
+    for field in partition:
+        value = record.get(PARTITION_COLUMNS[kind][field])
+        if isinstance(value, list):
+            value = "+".join(value)
+        value = str(value or "unknown")
+        if field == "date":
+            value = value[:10]
+        parts.append(f"{field}={UNSAFE_PATH_CHARS.sub('_', value)}")
+    return tuple(parts)
+
+class CsvSink:
+    """逐行写入文件，不在内存中缓存行；append 为 True 时续写已关闭的分区文件"""
+
+    def __init__(self, path, columns, append=False):
+        self._file = open(path, "a" if append else "w", encoding="utf-8-sig", newline="")
+        self._writer = csv.writer(self._file)
+        if not append:
+            self._writer.writerow([name for name, _ in columns])
+
+    @property
+    def buffered(self):
+        return 0
+
+    def write(self, row):
+        self._writer.writerow(row)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._file.close()
+
+class ParquetSink:
+    """每 ROW_GROUP_SIZE 行写入一个行组，内存中最多缓存一个行组
+
+    file_per_flush 为 True 时（分区导出）不保持文件打开，每次写出都生成一个新文件：
+    part.parquet、part-1.parquet、part-2.parquet...，分区再多也不会占用文件句柄。
+    """
+
+    def __init__(self, path, columns, file_per_flush=False):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self._pq = pq
+        self.path = path
+        self.columns = columns
+        types = {"string": pa.string(), "int64": pa.int64(), "bool": pa.bool_(), "timestamp": pa.timestamp("s")}
+        self.schema = pa.schema([(name, types[column_type]) for name, column_type in columns])
+        self.file_per_flush = file_per_flush
+        self._writer = None
+        self._files = 0
+        self._rows = []
+
+    @property
+    def buffered(self):
+        return len(self._rows)
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        arrays = []
+        for index, (name, column_type) in enumerate(self.columns):
+            values = [row[index] for row in self._rows]
+            if column_type == "timestamp":
+                values = [parse_timestamp(value) for value in values]
+            arrays.append(self._pa.array(values, type=self.schema.field(name).type))
+        table = self._pa.Table.from_arrays(arrays, schema=self.schema)
+        self._rows = []
+        if self.file_per_flush:
+            root, ext = os.path.splitext(self.path)
+            path = f"{root}-{self._files}{ext}" if self._files else self.path
+            self._pq.write_table(table, path, compression="zstd")
+            self._files += 1
+            return
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path, self.schema, compression="zstd")
+        self._writer.write_table(table)
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+
+def parse_timestamp(value):
+    try:
+        return datetime.datetime.strptime(value, TIMESTAMP_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+def limit_buffered(sinks, limit=MAX_BUFFERED_ROWS):
+    """所有分区缓存的行数超过 limit 时，从缓存最多的分区开始写出，直到降到 limit 的一半；返回剩余的缓存行数"""
+    buffered = sum(sink.buffered for sink in sinks)
+    if buffered <= limit:
+        return buffered
+    for sink in sorted(sinks, key=lambda sink: sink.buffered, reverse=True):
+        if buffered <= limit // 2:
+            break
+        buffered -= sink.buffered
+        sink.flush()
+    return buffered
+
+def export(inputs, output, output_format="csv", partition=()):
+    """把扫描结果或删除记录流式导出为 CSV 或 Parquet
+
+    inputs 可以是多个同类型的文件（JSON 或紧凑格式），逐条读取、逐行写出，内存占用与文件大小无关。
+    partition 包含 "date" 和/或 "server" 时 output 为目录，按 date=.../server=.../part.<格式> 分区写入，
+    所有分区合计最多缓存 MAX_BUFFERED_ROWS 行；Parquet 分区每次写出生成一个新文件，
+    CSV 分区最多同时打开 MAX_OPEN_SINKS 个文件，超过后关闭最久未写入的分区，之后再续写。
+    返回导出的行数。
+    """
+    if output_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError("导出 Parquet 需要安装 pyarrow: pip install pyarrow")
+    kind = None
+    # 打开的分区按最近写入的顺序排列
+    sinks = OrderedDict()
+    # 已关闭过的 CSV 分区，再次打开时续写
+    closed = set()
+    count = 0
+    # 自上次检查以来写入的行数加上当时的缓存行数，是当前缓存行数的上限
+    buffered = 0
+    try:
+        for path in inputs:
+            source_kind, records = open_source(path)
+            if kind is None:
+                kind = source_kind
+            elif source_kind != kind:
+                raise ValueError(f"{path} 与其他输入文件的类型不同（{source_kind} / {kind}）")
+            columns = COLUMNS[kind]
+            for record in records:
+                key = partition_key(record, kind, partition) if partition else ()
+                sink = sinks.get(key)
+                if sink is None:
+                    if partition:
+                        directory = os.path.join(output, *key)
+                        os.makedirs(directory, exist_ok=True)
+                        path_out = os.path.join(directory, f"part.{output_format}")
+                    else:
+                        output_dir = os.path.dirname(output)
+                        if output_dir:
+                            os.makedirs(output_dir, exist_ok=True)
+                        path_out = output
+                    if output_format == "parquet":
+                        sink = ParquetSink(path_out, columns, file_per_flush=bool(partition))
+                    else:
+                        if len(sinks) >= MAX_OPEN_SINKS:
+                            oldest_key, oldest = sinks.popitem(last=False)
+                            oldest.close()
+                            closed.add(oldest_key)
+                        sink = CsvSink(path_out, columns, append=key in closed)
+                    sinks[key] = sink
+                else:
+                    sinks.move_to_end(key)
+                sink.write(to_row(record, columns))
+                count += 1
+                buffered += 1
+                if buffered > MAX_BUFFERED_ROWS:
+                    buffered = limit_buffered(sinks.values())
+            print(f"已读取: {path}")
+    finally:
+        for sink in sinks.values():
+            sink.close()
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='将扫描结果或删除记录导出为 CSV / Parquet')
+    parser.add_argument('inputs', nargs='+',
+                        help='输入文件（支持通配符），例如 logs/delete_records.json 或 "logs/deleted_torrents_*"')
+    parser.add_argument('--output', '-o', required=True, help='输出文件；分区导出时为输出目录')
+    parser.add_argument('--format', '-f', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--partition', '-p', default='',
+                        help='按 date、server 分区，多个用逗号分隔，例如 date,server')
+    args = parser.parse_args()
+
+    try:
+        partition = tuple(field for field in args.partition.split(",") if field)
+        for field in partition:
+            if field not in ("date", "server"):
+                raise ValueError(f"不支持的分区字段: {field}")
+        inputs = sorted({path for pattern in args.inputs for path in (glob.glob(pattern) or [pattern])})
+        count = export(inputs, args.output, args.format, partition)
+        print(f"共导出 {count} 行至: {args.output}")
+    except Exception as e:
+        print(f"程序执行过程中发生错误: {str(e)}")
@@ -0,0 +1,377 @@
+import json
+import argparse
+import datetime
+import os
+import re
+import sys
+import threading
+import time
+import io
+import codecs
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+from tracker_cache import TRACKER_CACHE_FILE, load_tracker_cache, STATUS_DELETED
+
+# 每个服务器的种子索引（精简字段）及其统计结果
+FLEET_INDEX_DIR = "cache/fleet_index"
+FLEET_INDEX_VERSION = 1
+
+# 在其他服务器上有相同内容的种子，供 free_space.py 选择清理对象
+DUPLICATES_FILE = "cache/fleet_duplicates.json"
+# 版本 2 起每组保留一个副本（keeper）不列入清理对象；旧版本的文件列出了所有副本，不再使用
+DUPLICATES_VERSION = 2
+
+DEFAULT_FLEET_SETTINGS = {
+    "max_age_minutes": 60,   # 索引在该时间内直接使用缓存，不连接服务器
+    "top": 20                # 报告中每项列出的条目数
+}
+
+SITE_DELETED_TAG = "站点删种"
+NO_TRACKER = "(无可用Tracker)"
+NO_CATEGORY = "(无分类)"
+
+# 视为失效的种子状态
+DEAD_STATES = {"error", "missingFiles"}
+
+# 索引中每个种子保存的字段（按顺序存为数组）
+NAME, SIZE, TRACKER, CATEGORY, TAGS, STATE, PROGRESS = range(7)
+
+# 设置控制台输出编码为UTF-8
+if sys.platform.startswith('win'):
+    try:
+        import codecs
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer)
+    except (AttributeError, io.UnsupportedOperation):
+        pass
+
+def format_size(size_bytes):
+    """将字节大小转换为人类可读的格式"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.2f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.2f} PB"
+
+def load_config():
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            config = json.load(f)
+            if not isinstance(config, dict):
+                raise ValueError("配置文件格式错误：根对象必须是字典类型")
+            return config
+    except json.JSONDecodeError as e:
+        raise ValueError(f"配置文件JSON格式错误: {str(e)}")
+    except FileNotFoundError:
+        raise FileNotFoundError("找不到配置文件 config.json")
+
+def get_fleet_settings(settings=None):
+    """合并用户配置与默认统计配置"""
+    merged = dict(DEFAULT_FLEET_SETTINGS)
+    if isinstance(settings, dict):
+        merged.update(settings)
+    return merged
+
+def get_fleet_servers(config):
+    """本地服务器和所有远程服务器（只通过代理访问的服务器除外）"""
+    servers = []
+    local = config.get("local_server")
+    if local and (local.get("url") or local.get("bt_backup")):
+        servers.append(dict(local, name="本地服务器"))
+    servers.extend(server for server in config.get("remote_servers", [])
+                   if server.get("url") and not server.get("agent_url"))
+    return servers
+
+def tracker_host(url):
+    """Tracker 地址只保留主机名（去掉 passkey 等）"""
+    if not url:
+        return NO_TRACKER
+    return urlsplit(url).hostname or NO_TRACKER
+
+def index_path(server_name):
+    return os.path.join(FLEET_INDEX_DIR, re.sub(r'[\\/:*?"<>|]', "_", server_name) + ".json")
+
+def load_server_index(server_name):
+    try:
+        with open(index_path(server_name), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        return index if isinstance(index, dict) and index.get("version") == FLEET_INDEX_VERSION else None
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def save_server_index(server_name, index):
+    """原子写入单个服务器的索引"""
+    if not os.path.exists(FLEET_INDEX_DIR):
+        os.makedirs(FLEET_INDEX_DIR)
+    path = index_path(server_name)
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_file, path)
+
+def fetch_rows(server_config):
+    """获取服务器的种子列表，返回 {hash: [名称, 大小, Tracker主机, 分类, 标签, 状态, 进度]}"""
+    if server_config.get("bt_backup") and not server_config.get("url"):
+        from bt_backup import read_bt_backup
+        return {
+            torrent.hash: [torrent.name, torrent.size, tracker_host(torrent.trackers[0] if torrent.trackers else ""),
+                           torrent.category, torrent.tags, "", torrent.progress]
+            for torrent in read_bt_backup(server_config["bt_backup"])
+        }
+    from qb_client import connect
+    qb = connect(server_config)
+    try:
+        return {
+            torrent.hash: [torrent.name, torrent.size, tracker_host(torrent.tracker), torrent.category,
+                           torrent.tags, torrent.state, torrent.progress]
+            for torrent in qb.torrents_info()
+        }
+    finally:
+        qb.auth_log_out()
+
+def is_dead(row, site_deleted):
+    tags = [tag.strip() for tag in row[TAGS].split(",")] if row[TAGS] else []
+    return site_deleted or SITE_DELETED_TAG in tags or row[STATE] in DEAD_STATES
+
+def compute_aggregates(rows, deleted_hashes):
+    """单个服务器的统计：按Tracker/分类/标签/状态汇总的数量和大小，以及失效和进度为0的种子分组
+
+    分组键为 "Tracker主机 / 分类"。每项的值为 [数量, 字节数]，可直接相加合并多个服务器。
+    """
+    aggregates = {"total": [0, 0], "tracker": {}, "category": {}, "tag": {}, "state": {}, "dead": {}, "zero_progress": {}}
+
+    def add(table, key, size):
+        entry = table.get(key)
+        if entry is None:
+            table[key] = [1, size]
+        else:
+            entry[0] += 1
+            entry[1] += size
+
+    for torrent_hash, row in rows.items():
+        size = row[SIZE]
+        category = row[CATEGORY] or NO_CATEGORY
+        aggregates["total"][0] += 1
+        aggregates["total"][1] += size
+        add(aggregates["tracker"], row[TRACKER], size)
+        add(aggregates["category"], category, size)
+        add(aggregates["state"], row[STATE] or "(未知)", size)
+        for tag in row[TAGS].split(",") if row[TAGS] else []:
+            if tag.strip():
+                add(aggregates["tag"], tag.strip(), size)
+        group = f"{row[TRACKER]} / {category}"
+        if is_dead(row, torrent_hash in deleted_hashes):
+            add(aggregates["dead"], group, size)
+        if row[PROGRESS] == 0:
+            add(aggregates["zero_progress"], group, size)
+    return aggregates
+
+def merge_aggregates(all_aggregates):
+    merged = {"total": [0, 0]}
+    for aggregates in all_aggregates:
+        merged["total"][0] += aggregates["total"][0]
+        merged["total"][1] += aggregates["total"][1]
+        for table, values in aggregates.items():
+            if table == "total":
+                continue
+            target = merged.setdefault(table, {})
+            for key, (count, size) in values.items():
+                entry = target.setdefault(key, [0, 0])
+                entry[0] += count
+                entry[1] += size
+    return merged
+
+def deleted_hashes_by_server():
+    """Tracker状态缓存中已确认被站点删除的种子"""
+    cache = load_tracker_cache()
+    return {
+        server_name: {h for h, entry in server_cache.items() if entry.get("status") == STATUS_DELETED}
+        for server_name, server_cache in cache["servers"].items()
+    }
+
+def update_indexes(servers, settings, refresh=False, offline=False):
+    """读取各服务器的索引，过期的重新获取；Tracker状态缓存更新后只重新计算统计。返回 {服务器名称: 索引}"""
+    try:
+        tracker_mtime = os.stat(TRACKER_CACHE_FILE).st_mtime
+    except OSError:
+        tracker_mtime = 0
+    deleted = None
+    indexes = {}
+    to_fetch = []
+    now = time.time()
+    for server in servers:
+        index = load_server_index(server["name"])
+        if offline or (index and not refresh and now - index["updated"] < settings["max_age_minutes"] * 60):
+            if index is None:
+                print(f"服务器 {server['name']} 没有缓存的索引，已跳过")
+                continue
+            indexes[server["name"]] = index
+        else:
+            to_fetch.append(server)
+
+    lock = threading.Lock()
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=len(to_fetch)) as executor:
+            futures = {executor.submit(fetch_rows, server): server for server in to_fetch}
+            for future in as_completed(futures):
+                server = futures[future]
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    with lock:
+                        print(f"获取服务器 {server['name']} 的种子列表时发生错误: {str(e)}")
+                    index = load_server_index(server["name"])
+                    if index:
+                        print(f"使用服务器 {server['name']} 上次缓存的索引")
+                        indexes[server["name"]] = index
+                    continue
+                with lock:
+                    print(f"已获取服务器 {server['name']} 的 {len(rows)} 个种子")
+                indexes[server["name"]] = {"version": FLEET_INDEX_VERSION, "updated": time.time(),
+                                           "torrents": rows, "aggregates": None}
+
+    for server_name, index in indexes.items():
+        if index["aggregates"] is None or index.get("tracker_mtime", 0) < tracker_mtime:
+            if deleted is None:
+                deleted = deleted_hashes_by_server()
+            index["aggregates"] = compute_aggregates(index["torrents"], deleted.get(server_name, set()))
+            index["tracker_mtime"] = tracker_mtime
+            save_server_index(server_name, index)
+    return indexes
+
+def find_duplicates(indexes):
+    """跨服务器的重复内容
+
+    返回 (按 infohash 的重复组, 按名称+大小的重复组, {服务器: [可以清理的 hash]}, {hash: 保留副本的服务器})。
+    每组为 (名称, 大小, [(服务器, hash), ...])，同一服务器内的辅种不算重复。
+    名称+大小相同不一定是同一内容，只用于统计；可以清理的副本只来自 infohash 相同的组，
+    每组保留一个副本（优先保留状态正常、已完成的副本，其次按服务器在配置中的顺序），其余副本列入清理对象。
+    """
+    by_hash = {}
+    by_content = {}
+    for server_name, index in indexes.items():
+        for torrent_hash, row in index["torrents"].items():
+            by_hash.setdefault(torrent_hash, []).append(server_name)
+            by_content.setdefault((row[NAME], row[SIZE]), []).append((server_name, torrent_hash))
+
+    hash_groups = []
+    duplicates = {}
+    keepers = {}
+    for torrent_hash, server_names in by_hash.items():
+        if len(server_names) > 1:
+            row = indexes[server_names[0]]["torrents"][torrent_hash]
+            hash_groups.append((row[NAME], row[SIZE], [(name, torrent_hash) for name in server_names]))
+
+            def keep_order(position):
+                copy = indexes[server_names[position]]["torrents"][torrent_hash]
+                return copy[STATE] in DEAD_STATES, copy[PROGRESS] < 1, position
+
+            keeper = server_names[min(range(len(server_names)), key=keep_order)]
+            keepers[torrent_hash] = keeper
+            for server_name in server_names:
+                if server_name != keeper:
+                    duplicates.setdefault(server_name, []).append(torrent_hash)
+
+    content_groups = [(name, size, copies) for (name, size), copies in by_content.items()
+                      if size and len({server_name for server_name, _ in copies}) > 1]
+    return hash_groups, content_groups, duplicates, keepers
+
+def wasted_bytes(groups):
+    """每组内除一个服务器外的副本占用的空间"""
+    return sum(size * (len({server_name for server_name, _ in copies}) - 1) for _, size, copies in groups)
+
+def save_duplicates(duplicates, keepers, duplicates_file=DUPLICATES_FILE):
+    cache_dir = os.path.dirname(duplicates_file)
+    if cache_dir and not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    tmp_file = duplicates_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({"version": DUPLICATES_VERSION, "generated": time.time(), "servers": duplicates, "keepers": keepers},
+                  f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_file, duplicates_file)
+
+def load_duplicate_hashes(server_name, duplicates_file=DUPLICATES_FILE):
+    """返回该服务器上可以清理的重复种子 hash 集合（同一 infohash 在其他服务器上有保留的副本）
+
+    没有统计结果或结果为旧版本格式时为空集合。
+    """
+    try:
+        with open(duplicates_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != DUPLICATES_VERSION:
+            print(f"{duplicates_file} 为旧版本格式，请重新运行 fleet_stats.py")
+            return set()
+        return set(data.get("servers", {}).get(server_name, []))
+    except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+        return set()
+
+def top_entries(table, top):
+    return sorted(table.items(), key=lambda item: item[1][1], reverse=True)[:top]
+
+def fleet_stats(refresh=False, offline=False, settings=None):
+    """统计所有服务器的空间占用和跨服务器重复内容，返回保存的报告文件路径"""
+    config = load_config()
+    settings = get_fleet_settings(settings if settings is not None else config.get("fleet_stats"))
+    started = time.perf_counter()
+    indexes = update_indexes(get_fleet_servers(config), settings, refresh, offline)
+    if not indexes:
+        print("没有可统计的服务器")
+        return None
+
+    merged = merge_aggregates(index["aggregates"] for index in indexes.values())
+    hash_groups, content_groups, duplicates, keepers = find_duplicates(indexes)
+    save_duplicates(duplicates, keepers)
+    top = settings["top"]
+
+    print(f"\n=== 总览 ===")
+    for server_name, index in indexes.items():
+        count, size = index["aggregates"]["total"]
+        updated = datetime.datetime.fromtimestamp(index["updated"]).strftime("%Y-%m-%d %H:%M")
+        print(f"{server_name}: {count} 个种子，{format_size(size)}（索引更新于 {updated}）")
+    print(f"合计: {merged['total'][0]} 个种子，{format_size(merged['total'][1])}")
+
+    print(f"\n=== 跨服务器重复 ===")
+    print(f"相同 infohash: {len(hash_groups)} 组，多余副本占用 {format_size(wasted_bytes(hash_groups))}")
+    print(f"相同名称和大小（含不同站点的辅种）: {len(content_groups)} 组，"
+          f"多余副本占用 {format_size(wasted_bytes(content_groups))}")
+    for name, size, copies in sorted(content_groups, key=lambda group: group[1], reverse=True)[:top]:
+        servers = sorted({server_name for server_name, _ in copies})
+        print(f"  {name} ({format_size(size)}): {', '.join(servers)}")
+
+    sections = [("tracker", "按Tracker"), ("category", "按分类"), ("tag", "按标签"), ("state", "按状态"),
+                ("dead", "最大的失效种子分组（Tracker / 分类）"), ("zero_progress", "最大的进度为0的种子分组（Tracker / 分类）")]
+    for table, title in sections:
+        print(f"\n=== {title} ===")
+        for key, (count, size) in top_entries(merged.get(table, {}), top):
+            print(f"  {key}: {count} 个，{format_size(size)}")
+
+    if not os.path.exists("logs"):
+        os.makedirs("logs")
+    report_file = f"logs/fleet_stats_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_file, "w", encoding="utf-8") as f:
+        json.dump({
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "servers": {server_name: index["aggregates"] for server_name, index in indexes.items()},
+            "total": merged,
+            "duplicates_by_hash": {"groups": len(hash_groups), "wasted_size": wasted_bytes(hash_groups)},
+            "duplicates_by_content": {
+                "groups": len(content_groups),
+                "wasted_size": wasted_bytes(content_groups),
+                "largest": [{"name": name, "size": size, "copies": copies}
+                            for name, size, copies in sorted(content_groups, key=lambda group: group[1],
+                                                             reverse=True)[:top]]
+            }
+        }, f, ensure_ascii=False, indent=4)
+    print(f"\n统计耗时 {time.perf_counter() - started:.1f} 秒，报告已保存至: {report_file}")
+    print(f"重复内容列表已保存至: {DUPLICATES_FILE}（free_space.py 的 include_duplicates 会使用）")
+    return report_file
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='统计所有服务器的空间占用和跨服务器重复内容')
+    parser.add_argument('--refresh', action='store_true', help='忽略缓存，重新获取所有服务器的种子列表')
+    parser.add_argument('--offline', action='store_true', help='只使用缓存的索引，不连接服务器')
+    args = parser.parse_args()
+
+    try:
+        fleet_stats(refresh=args.refresh, offline=args.offline)
+    except Exception as e:
+        print(f"程序执行过程中发生错误: {str(e)}")
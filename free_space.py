@@ -0,0 +1,254 @@
+import json
+import datetime
+import heapq
+import argparse
+import re
+import sys
+import time
+import io
+import codecs
+from qb_client import connect
+from delete_remote_torrents import create_log_directory, get_log_filenames, load_existing_records
+from delete_throttle import DeletionThrottle
+from content_index import ContentIndex, save_files_cache
+from fleet_stats import load_duplicate_hashes
+from history import open_history, record_deletion
+
+# 设置控制台输出编码为UTF-8
+if sys.platform.startswith('win'):
+    try:
+        import codecs
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer)
+    except (AttributeError, io.UnsupportedOperation):
+        pass  # 如果无法设置编码，保持默认设置
+
+SITE_DELETED_TAG = "站点删种"
+
+# 默认候选范围与评分权重
+DEFAULT_SPACE_TARGET = {
+    "tags": [SITE_DELETED_TAG],
+    "categories": [],
+    "include_duplicates": False,  # 在其他服务器上有相同内容的种子（fleet_stats.py 的统计结果）也作为候选
+    "weights": {
+        "size": 1.0,          # 每 GiB
+        "ratio": 1.0,         # 每 1.0 分享率
+        "seeding_time": 1.0,  # 每做种 1 天
+        "site_deleted": 100.0,
+        "duplicate": 10.0     # 在其他服务器上有副本
+    },
+    "settle_wait": 5
+}
+
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4, "PB": 1024 ** 5}
+
+def format_size(size_bytes):
+    """将字节大小转换为人类可读的格式"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.2f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.2f} PB"
+
+def parse_size(text):
+    """将 "2TB"、"500 GB"、"1024" 之类的字符串转换为字节数"""
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGTP]?B?)\s*", text.upper())
+    if not match:
+        raise ValueError(f"无法识别的大小: {text}")
+    unit = match.group(2) or "B"
+    if not unit.endswith("B"):
+        unit += "B"
+    return int(float(match.group(1)) * SIZE_UNITS[unit])
+
+def load_config():
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            config = json.load(f)
+            if not isinstance(config, dict):
+                raise ValueError("配置文件格式错误：根对象必须是字典类型")
+            return config
+    except json.JSONDecodeError as e:
+        raise ValueError(f"配置文件JSON格式错误: {str(e)}")
+    except FileNotFoundError:
+        raise FileNotFoundError("找不到配置文件 config.json")
+
+def get_space_settings(settings=None):
+    """合并用户配置与默认配置"""
+    merged = dict(DEFAULT_SPACE_TARGET)
+    merged["weights"] = dict(DEFAULT_SPACE_TARGET["weights"])
+    if isinstance(settings, dict):
+        for key, value in settings.items():
+            if key == "weights" and isinstance(value, dict):
+                merged["weights"].update(value)
+            else:
+                merged[key] = value
+    return merged
+
+def find_server(config, server_name):
+    """按名称查找服务器配置，"local" 或 "本地服务器" 表示本地服务器"""
+    if server_name in ("local", "本地服务器"):
+        return dict(config["local_server"], name="本地服务器")
+    for server in config.get("remote_servers", []):
+        if server["name"] == server_name:
+            return server
+    raise ValueError(f"配置文件中找不到服务器: {server_name}")
+
+def get_free_space(qb):
+    """从 sync_maindata 读取服务器磁盘剩余空间"""
+    return qb.sync_maindata()["server_state"]["free_space_on_disk"]
+
+def score_torrent(torrent, weights, duplicate=False):
+    """计算种子的删除优先级，分数越高越先删除"""
+    tags = torrent.tags.split(",") if torrent.tags else []
+    site_deleted = SITE_DELETED_TAG in [tag.strip() for tag in tags]
+    return (weights["size"] * torrent.size / SIZE_UNITS["GB"]
+            + weights["ratio"] * torrent.ratio
+            + weights["seeding_time"] * torrent.seeding_time / 86400
+            + weights["site_deleted"] * site_deleted
+            + weights["duplicate"] * duplicate)
+
+def is_candidate(torrent, settings, duplicates=()):
+    """判断种子是否在候选范围内（满足任一标签或分类，或启用 include_duplicates 时其他服务器上保留了相同 infohash 的副本）"""
+    if settings["include_duplicates"] and torrent.hash in duplicates:
+        return True
+    tags = [tag.strip() for tag in torrent.tags.split(",")] if torrent.tags else []
+    if any(tag in tags for tag in settings["tags"]):
+        return True
+    return torrent.category in settings["categories"]
+
+def free_space(server_config, free_bytes=None, until_free=None, settings=None, debug_mode=False,
+               throttle_settings=None, keep_shared_payload=False):
+    """按优先级删除种子，直到服务器剩余空间达到目标
+
+    free_bytes 表示需要额外释放的空间，until_free 表示目标剩余空间（二选一）。
+    候选种子按评分放入堆中，每次只取出当前分数最高的种子，预计释放的空间达到目标后立即停止。
+    qBittorrent 异步删除文件，删除过程中不重新读取剩余空间，只在结束后等待 settle_wait 秒再读取一次用于确认。
+    """
+    settings = get_space_settings(settings)
+    mode_str = "[调试模式]" if debug_mode else ""
+    server_name = server_config["name"]
+    records = []
+
+    print(f"\n{mode_str}正在连接服务器 {server_name}: {server_config['url']}")
+    qb = connect(server_config)
+    throttle = DeletionThrottle(throttle_settings, server_name)
+    history = None if debug_mode else open_history(tool="free_space")
+
+    try:
+        print(f"已成功连接到服务器 {server_name}")
+
+        initial_free = get_free_space(qb)
+        goal = until_free if until_free is not None else initial_free + (free_bytes or 0)
+        print(f"当前剩余空间: {format_size(initial_free)}，目标剩余空间: {format_size(goal)}")
+        if initial_free >= goal:
+            print("剩余空间已达到目标，无需删除")
+            return records
+
+        torrents = qb.torrents_info()
+        index = ContentIndex(qb, torrents)
+        removed = set()
+        duplicates = load_duplicate_hashes(server_name)
+
+        # 建堆 O(n)，之后按需弹出
+        heap = [
+            (-score_torrent(torrent, settings["weights"], torrent.hash in duplicates), idx, torrent)
+            for idx, torrent in enumerate(torrents)
+            if is_candidate(torrent, settings, duplicates)
+        ]
+        heapq.heapify(heap)
+        print(f"共有 {len(heap)} 个候选种子")
+
+        estimated_free = initial_free
+        while heap and estimated_free < goal:
+            neg_score, _, torrent = heapq.heappop(heap)
+            current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if keep_shared_payload:
+                # 共享的文件只在最后一个引用被删除时才会释放，之前只从客户端移除
+                freed = index.freed_by(torrent.hash, removed)
+                removed.add(torrent.hash)
+                delete_files = index.can_delete_files(torrent.hash, removed)
+                if not delete_files:
+                    freed = 0
+            else:
+                # 种子的文件全部删除，包括仍被其他种子使用的共享文件
+                freed = index.deleted_by(torrent.hash, removed)
+                removed.add(torrent.hash)
+                delete_files = True
+            if not debug_mode:
+                throttle.delete(qb, torrent.hash, torrent.size, torrent.content_path, delete_files)
+            estimated_free += freed
+            record = {
+                "timestamp": current_time,
+                "server_name": server_name,
+                "torrent_name": torrent.name,
+                "torrent_hash": torrent.hash,
+                "torrent_size": torrent.size,
+                "freed_size": freed,
+                "action": "found" if debug_mode else "deleted" if delete_files else "removed",
+                "debug_mode": debug_mode
+            }
+            records.append(record)
+            if not debug_mode:
+                record_deletion(history, record, f"按目标空间清理（评分 {-neg_score:.2f}）")
+            print(f"[{current_time}] {mode_str}{'找到' if debug_mode else '删除'}种子: {torrent.name} "
+                  f"(大小: {format_size(torrent.size)}, 可释放: {format_size(freed)}, 评分: {-neg_score:.2f})")
+
+        print(f"\n=== 总结 ===")
+        print(f"共{'找到' if debug_mode else '删除'} {len(records)} 个种子，预计剩余空间: {format_size(estimated_free)}")
+        if estimated_free < goal:
+            print(f"候选种子不足，距离目标还差 {format_size(goal - estimated_free)}")
+        elif records and not debug_mode and not throttle.settings["deferred_unlink"]:
+            # 调试模式或延迟删除文件时剩余空间不会变化，无需确认
+            time.sleep(settings["settle_wait"])
+            reported_free = get_free_space(qb)
+            print(f"{settings['settle_wait']} 秒后服务器报告的剩余空间: {format_size(reported_free)}")
+            if reported_free < goal:
+                print("qBittorrent 可能仍在删除文件，剩余空间稍后会继续增加")
+    finally:
+        throttle.close()
+        if history is not None:
+            history.close()
+        save_files_cache()
+        qb.auth_log_out()
+
+    if records and not debug_mode:
+        save_records(records)
+    return records
+
+def save_records(records):
+    """将删除记录追加到删除日志"""
+    create_log_directory()
+    log_file, json_file = get_log_filenames()
+    with open(log_file, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(f"[{record['timestamp']}] 服务器[{record['server_name']}] 删除种子: "
+                    f"{record['torrent_name']} (大小: {format_size(record['torrent_size'])})\n")
+    deletion_records = load_existing_records(json_file) + records
+    with open(json_file, "w", encoding="utf-8") as f:
+        json.dump({
+            "last_update": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "total_records": len(deletion_records),
+            "records": deletion_records
+        }, f, ensure_ascii=False, indent=4)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='按目标空间清理种子')
+    parser.add_argument('--server', '-s', default='local', help='服务器名称（默认本地服务器）')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--free', help='需要释放的空间，例如 2TB')
+    group.add_argument('--until-free', help='目标剩余空间，例如 5TB')
+    parser.add_argument('--debug', '-d', action='store_true', help='启用调试模式（只检查不删除）')
+    args = parser.parse_args()
+
+    try:
+        config = load_config()
+        free_space(
+            find_server(config, args.server),
+            free_bytes=parse_size(args.free) if args.free else None,
+            until_free=parse_size(args.until_free) if args.until_free else None,
+            settings=config.get("space_target"),
+            debug_mode=args.debug,
+            throttle_settings=config.get("delete_throttle"),
+            keep_shared_payload=config.get("keep_shared_payload", False)
+        )
+    except Exception as e:
+        print(f"程序执行过程中发生错误: {str(e)}")
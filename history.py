@@ -0,0 +1,237 @@
+import os
+import sqlite3
+import argparse
+import re
+import sys
+import threading
+import time
+import io
+import codecs
+from interchange import iter_json_array
+
+# 删除历史数据库，按 hash、名称、时间建立索引。放在 logs/ 下，清理 cache/ 时不会丢失
+HISTORY_DB = "logs/delete_history.db"
+DELETE_RECORDS_FILE = "logs/delete_records.json"
+
+DEFAULT_LIMIT = 100
+
+HEX_PATTERN = re.compile(r"[0-9a-fA-F]{6,40}")
+
+# 设置控制台输出编码为UTF-8
+if sys.platform.startswith('win'):
+    try:
+        import codecs
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer)
+    except (AttributeError, io.UnsupportedOperation):
+        pass
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deletions (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    server TEXT NOT NULL,
+    hash TEXT NOT NULL COLLATE NOCASE,
+    name TEXT NOT NULL COLLATE NOCASE,
+    size INTEGER,
+    freed INTEGER,
+    action TEXT NOT NULL,
+    run_id TEXT,
+    tool TEXT,
+    detail TEXT,
+    UNIQUE (timestamp, server, hash, action)
+);
+CREATE INDEX IF NOT EXISTS deletions_hash ON deletions (hash);
+CREATE INDEX IF NOT EXISTS deletions_name ON deletions (name);
+CREATE INDEX IF NOT EXISTS deletions_timestamp ON deletions (timestamp);
+"""
+
+def format_size(size_bytes):
+    """将字节大小转换为人类可读的格式"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.2f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.2f} PB"
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+class DeletionHistory:
+    """基于 sqlite 的删除历史，删除流程每删除一个种子就写入一条
+
+    记录字段与 logs/delete_records.json 相同（timestamp、server_name、torrent_name、torrent_hash、
+    torrent_size、freed_size、action），另外保存发起删除的运行ID（run_id）、工具名称（tool）
+    和删除原因（detail，例如站点删种的Tracker消息）。可释放空间未知时 freed 为空。
+    多个线程可以共用一个实例。首次创建数据库时自动导入已有的 delete_records.json。
+    """
+
+    def __init__(self, db_file=HISTORY_DB, run_id=None, tool="", import_existing=True):
+        db_dir = os.path.dirname(db_file)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        created = not os.path.exists(db_file)
+        self.run_id = run_id
+        self.tool = tool
+        self._lock = threading.Lock()
+        # 删除流程、监视模式和图形界面可能同时写入，等待其他进程的写入完成
+        self.conn = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if created and import_existing and os.path.exists(DELETE_RECORDS_FILE):
+            count = self.import_json(DELETE_RECORDS_FILE)
+            print(f"已从 {DELETE_RECORDS_FILE} 导入 {count} 条删除记录")
+
+    def _row(self, record, run_id, tool, detail):
+        return (record["timestamp"], record["server_name"], (record["torrent_hash"] or "").lower(),
+                record["torrent_name"] or "", record.get("torrent_size"), record.get("freed_size"),
+                record.get("action") or "deleted", run_id, tool, detail)
+
+    def add(self, record, detail=None):
+        """写入一条删除记录（delete_records.json 中的格式）并立即提交"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO deletions (timestamp, server, hash, name, size, freed, action, run_id, tool,"
+                " detail) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._row(record, self.run_id, self.tool, detail))
+            self.conn.commit()
+
+    def import_json(self, json_file=DELETE_RECORDS_FILE):
+        """流式导入 delete_records.json，已存在的记录跳过，返回新增的条数"""
+        with self._lock:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO deletions (timestamp, server, hash, name, size, freed, action, run_id, tool,"
+                " detail) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._row(record, None, "import", None) for record in iter_json_array(json_file, "records")
+                 if not record.get("debug_mode")))
+            self.conn.commit()
+            return self.conn.total_changes - before
+
+    def search(self, torrent_hash=None, name=None, server=None, since=None, until=None, limit=DEFAULT_LIMIT,
+               run_id=None):
+        """按 hash（可以是前缀）、名称前缀、服务器、时间范围和运行ID查询，按时间倒序返回字典列表
+
+        since/until 为 "YYYY-MM-DD" 或 "YYYY-MM-DD HH:MM:SS"，只有日期的 until 包含当天。
+        """
+        conditions = []
+        params = []
+        if torrent_hash:
+            if len(torrent_hash) == 40:
+                conditions.append("hash = ?")
+                params.append(torrent_hash.lower())
+            else:
+                conditions.append("hash LIKE ? ESCAPE '\\'")
+                params.append(_escape_like(torrent_hash.lower()) + "%")
+        if name:
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            params.append(_escape_like(name) + "%")
+        if server:
+            conditions.append("server = ?")
+            params.append(server)
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("timestamp <= ?")
+            params.append(until + " 23:59:59" if len(until) == 10 else until)
+        if run_id:
+            conditions.append("run_id = ?")
+            params.append(run_id)
+        sql = "SELECT * FROM deletions"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def open_history(run_id=None, tool=""):
+    """打开删除历史，失败时返回 None（删除历史不可用不影响删除流程）
+
+    run_id 为 None 时生成新的运行ID。
+    """
+    if run_id is None:
+        from profiling import new_run_id
+        run_id = new_run_id()
+    try:
+        return DeletionHistory(run_id=run_id, tool=tool)
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"打开删除历史数据库时发生错误: {str(e)}，本次删除不会记录到删除历史")
+        return None
+
+def record_deletion(history, record, detail=None):
+    """向删除历史写入一条记录，history 为 None 或写入失败时只打印提示"""
+    if history is None:
+        return
+    try:
+        history.add(record, detail)
+    except sqlite3.Error as e:
+        print(f"写入删除历史时发生错误: {str(e)}")
+
+def parse_query(text):
+    """图形界面和命令行的自由输入：看起来像 hash 的按 hash 前缀查询，否则按名称前缀查询"""
+    text = text.strip()
+    if HEX_PATTERN.fullmatch(text):
+        return {"torrent_hash": text}
+    return {"name": text}
+
+def format_row(row):
+    size_str = format_size(row["size"] or 0)
+    if row["freed"] is not None and row["freed"] != row["size"]:
+        size_str += f", 可释放: {format_size(row['freed'])}"
+    line = (f"[{row['timestamp']}] 服务器[{row['server']}] {row['action']}: {row['name']} "
+            f"({row['hash']}, 大小: {size_str})")
+    if row["run_id"] or row["tool"]:
+        line += f"\n    运行: {row['tool'] or ''} {row['run_id'] or ''}".rstrip()
+    if row["detail"]:
+        line += f"\n    原因: {row['detail']}"
+    return line
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='查询删除历史')
+    parser.add_argument('query', nargs='*', help='hash（可以是前缀）或名称前缀，自动识别')
+    parser.add_argument('--hash', help='按 hash 或 hash 前缀查询')
+    parser.add_argument('--name', help='按名称前缀查询（不区分大小写）')
+    parser.add_argument('--server', '-s', help='只查询指定服务器')
+    parser.add_argument('--since', help='起始时间，例如 2024-01-01 或 "2024-01-01 12:00:00"')
+    parser.add_argument('--until', help='结束时间（只有日期时包含当天）')
+    parser.add_argument('--run-id', help='只查询指定运行ID删除的种子')
+    parser.add_argument('--limit', '-n', type=int, default=DEFAULT_LIMIT, help=f'最多显示的条数（默认 {DEFAULT_LIMIT}）')
+    parser.add_argument('--import-json', nargs='?', const=DELETE_RECORDS_FILE, metavar='FILE',
+                        help=f'导入删除记录 JSON 文件（默认 {DELETE_RECORDS_FILE}），已存在的记录跳过')
+    args = parser.parse_args()
+
+    try:
+        with DeletionHistory(import_existing=not args.import_json) as history:
+            if args.import_json:
+                count = history.import_json(args.import_json)
+                print(f"已从 {args.import_json} 导入 {count} 条删除记录")
+            elif not any((args.query, args.hash, args.name, args.server, args.since, args.until, args.run_id)):
+                parser.error("请指定查询条件")
+            if any((args.query, args.hash, args.name, args.server, args.since, args.until, args.run_id)):
+                criteria = parse_query(" ".join(args.query)) if args.query else {}
+                started = time.perf_counter()
+                rows = history.search(torrent_hash=args.hash or criteria.get("torrent_hash"),
+                                      name=args.name or criteria.get("name"), server=args.server,
+                                      since=args.since, until=args.until, limit=args.limit,
+                                      run_id=args.run_id)
+                elapsed = (time.perf_counter() - started) * 1000
+                for row in rows:
+                    print(format_row(row))
+                print(f"\n共 {len(rows)} 条记录{'（已达到显示上限）' if len(rows) == args.limit else ''}，"
+                      f"查询耗时 {elapsed:.1f} ms")
+    except Exception as e:
+        print(f"程序执行过程中发生错误: {str(e)}")
@@ -0,0 +1,101 @@
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem, QLineEdit,
+                            QPushButton, QLabel, QHeaderView, QAbstractItemView)
+from PyQt6.QtCore import Qt
+import time
+
+# 每次查询最多显示的记录数
+HISTORY_LIMIT = 500
+
+def format_size(size_bytes):
+    """将字节大小转换为人类可读的格式"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.2f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.2f} PB"
+
+# 列：(标题, 字段, 显示函数)
+COLUMNS = [
+    ("时间", "timestamp", str),
+    ("服务器", "server", str),
+    ("操作", "action", str),
+    ("名称", "name", str),
+    ("大小", "size", lambda value: format_size(value or 0)),
+    ("Hash", "hash", str),
+    ("原因", "detail", lambda value: value or ""),
+    ("运行", "run_id", lambda value: value or "")
+]
+
+class HistoryView(QWidget):
+    """删除历史查询：按 hash / 名称前缀、服务器和时间范围查询 logs/delete_history.db"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        toolbar = QHBoxLayout()
+        self.query_edit = QLineEdit()
+        self.query_edit.setPlaceholderText("hash（可以是前缀）或名称前缀")
+        self.server_edit = QLineEdit()
+        self.server_edit.setPlaceholderText("服务器")
+        self.since_edit = QLineEdit()
+        self.since_edit.setPlaceholderText("起始时间 2024-01-01")
+        self.until_edit = QLineEdit()
+        self.until_edit.setPlaceholderText("结束时间")
+        search_btn = QPushButton("查询")
+        search_btn.clicked.connect(self.search)
+        for edit in (self.query_edit, self.server_edit, self.since_edit, self.until_edit):
+            edit.returnPressed.connect(self.search)
+        toolbar.addWidget(self.query_edit, 3)
+        toolbar.addWidget(self.server_edit, 1)
+        toolbar.addWidget(self.since_edit, 1)
+        toolbar.addWidget(self.until_edit, 1)
+        toolbar.addWidget(search_btn)
+        layout.addLayout(toolbar)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels([title for title, _, _ in COLUMNS])
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setAlternatingRowColors(True)
+        self.table.setWordWrap(False)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        self.summary = QLabel("输入查询条件后按回车")
+        layout.addWidget(self.summary)
+
+    def search(self):
+        # 首次查询时才打开数据库
+        from history import DeletionHistory, parse_query
+        query = self.query_edit.text().strip()
+        criteria = parse_query(query) if query else {}
+        if not (criteria or self.server_edit.text().strip() or self.since_edit.text().strip()
+                or self.until_edit.text().strip()):
+            self.summary.setText("请输入查询条件")
+            return
+        try:
+            started = time.perf_counter()
+            with DeletionHistory() as history:
+                rows = history.search(server=self.server_edit.text().strip() or None,
+                                      since=self.since_edit.text().strip() or None,
+                                      until=self.until_edit.text().strip() or None,
+                                      limit=HISTORY_LIMIT, **criteria)
+            elapsed = (time.perf_counter() - started) * 1000
+        except Exception as e:
+            self.summary.setText(f"查询删除历史时发生错误: {str(e)}")
+            return
+
+        self.table.setRowCount(len(rows))
+        for row_index, row in enumerate(rows):
+            for column, (_, field, display) in enumerate(COLUMNS):
+                item = QTableWidgetItem(display(row[field]))
+                if field == "size":
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(row_index, column, item)
+        self.table.resizeColumnsToContents()
+        limit_str = f"（只显示最近的 {HISTORY_LIMIT} 条）" if len(rows) == HISTORY_LIMIT else ""
+        self.summary.setText(f"共 {len(rows)} 条记录{limit_str}，查询耗时 {elapsed:.1f} ms")
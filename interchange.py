@@ -0,0 +1,278 @@
+import gzip
+import json
+import datetime
+import os
+import argparse
+import re
+import struct
+import sys
+import io
+import codecs
+import zlib
+from target_set import PackedHashSet, build_targets
+
+# 设置控制台输出编码为UTF-8
+if sys.platform.startswith('win'):
+    try:
+        import codecs
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer)
+    except (AttributeError, io.UnsupportedOperation):
+        pass  # 如果无法设置编码，保持默认设置
+
+# 紧凑格式：固定长度的文件头（魔数、版本、头部JSON长度、头部JSON）+ 若干数据段，
+# 各数据段的位置和长度记录在头部JSON的 sections 中（版本 2 起）：
+# - records：gzip 压缩的记录块，每行是一个最多包含 CHUNK_RECORDS 条记录的 JSON 数组
+# - hashes：PackedHashSet 的二进制数据（排序打包的 infohash）
+# - names：zlib 压缩的、以 \0 分隔的 UTF-8 种子名称
+# 删除脚本只需要目标集合时直接读取 hashes 或 names 段，不解压、不解析记录
+MAGIC = b"QBCL"
+FORMAT_VERSION = 2
+HEADER_SIZE = 4096
+CHUNK_RECORDS = 1024
+COMPACT_SUFFIX = ".qbl"
+
+# 流式读取 JSON 时每次读取的字符数
+STREAM_CHUNK = 1 << 20
+
+KIND_TORRENTS_TO_DELETE = "torrents_to_delete"
+KIND_DELETED_TORRENTS = "deleted_torrents"
+
+def compact_path(json_path):
+    """返回与 JSON 文件对应的紧凑格式文件名"""
+    return os.path.splitext(json_path)[0] + COMPACT_SUFFIX
+
+def is_compact(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+class ListWriter:
+    """流式写入紧凑格式文件，关闭时回填文件头中的统计信息"""
+
+    def __init__(self, path, kind, **header):
+        self.path = path
+        self.header = dict(header, kind=kind, version=FORMAT_VERSION)
+        self.total_torrents = 0
+        self.total_size = 0
+        self._file = open(path, "wb")
+        self._file.write(b"\0" * HEADER_SIZE)
+        self._gzip = gzip.GzipFile(fileobj=self._file, mode="wb", compresslevel=1)
+        self._chunk = []
+        # 关闭时打包为 hashes 和 names 数据段
+        self._hashes = []
+        self._names = []
+
+    def _flush_chunk(self):
+        if self._chunk:
+            self._gzip.write(json.dumps(self._chunk, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+            self._chunk = []
+
+    def write(self, record):
+        self._chunk.append(record)
+        self.total_torrents += 1
+        self.total_size += record.get("size", 0)
+        self._hashes.append(record.get("hash") or "")
+        self._names.append(record.get("name") or "")
+        if len(self._chunk) >= CHUNK_RECORDS:
+            self._flush_chunk()
+
+    def _write_section(self, name, data):
+        offset = self._file.tell()
+        self._file.write(data)
+        self.header["sections"][name] = [offset, len(data)]
+
+    def close(self):
+        self._flush_chunk()
+        self._gzip.close()
+        self.header["sections"] = {"records": [HEADER_SIZE, self._file.tell() - HEADER_SIZE]}
+        self._write_section("hashes", PackedHashSet(self._hashes).to_bytes())
+        self._write_section("names", zlib.compress("\0".join(self._names).encode("utf-8"), 1))
+        self._hashes = self._names = None
+        self.header.setdefault("total_torrents", self.total_torrents)
+        self.header.setdefault("total_size", self.total_size)
+        header = json.dumps(self.header, ensure_ascii=False).encode("utf-8")
+        prefix = MAGIC + struct.pack("<BI", FORMAT_VERSION, len(header))
+        if len(prefix) + len(header) > HEADER_SIZE:
+            raise ValueError("文件头过大")
+        self._file.seek(0)
+        self._file.write(prefix + header)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def read_header(path):
+    """只读取紧凑格式的文件头（不解压记录）"""
+    with open(path, "rb") as f:
+        prefix = f.read(len(MAGIC) + 5)
+        if prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} 不是紧凑格式文件")
+        version, length = struct.unpack("<BI", prefix[len(MAGIC):])
+        if version > FORMAT_VERSION:
+            raise ValueError(f"不支持的文件版本: {version}")
+        return json.loads(f.read(length))
+
+def _read_section(path, name, header=None):
+    """读取紧凑格式中的一个数据段，版本 1 的文件或没有该段时返回 None"""
+    header = header or read_header(path)
+    section = header.get("sections", {}).get(name)
+    if section is None:
+        return None
+    offset, length = section
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    if len(data) != length:
+        raise ValueError(f"{path} 不完整")
+    return data
+
+def iter_records(path):
+    """逐条读取紧凑格式中的记录"""
+    section = read_header(path).get("sections", {}).get("records")
+    with open(path, "rb") as f:
+        f.seek(HEADER_SIZE)
+        if section is None:
+            # 版本 1：记录块一直到文件末尾
+            with gzip.GzipFile(fileobj=f, mode="rb") as stream:
+                for line in stream:
+                    if line.strip():
+                        yield from json.loads(line)
+            return
+        # 记录块之后还有其他数据段，只解压记录块的范围
+        remaining = section[1]
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        pending = b""
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK, remaining))
+            if not chunk:
+                raise ValueError(f"{path} 不完整")
+            remaining -= len(chunk)
+            lines = (pending + decompressor.decompress(chunk)).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield from json.loads(line)
+        pending += decompressor.flush()
+        if pending.strip():
+            yield from json.loads(pending)
+
+def read_targets(path, match_by="name"):
+    """从紧凑格式文件中直接读取目标集合（与 target_set.build_targets 的结果相同）
+
+    版本 2 的文件只读取 hashes 或 names 段；版本 1 的文件逐条读取记录后构建。
+    """
+    header = read_header(path)
+    data = _read_section(path, "hashes" if match_by == "hash" else "names", header)
+    if data is None:
+        return build_targets(iter_records(path), match_by)
+    if match_by == "hash":
+        return PackedHashSet.from_bytes(data)
+    names = zlib.decompress(data).decode("utf-8")
+    return frozenset(names.split("\0")) if header.get("total_torrents") else frozenset()
+
+def iter_json_array(path, key=None):
+    """逐条读取 JSON 文件中的数组，内存占用与文件大小无关
+
+    key 为 None 时读取顶层数组，否则读取顶层对象中 key 字段的数组（如 delete_records.json 的 records）。
+    数组元素必须是对象。
+    """
+    decoder = json.JSONDecoder()
+    start = re.compile(r"\s*\[" if key is None else r'"%s"\s*:\s*\[' % re.escape(key))
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        while True:
+            match = start.match(buffer) if key is None else start.search(buffer)
+            if match:
+                buffer = buffer[match.end():]
+                break
+            chunk = f.read(STREAM_CHUNK)
+            if not chunk:
+                raise ValueError(f"{path} 中找不到{'数组' if key is None else ' ' + key + ' 字段'}")
+            buffer += chunk
+
+        pos = 0
+        eof = False
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                if pos >= len(buffer):
+                    raise ValueError
+                record, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # 记录跨越了读取块的边界，继续读取
+                if eof:
+                    raise ValueError(f"{path} 格式错误或不完整")
+                chunk = f.read(STREAM_CHUNK)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield record
+
+def write_list(path, kind, records, **header):
+    """将记录写入紧凑格式文件"""
+    with ListWriter(path, kind, **header) as writer:
+        for record in records:
+            writer.write(record)
+    return path
+
+def load_list(path):
+    """读取 JSON 或紧凑格式的种子列表，返回 (文件头, 记录迭代器)
+
+    torrents_to_delete.json 为数组，deleted_torrents_*.json 为带 torrents 字段的对象，两种都支持。
+    """
+    if is_compact(path):
+        return read_header(path), iter_records(path)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return {"kind": KIND_TORRENTS_TO_DELETE, "total_torrents": len(data)}, iter(data)
+    header = {k: v for k, v in data.items() if k != "torrents"}
+    header.setdefault("kind", KIND_DELETED_TORRENTS)
+    return header, iter(data.get("torrents", []))
+
+def to_json(src, dst):
+    """紧凑格式转换为原来的 JSON 格式"""
+    header, records = load_list(src)
+    records = list(records)
+    with open(dst, "w", encoding="utf-8") as f:
+        if header.get("kind") == KIND_TORRENTS_TO_DELETE:
+            json.dump(records, f, ensure_ascii=False, indent=4)
+        else:
+            data = {k: v for k, v in header.items() if k not in ("kind", "version", "sections")}
+            data["torrents"] = records
+            json.dump(data, f, ensure_ascii=False, indent=4)
+    return dst
+
+def from_json(src, dst):
+    """JSON 格式转换为紧凑格式"""
+    header, records = load_list(src)
+    kind = header.pop("kind")
+    header.pop("version", None)
+    header.pop("sections", None)
+    header.pop("total_torrents", None)
+    header.pop("total_size", None)
+    header.setdefault("timestamp", datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    return write_list(dst, kind, records, **header)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='种子列表格式转换')
+    parser.add_argument('command', choices=['to-json', 'from-json', 'header'], help='转换方向或只查看文件头')
+    parser.add_argument('src', help='输入文件')
+    parser.add_argument('dst', nargs='?', help='输出文件（默认根据输入文件名生成）')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'header':
+            print(json.dumps(read_header(args.src), ensure_ascii=False, indent=4))
+        elif args.command == 'to-json':
+            print(f"已转换至: {to_json(args.src, args.dst or os.path.splitext(args.src)[0] + '.json')}")
+        else:
+            print(f"已转换至: {from_json(args.src, args.dst or compact_path(args.src))}")
+    except Exception as e:
+        print(f"程序执行过程中发生错误: {str(e)}")
@@ -0,0 +1,41 @@
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+from jobs import JobQueue, MAX_PARALLEL_JOBS, run_job
+
+class JobRunner(QThread):
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+
+    def run(self):
+        run_job(self.job)
+
+class JobManager(QObject, JobQueue):
+    """图形界面的后台任务管理，调度规则与 JobQueue 相同
+
+    任务在 QThread 中运行，完成后在界面线程中调用 on_done，并通过信号通知界面。
+    """
+    job_added = pyqtSignal(int)
+    job_started = pyqtSignal(int)
+    job_finished = pyqtSignal(int)
+
+    def __init__(self, parent=None, max_parallel=MAX_PARALLEL_JOBS):
+        super().__init__(parent, max_parallel=max_parallel)
+
+    def _start(self, job):
+        runner = JobRunner(job)
+        self._runners[job.id] = runner
+        runner.finished.connect(lambda job_id=job.id: self._on_finished(job_id))
+        runner.start()
+
+    def _notify_added(self, job_id):
+        self.job_added.emit(job_id)
+
+    def _notify_started(self, job_id):
+        self.job_started.emit(job_id)
+
+    def _notify_finished(self, job_id):
+        self.job_finished.emit(job_id)
+
+    def wait_all(self):
+        for runner in list(self._runners.values()):
+            runner.wait()
@@ -0,0 +1,234 @@
+import sys
+import threading
+import time
+from collections import deque
+
+# 每个任务保留的日志行数
+JOB_LOG_LINES = 5000
+
+# 同时运行的任务数上限
+MAX_PARALLEL_JOBS = 4
+
+# 资源访问方式：读/写同一资源或同时写同一资源的任务不能并行
+READ = "read"
+WRITE = "write"
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+STATE_NAMES = {
+    STATE_QUEUED: "排队中",
+    STATE_RUNNING: "运行中",
+    STATE_DONE: "已完成",
+    STATE_FAILED: "失败"
+}
+
+_original_thread_start = threading.Thread.start
+
+def _thread_start(self):
+    # 任务中创建的线程（线程池中的服务器线程等）继承所属任务，输出也归入该任务
+    job = current_job()
+    if job is not None:
+        self._qbc_job = job
+    _original_thread_start(self)
+
+def current_job():
+    return getattr(threading.current_thread(), "_qbc_job", None)
+
+class Job:
+    """一个后台任务及其状态、日志和结果"""
+
+    def __init__(self, job_id, label, function, resources=None, key=None, on_done=None):
+        self.id = job_id
+        self.label = label
+        self.function = function
+        self.resources = resources or {}
+        self.key = key
+        self.on_done = on_done
+        self.state = STATE_QUEUED
+        self.queued = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.lines = deque(maxlen=JOB_LOG_LINES)
+        self.line_count = 0
+        self._lock = threading.Lock()
+
+    def write_line(self, text):
+        with self._lock:
+            self.lines.append(text)
+            self.line_count += 1
+
+    def lines_since(self, count):
+        """返回第 count 行之后的新日志行及当前总行数"""
+        with self._lock:
+            new = min(self.line_count - count, len(self.lines))
+            return list(self.lines)[len(self.lines) - new:] if new > 0 else [], self.line_count
+
+    @property
+    def last_line(self):
+        with self._lock:
+            return self.lines[-1] if self.lines else ""
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def active(self):
+        return self.state in (STATE_QUEUED, STATE_RUNNING)
+
+    def conflicts_with(self, other):
+        for name, mode in self.resources.items():
+            other_mode = other.resources.get(name)
+            if other_mode is not None and WRITE in (mode, other_mode):
+                return True
+        return False
+
+class JobOutput:
+    """替换 sys.stdout：任务线程的输出写入所属任务的日志，其余输出写入原来的标准输出"""
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def write(self, text):
+        job = current_job()
+        if job is None:
+            if self.fallback is not None:
+                return self.fallback.write(text)
+            return len(text)
+        for line in text.splitlines():
+            if line.strip():
+                job.write_line(line.rstrip())
+        return len(text)
+
+    def flush(self):
+        if current_job() is None and self.fallback is not None:
+            self.fallback.flush()
+
+def install_output():
+    """安装任务输出重定向，只安装一次，所有任务共用"""
+    if not isinstance(sys.stdout, JobOutput):
+        sys.stdout = JobOutput(sys.stdout)
+    threading.Thread.start = _thread_start
+
+def run_job(job):
+    """在当前线程中运行任务，记录结果或错误"""
+    threading.current_thread()._qbc_job = job
+    try:
+        job.result = job.function()
+        job.state = STATE_DONE
+    except Exception as e:
+        job.error = e
+        job.state = STATE_FAILED
+        job.write_line(f"发生错误: {str(e)}")
+    finally:
+        job.finished = time.time()
+        threading.current_thread()._qbc_job = None
+
+class JobQueue:
+    """后台任务管理（不依赖 Qt，HTTP 接口直接使用，图形界面使用其子类 JobManager）
+
+    - 任务按提交顺序排队；与正在运行或排在前面的任务访问同一资源（如同一服务器的扫描和删除）时等待
+    - 互不冲突的任务（不同服务器）并行运行
+    - 与尚未完成的任务 key 相同的重复请求会被忽略
+    任务在普通线程中运行，完成后在该线程中调用 on_done。
+    """
+
+    def __init__(self, max_parallel=MAX_PARALLEL_JOBS, **kwargs):
+        super().__init__(**kwargs)
+        self.max_parallel = max_parallel
+        self.jobs = []
+        self._runners = {}
+        self._next_id = 1
+        self._lock = threading.RLock()
+        install_output()
+
+    def find_active(self, key):
+        return next((job for job in self.jobs if job.active and job.key == key), None)
+
+    def submit(self, label, function, resources=None, key=None, on_done=None):
+        """提交任务，返回 (任务, 是否为新任务)"""
+        key = key or label
+        with self._lock:
+            existing = self.find_active(key)
+            if existing is not None:
+                return existing, False
+            job = Job(self._next_id, label, function, resources, key, on_done)
+            self._next_id += 1
+            self.jobs.append(job)
+        self._notify_added(job.id)
+        self._schedule()
+        return job, True
+
+    def get(self, job_id):
+        return next((job for job in self.jobs if job.id == job_id), None)
+
+    def running(self):
+        return [job for job in self.jobs if job.state == STATE_RUNNING]
+
+    def forget_finished(self, keep):
+        """只保留最近完成的 keep 个任务（长期运行的服务使用）"""
+        with self._lock:
+            finished = [job for job in self.jobs if not job.active]
+            forget = {job.id for job in finished[:max(0, len(finished) - keep)]}
+            if forget:
+                self.jobs = [job for job in self.jobs if job.id not in forget]
+
+    def _schedule(self):
+        with self._lock:
+            running = self.running()
+            blocked = []
+            for job in self.jobs:
+                if job.state != STATE_QUEUED:
+                    continue
+                if len(running) >= self.max_parallel:
+                    break
+                # 不能越过与之冲突的排队任务，保证冲突任务按提交顺序执行
+                if any(job.conflicts_with(other) for other in running + blocked):
+                    blocked.append(job)
+                    continue
+                job.state = STATE_RUNNING
+                job.started = time.time()
+                self._start(job)
+                running.append(job)
+                self._notify_started(job.id)
+
+    def _start(self, job):
+        runner = threading.Thread(target=self._run, args=(job,), name=f"job-{job.id}", daemon=True)
+        self._runners[job.id] = runner
+        runner.start()
+
+    def _run(self, job):
+        run_job(job)
+        self._on_finished(job.id)
+
+    def _on_finished(self, job_id):
+        with self._lock:
+            self._runners.pop(job_id, None)
+        job = self.get(job_id)
+        if job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception as e:
+                job.write_line(f"处理任务结果时发生错误: {str(e)}")
+        self._notify_finished(job_id)
+        self._schedule()
+
+    def _notify_added(self, job_id):
+        pass
+
+    def _notify_started(self, job_id):
+        pass
+
+    def _notify_finished(self, job_id):
+        pass
+
+    def wait_all(self):
+        for runner in list(self._runners.values()):
+            runner.join()
@@ -0,0 +1,337 @@
+import json
+import datetime
+import os
+import posixpath
+import shutil
+import sqlite3
+import argparse
+import sys
+import threading
+import io
+import codecs
+import fnmatch
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from qb_client import connect
+from content_index import get_torrent_files, save_files_cache, normalize_path
+from delete_throttle import map_path
+from bt_backup import read_bt_backup
+
+# 设置控制台输出编码为UTF-8
+if sys.platform.startswith('win'):
+    try:
+        import codecs
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer)
+    except (AttributeError, io.UnsupportedOperation):
+        pass  # 如果无法设置编码，保持默认设置
+
+# 目录列表缓存，目录 mtime 未变化时直接使用缓存的列表
+SCAN_CACHE_DB = "cache/orphan_scan.db"
+
+DEFAULT_ORPHAN_SETTINGS = {
+    "paths": [],          # 需要扫描的下载目录（本机路径）
+    "servers": ["local"], # 提供种子文件列表的服务器
+    "path_map": {},       # 服务器路径到本机路径的映射
+    "workers": 8,
+    # 忽略的文件/目录名，支持通配符（如 "*.tmp"）
+    "ignore": [".stfolder", ".DS_Store", "Thumbs.db", "desktop.ini"],
+    # 未完成文件的后缀（qBittorrent 的“为不完整的文件添加扩展名”选项）
+    "incomplete_suffixes": [".!qB"],
+    # 未引用数据占扫描数据的比例超过此值时不删除（很可能是路径映射或种子列表有误）
+    "max_orphan_ratio": 0.5
+}
+
+def format_size(size_bytes):
+    """将字节大小转换为人类可读的格式"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.2f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.2f} PB"
+
+def load_config():
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            config = json.load(f)
+            if not isinstance(config, dict):
+                raise ValueError("配置文件格式错误：根对象必须是字典类型")
+            return config
+    except json.JSONDecodeError as e:
+        raise ValueError(f"配置文件JSON格式错误: {str(e)}")
+    except FileNotFoundError:
+        raise FileNotFoundError("找不到配置文件 config.json")
+
+def get_orphan_settings(settings=None):
+    """合并用户配置与默认配置"""
+    merged = dict(DEFAULT_ORPHAN_SETTINGS)
+    if isinstance(settings, dict):
+        merged.update(settings)
+    return merged
+
+class ReferenceIndex:
+    """所有种子引用的文件路径，以及这些文件的全部上级目录"""
+
+    def __init__(self, path_map, incomplete_suffixes=()):
+        self.path_map = path_map
+        self.incomplete_suffixes = tuple(incomplete_suffixes)
+        self.files = set()
+        self.dirs = set()
+
+    def add(self, save_path, relative_path):
+        path = normalize_path(map_path(posixpath.join(normalize_path(save_path), normalize_path(relative_path)),
+                                       self.path_map))
+        self.files.add(path)
+        parent = posixpath.dirname(path)
+        while parent and parent not in self.dirs and parent != posixpath.dirname(parent):
+            self.dirs.add(parent)
+            parent = posixpath.dirname(parent)
+
+    def add_part_file(self, save_path, torrent_hash):
+        """libtorrent 在保存目录中为未下载的文件保存边界分块：.<hash>.parts"""
+        self.add(save_path, f".{torrent_hash}.parts")
+
+    def is_file_referenced(self, path):
+        if path in self.files:
+            return True
+        return any(path.endswith(suffix) and path[:-len(suffix)] in self.files
+                   for suffix in self.incomplete_suffixes)
+
+    def is_dir_referenced(self, path):
+        return path in self.dirs or path in self.files
+
+def build_reference_index(config, settings):
+    """从各服务器（或本地 BT_backup）收集所有种子引用的文件"""
+    index = ReferenceIndex(settings["path_map"], settings["incomplete_suffixes"])
+    for server_name in settings["servers"]:
+        if server_name in ("local", "本地服务器"):
+            server_config = dict(config["local_server"], name="本地服务器")
+        else:
+            server_config = next((s for s in config.get("remote_servers", []) if s["name"] == server_name), None)
+            if server_config is None:
+                raise ValueError(f"配置文件中找不到服务器: {server_name}")
+
+        if server_config.get("bt_backup"):
+            print(f"正在读取 {server_config['name']} 的 BT_backup 目录...")
+            for torrent in read_bt_backup(server_config["bt_backup"], with_files=True):
+                for name, _ in torrent["files"]:
+                    index.add(torrent["save_path"], name)
+                index.add_part_file(torrent["save_path"], torrent["hash"])
+            continue
+
+        print(f"正在从服务器 {server_config['name']} 获取种子文件列表...")
+        qb = connect(server_config)
+        try:
+            for torrent in qb.torrents_info():
+                for name, _ in get_torrent_files(qb, torrent.hash):
+                    index.add(torrent.save_path, name)
+                index.add_part_file(torrent.save_path, torrent.hash)
+        finally:
+            qb.auth_log_out()
+    save_files_cache()
+    print(f"共有 {len(index.files)} 个文件被种子引用")
+    return index
+
+def _list_directory(path, cached_mtime, cached_listing):
+    """列出目录内容，mtime 未变化时直接返回缓存的列表"""
+    mtime = os.stat(path).st_mtime
+    if cached_mtime == mtime and cached_listing is not None:
+        return path, mtime, cached_listing, False
+    files, dirs = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    files.append([entry.name, entry.stat(follow_symlinks=False).st_size])
+            except OSError:
+                continue
+    return path, mtime, {"files": files, "dirs": dirs}, True
+
+def directory_size(path):
+    """统计目录的总大小和文件数（逐层 scandir，不一次性加载整棵树）"""
+    total, count = 0, 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_size
+                            count += 1
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total, count
+
+class ScanCache:
+    """基于 sqlite 的目录列表缓存，避免将整棵目录树加载到内存"""
+
+    def __init__(self, db_file=SCAN_CACHE_DB):
+        db_dir = os.path.dirname(db_file)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime REAL, listing TEXT)")
+
+    def get(self, path):
+        row = self.conn.execute("SELECT mtime, listing FROM dirs WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None, None
+        return row[0], json.loads(row[1])
+
+    def put(self, path, mtime, listing):
+        self.conn.execute("INSERT OR REPLACE INTO dirs (path, mtime, listing) VALUES (?, ?, ?)",
+                          (path, mtime, json.dumps(listing, ensure_ascii=False)))
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+def is_ignored(name, patterns):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+def scan_orphans(roots, reference, settings, on_orphan):
+    """并行遍历下载目录，对每个未被引用的文件或目录调用 on_orphan(path, size, files, is_dir)
+
+    完全未被引用的目录作为一个整体报告，不再深入遍历其内容。
+    返回使用缓存的目录数和被引用文件的总大小。
+    """
+    cache = ScanCache()
+    ignore = settings["ignore"]
+    pending = deque(normalize_path(root) for root in roots)
+    max_in_flight = settings["workers"] * 4
+    reused = 0
+    referenced_size = 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=settings["workers"]) as executor:
+            in_flight = set()
+            while pending or in_flight:
+                # 限制同时处理的目录数，保持内存占用稳定
+                while pending and len(in_flight) < max_in_flight:
+                    path = pending.popleft()
+                    cached_mtime, cached_listing = cache.get(path)
+                    in_flight.add(executor.submit(_list_directory, path, cached_mtime, cached_listing))
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        path, mtime, listing, changed = future.result()
+                    except OSError as e:
+                        print(f"无法读取目录: {str(e)}")
+                        continue
+                    if changed:
+                        cache.put(path, mtime, listing)
+                    else:
+                        reused += 1
+
+                    for name, size in listing["files"]:
+                        file_path = posixpath.join(path, name)
+                        if is_ignored(name, ignore):
+                            continue
+                        if reference.is_file_referenced(file_path):
+                            referenced_size += size
+                        else:
+                            on_orphan(file_path, size, 1, False)
+                    for name in listing["dirs"]:
+                        dir_path = posixpath.join(path, name)
+                        if is_ignored(name, ignore):
+                            continue
+                        if reference.is_dir_referenced(dir_path):
+                            pending.append(dir_path)
+                        else:
+                            size, count = directory_size(dir_path)
+                            on_orphan(dir_path, size, count, True)
+    finally:
+        cache.close()
+    return reused, referenced_size
+
+def remove_path(path, is_dir):
+    if is_dir:
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+def find_orphans(delete=False, settings=None, config=None):
+    """扫描下载目录中未被任何种子引用的文件，delete 为 True 时删除这些文件
+
+    扫描完成后才删除：没有任何种子映射到某个扫描目录，或未引用数据的比例超过 max_orphan_ratio 时，
+    通常是路径映射或服务器配置有误，此时不删除任何文件。
+    """
+    config = config or load_config()
+    settings = get_orphan_settings(settings if settings is not None else config.get("orphan_scan"))
+    if not settings["paths"]:
+        print("未配置需要扫描的目录（orphan_scan.paths）")
+        return None
+
+    reference = build_reference_index(config, settings)
+    unmapped = [root for root in settings["paths"] if not reference.is_dir_referenced(normalize_path(root))]
+    if unmapped:
+        print(f"没有任何种子的文件位于以下目录中，请检查 path_map 和 servers 配置: {', '.join(unmapped)}")
+        return None
+
+    if not os.path.exists("logs"):
+        os.makedirs("logs")
+    current_time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_file = f"logs/orphans_{current_time}.txt"
+    totals = {"entries": 0, "files": 0, "size": 0, "deleted": 0}
+    orphans = []
+    lock = threading.Lock()
+
+    with open(report_file, "w", encoding="utf-8") as report:
+        def on_orphan(path, size, files, is_dir):
+            with lock:
+                totals["entries"] += 1
+                totals["files"] += files
+                totals["size"] += size
+                kind = "目录" if is_dir else "文件"
+                report.write(f"{kind}\t{size}\t{path}\n")
+                print(f"未引用{kind}: {path} ({format_size(size)}{f', {files} 个文件' if is_dir else ''})")
+                if delete:
+                    orphans.append((path, size, is_dir))
+
+        print(f"\n正在扫描目录: {', '.join(settings['paths'])}")
+        reused, referenced_size = scan_orphans(settings["paths"], reference, settings, on_orphan)
+
+    scanned_size = totals["size"] + referenced_size
+    ratio = totals["size"] / scanned_size if scanned_size else 0
+    if ratio > settings["max_orphan_ratio"]:
+        print(f"\n未引用数据占扫描数据的 {ratio:.0%}，超过 max_orphan_ratio（{settings['max_orphan_ratio']:.0%}），"
+              f"请检查 path_map 和 servers 配置")
+        if delete:
+            print("为安全起见，本次不删除任何文件")
+            orphans = []
+    for path, size, is_dir in orphans:
+        try:
+            remove_path(path, is_dir)
+            totals["deleted"] += size
+            print(f"已删除: {path}")
+        except OSError as e:
+            print(f"删除 {path} 时发生错误: {str(e)}")
+
+    print(f"\n=== 总结 ===")
+    print(f"有 {reused} 个目录未发生变化，使用了缓存的目录列表")
+    print(f"共找到 {totals['entries']} 项未被引用的数据（{totals['files']} 个文件），总大小: {format_size(totals['size'])}")
+    if delete:
+        print(f"已删除: {format_size(totals['deleted'])}")
+    print(f"报告已保存至: {report_file}")
+    return report_file
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='查找下载目录中未被任何种子引用的文件')
+    parser.add_argument('--delete', action='store_true', help='删除找到的未引用文件')
+    parser.add_argument('--yes', '-y', action='store_true', help='删除前不再确认')
+    args = parser.parse_args()
+
+    try:
+        if args.delete and not args.yes:
+            if input("将删除所有未被种子引用的文件，是否继续？(y/N) ").lower() != 'y':
+                sys.exit(0)
+        find_orphans(delete=args.delete)
+    except Exception as e:
+        print(f"程序执行过程中发生错误: {str(e)}")
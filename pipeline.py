@@ -0,0 +1,68 @@
+import queue
+import threading
+import time
+
+DEFAULT_PIPELINE_SETTINGS = {
+    "enabled": False,   # 边扫描边删除
+    "queue_size": 32    # 扫描与删除之间队列的最大长度
+}
+
+_STOP = object()
+
+def get_pipeline_settings(settings=None):
+    """合并用户配置与默认流水线配置"""
+    merged = dict(DEFAULT_PIPELINE_SETTINGS)
+    if isinstance(settings, dict):
+        merged.update(settings)
+    return merged
+
+class DeletionPipeline:
+    """单个服务器内的扫描/删除流水线
+
+    扫描线程（生产者）识别出需要删除的种子后立即 submit，由独立的删除线程（消费者）
+    按提交顺序调用 consume(item)，扫描和删除同时进行。队列有界，删除跟不上时扫描会等待，
+    避免积压。consume 抛出的异常会停止后续删除，并在下一次 submit 或 check 时抛出。
+    """
+
+    def __init__(self, consume, queue_size=DEFAULT_PIPELINE_SETTINGS["queue_size"], name=""):
+        self._consume = consume
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._closed = False
+        self.error = None
+        self.processed = 0
+        self.started = time.perf_counter()
+        self.first_done = None   # 第一个种子删除完成的耗时（秒）
+        self._thread = threading.Thread(target=self._run, name=f"pipeline-{name}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self._consume(item)
+            except Exception as e:
+                self.error = e
+                continue
+            self.processed += 1
+            if self.first_done is None:
+                self.first_done = time.perf_counter() - self.started
+
+    def submit(self, item):
+        """提交一个待删除项，队列已满时阻塞"""
+        self.check()
+        self._queue.put(item)
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """等待已提交的项全部处理完毕（可重复调用）"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join()
@@ -0,0 +1,159 @@
+import cProfile
+import datetime
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+
+# 报告中列出的函数/分配位置数量
+DEFAULT_TOP_N = 30
+
+# tracemalloc 记录的调用栈深度
+TRACE_FRAMES = 10
+
+# cProfile 钩子、threading.setprofile 和 tracemalloc 都是进程级的全局状态，
+# 同一时刻只允许一次性能分析；其他线程中的分析会排队等待
+_PROFILE_LOCK = threading.Lock()
+_active = threading.local()
+
+# Python 3.12 起 cProfile 基于 sys.monitoring，一个 Profile 即覆盖所有线程，
+# 且同时只能启用一个（其他线程中再启用会抛出 ValueError）；之前的版本需为每个线程单独启用
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+def new_run_id():
+    """生成本次运行的标识，同一次运行中的多个步骤共用"""
+    return f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+
+class Profiler:
+    """CPU 性能分析（cProfile）与内存分配跟踪（tracemalloc）
+
+    工作线程（线程池中的服务器任务等）同样会被分析，结果合并后写入 logs/：
+    profile_<步骤>_<运行ID>.pstats 可用 pstats / snakeviz 查看，
+    profile_<步骤>_<运行ID>.txt 为耗时最多的函数和内存分配最多的代码位置。
+    同时只能有一个 Profiler 生效，并行的分析任务会依次进行。
+    """
+
+    def __init__(self, label, run_id=None, top=DEFAULT_TOP_N):
+        self.label = label
+        self.run_id = run_id or new_run_id()
+        self.top = top
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+        self.stats = None
+
+    def _thread_hook(self, *args):
+        # 在新线程中第一次触发时为该线程启用独立的 cProfile（会替换掉此钩子）
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def __enter__(self):
+        if not _PROFILE_LOCK.acquire(blocking=False):
+            print(f"另一个性能分析正在进行，步骤 {self.label} 等待其结束...")
+            _PROFILE_LOCK.acquire()
+        _active.profiling = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._snapshot_before = tracemalloc.take_snapshot()
+        if PER_THREAD_PROFILES:
+            self._previous_hook = threading.getprofile() if hasattr(threading, "getprofile") else None
+            threading.setprofile(self._thread_hook)
+        self._main = cProfile.Profile()
+        self._main.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._main.disable()
+            if PER_THREAD_PROFILES:
+                threading.setprofile(self._previous_hook)
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            try:
+                self._write_reports(snapshot, current, peak)
+            except OSError as e:
+                print(f"保存性能分析结果时发生错误: {str(e)}")
+        finally:
+            _active.profiling = False
+            _PROFILE_LOCK.release()
+        return False
+
+    def _write_reports(self, snapshot, current, peak):
+        if not os.path.exists("logs"):
+            os.makedirs("logs")
+        base = f"logs/profile_{self.label}_{self.run_id}"
+
+        stats = pstats.Stats(self._main)
+        with self._lock:
+            for profile in self._profiles:
+                profile.disable()
+                stats.add(profile)
+        self.stats = stats
+        stats.dump_stats(base + ".pstats")
+
+        text = io.StringIO()
+        text.write(f"步骤: {self.label}\n运行ID: {self.run_id}\n")
+        if PER_THREAD_PROFILES:
+            text.write(f"分析的线程数: {len(self._profiles) + 1}\n\n")
+        else:
+            text.write("分析的线程: 全部\n\n")
+        text.write(f"=== 累计耗时最多的 {self.top} 个函数 ===\n")
+        stats.stream = text
+        stats.sort_stats("cumulative").print_stats(self.top)
+
+        text.write(f"\n=== 内存 ===\n峰值: {peak / 1024 / 1024:.1f} MB，结束时仍占用: {current / 1024 / 1024:.1f} MB\n")
+        text.write(f"\n=== 新增内存最多的 {self.top} 个代码位置 ===\n")
+        for stat in snapshot.compare_to(self._snapshot_before, "lineno")[:self.top]:
+            text.write(f"{stat}\n")
+        text.write(f"\n=== 占用内存最多的 {min(self.top, 10)} 个调用栈 ===\n")
+        for stat in snapshot.statistics("traceback")[:min(self.top, 10)]:
+            text.write(f"\n{stat.count} 个内存块，共 {stat.size / 1024:.1f} KB\n")
+            for line in stat.traceback.format():
+                text.write(line + "\n")
+
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+        print(f"性能分析结果已保存至: {base}.pstats / {base}.txt")
+
+def run_profiled(label, function, *args, enabled=True, run_id=None, **kwargs):
+    """调用 function(*args, **kwargs)，enabled 为 True 时同时进行性能分析"""
+    if not enabled or getattr(_active, "profiling", False):
+        # 当前线程已在分析中（嵌套调用）时直接运行，结果计入外层的分析
+        return function(*args, **kwargs)
+    with Profiler(label, run_id):
+        return function(*args, **kwargs)
+
+def _self_test():
+    """在性能分析下运行使用线程池的任务，确认结果正确且各线程都被分析"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def busy(n):
+        return sum(i * i for i in range(n))
+
+    def workflow():
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            return sum(executor.map(busy, [20000] * 8))
+
+    expected = workflow()
+    with Profiler("self_test") as profiler:
+        result = workflow()
+    if result != expected:
+        print(f"结果不一致: {result} != {expected}")
+        return 1
+    calls = sum(stat[1] for (_, _, name), stat in profiler.stats.stats.items() if name == "busy")
+    if calls != 8:
+        print(f"工作线程未被完整分析：busy 记录了 {calls} 次调用，应为 8 次")
+        return 1
+    print("线程池任务在性能分析下正常完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(_self_test())
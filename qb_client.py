@@ -0,0 +1,155 @@
+import json
+import os
+import random
+import threading
+import time
+
+# 各服务器的连接状态（熔断器），跨次运行保留
+SERVER_HEALTH_FILE = "cache/server_health.json"
+
+DEFAULT_CONNECTION_SETTINGS = {
+    "connect_timeout": 5,        # 建立连接的超时（秒）
+    "read_timeout": 60,          # 等待响应的超时（秒）
+    "retries": 2,                # 登录失败后的重试次数
+    "backoff": 1.0,              # 重试的基础等待时间（秒），每次翻倍并加入随机抖动
+    "backoff_max": 10.0,
+    "failure_threshold": 2,      # 连续失败多少次后打开熔断器
+    "cooldown_minutes": 15,      # 熔断器打开后跳过该服务器的时间
+    "probe_timeout": 3           # 冷却结束后试探连接的超时（秒），试探时不重试
+}
+
+_settings_cache = None
+_health_lock = threading.Lock()
+
+class ServerUnavailable(Exception):
+    """服务器无法连接，或因最近连续失败而被熔断器跳过"""
+
+def get_connection_settings(settings=None, server_config=None):
+    """合并默认配置、config.json 中的 connection 配置以及服务器自身的 connection 配置"""
+    global _settings_cache
+    if settings is None:
+        if _settings_cache is None:
+            try:
+                with open("config.json", "r", encoding="utf-8") as f:
+                    _settings_cache = json.load(f).get("connection") or {}
+            except (OSError, ValueError, AttributeError):
+                _settings_cache = {}
+        settings = _settings_cache
+    merged = dict(DEFAULT_CONNECTION_SETTINGS)
+    if isinstance(settings, dict):
+        merged.update(settings)
+    if server_config and isinstance(server_config.get("connection"), dict):
+        merged.update(server_config["connection"])
+    return merged
+
+def create_client(server_config, settings=None, connect_timeout=None):
+    """根据服务器配置创建 qBittorrent 客户端
+
+    qbittorrentapi 在首次连接时才导入，避免 --help、配置错误等情况下的额外启动开销。
+    所有请求都带有连接/读取超时，无响应的服务器不会让整个任务卡住。
+    """
+    from qbittorrentapi import Client
+    settings = get_connection_settings(settings, server_config)
+    timeout = (connect_timeout or settings["connect_timeout"], settings["read_timeout"])
+    return Client(
+        host=server_config["url"],
+        username=server_config["username"],
+        password=server_config["password"],
+        REQUESTS_ARGS={"timeout": timeout},
+        # 重试由 connect() 控制，不使用 requests 自带的立即重试
+        HTTPADAPTER_ARGS={"max_retries": 0}
+    )
+
+def _server_key(server_config):
+    return server_config.get("name") or server_config["url"]
+
+def load_server_health(health_file=SERVER_HEALTH_FILE):
+    try:
+        with open(health_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _update_server_health(key, update, health_file=SERVER_HEALTH_FILE):
+    """在锁内读取、修改并原子写回单个服务器的状态"""
+    with _health_lock:
+        health = load_server_health(health_file)
+        entry = update(health.get(key, {}))
+        if entry:
+            health[key] = entry
+        else:
+            health.pop(key, None)
+        health_dir = os.path.dirname(health_file)
+        if health_dir and not os.path.exists(health_dir):
+            os.makedirs(health_dir)
+        tmp_file = health_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(health, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_file, health_file)
+
+def record_success(server_config):
+    _update_server_health(_server_key(server_config), lambda entry: None)
+
+def record_failure(server_config, error, settings=None):
+    settings = get_connection_settings(settings, server_config)
+
+    def update(entry):
+        now = time.time()
+        failures = entry.get("failures", 0) + 1
+        entry = {"failures": failures, "last_failure": now, "error": str(error)}
+        if failures >= settings["failure_threshold"]:
+            entry["open_until"] = now + settings["cooldown_minutes"] * 60
+        return entry
+
+    _update_server_health(_server_key(server_config), update)
+
+def circuit_state(server_config, now=None):
+    """返回 ("closed" | "open" | "half_open", 状态条目)"""
+    entry = load_server_health().get(_server_key(server_config))
+    if not entry or "open_until" not in entry:
+        return "closed", entry
+    now = now if now is not None else time.time()
+    return ("open" if now < entry["open_until"] else "half_open"), entry
+
+def connect(server_config, settings=None):
+    """创建客户端并登录，返回已登录的客户端
+
+    - 熔断器打开时（最近连续失败）直接抛出 ServerUnavailable，不发起任何请求
+    - 冷却时间结束后只用较短的超时试探一次，成功后恢复正常
+    - 正常状态下连接失败会按指数退避（带随机抖动）重试
+    用户名或密码错误等不可恢复的错误不重试，也不计入熔断器。
+    """
+    from qbittorrentapi import APIConnectionError, LoginFailed, Forbidden403Error
+    settings = get_connection_settings(settings, server_config)
+    name = _server_key(server_config)
+
+    state, entry = circuit_state(server_config)
+    if state == "open":
+        remaining = int((entry["open_until"] - time.time()) / 60) + 1
+        raise ServerUnavailable(f"服务器 {name} 最近连续连接失败（{entry.get('error', '')}），"
+                                f"约 {remaining} 分钟内跳过")
+    if state == "half_open":
+        attempts, connect_timeout = 1, settings["probe_timeout"]
+    else:
+        attempts, connect_timeout = settings["retries"] + 1, None
+
+    last_error = None
+    for attempt in range(attempts):
+        if attempt:
+            delay = min(settings["backoff_max"], settings["backoff"] * 2 ** (attempt - 1))
+            time.sleep(delay * random.uniform(0.5, 1.5))
+        qb = create_client(server_config, settings, connect_timeout)
+        try:
+            qb.auth_log_in()
+        except (LoginFailed, Forbidden403Error):
+            raise
+        except APIConnectionError as e:
+            last_error = e
+            continue
+        if entry:
+            record_success(server_config)
+        return qb
+
+    record_failure(server_config, last_error, settings)
+    raise ServerUnavailable(f"无法连接服务器 {name}: {str(last_error)}")
@@ -0,0 +1,297 @@
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableView, QLineEdit,
+                            QPushButton, QLabel, QHeaderView, QAbstractItemView)
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QThread, QTimer, pyqtSignal
+
+# 每次向视图追加的行数（懒加载）
+FETCH_BATCH = 2000
+
+KIND_LOCAL = "torrents_to_delete"
+KIND_SITE_DELETED = "deleted_torrents"
+
+def format_size(size_bytes):
+    """将字节大小转换为人类可读的格式"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.2f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.2f} PB"
+
+def _join(value):
+    return ", ".join(value) if isinstance(value, list) else (value or "")
+
+# 各结果类型的列：(标题, 记录字段, 显示函数)
+COLUMNS = {
+    KIND_LOCAL: [
+        ("名称", "name", str),
+        ("大小", "size", format_size),
+        ("分类", "category", str),
+        ("标签", "tags", str),
+        ("来源", "sources", _join)
+    ],
+    KIND_SITE_DELETED: [
+        ("服务器", "server", str),
+        ("名称", "name", str),
+        ("大小", "size", format_size),
+        ("Tracker消息", "tracker_msg", str)
+    ]
+}
+
+class SortFilterTask(QThread):
+    """在后台线程中计算排序和筛选后的行顺序（记录的下标列表）"""
+    done = pyqtSignal(int, list)
+
+    def __init__(self, generation, records, columns, text, sort_column, sort_order):
+        super().__init__()
+        self.generation = generation
+        self.records = records
+        self.columns = columns
+        self.text = text.lower()
+        self.sort_column = sort_column
+        self.sort_order = sort_order
+
+    def run(self):
+        indices = range(len(self.records))
+        if self.text:
+            fields = [field for _, field, _ in self.columns]
+            indices = [
+                i for i in indices
+                if any(self.text in _join(self.records[i].get(field)).lower()
+                       for field in fields if not isinstance(self.records[i].get(field), (int, float)))
+            ]
+        indices = list(indices)
+        if self.sort_column is not None:
+            field = self.columns[self.sort_column][1]
+            numeric = all(isinstance(self.records[i].get(field), (int, float)) for i in indices[:100])
+
+            def key(i):
+                value = self.records[i].get(field)
+                return (value or 0) if numeric else _join(value).lower()
+
+            indices.sort(key=key, reverse=self.sort_order == Qt.SortOrder.DescendingOrder)
+        self.done.emit(self.generation, indices)
+
+class ResultsModel(QAbstractTableModel):
+    """直接绑定扫描结果记录的表格模型
+
+    第 0 列为勾选框。行按需分批加载，排序和筛选在后台线程完成，
+    勾选状态按记录保存，与当前的排序/筛选无关。
+    """
+    order_changed = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.kind = KIND_LOCAL
+        self.columns = COLUMNS[KIND_LOCAL]
+        self.records = []
+        self.checked = bytearray()
+        self._order = []
+        self._loaded = 0
+        self._generation = 0
+        self._tasks = set()
+        self._filter_text = ""
+        self._sort = (None, Qt.SortOrder.AscendingOrder)
+
+    def set_records(self, kind, records):
+        self.beginResetModel()
+        self.kind = kind
+        self.columns = COLUMNS.get(kind, COLUMNS[KIND_LOCAL])
+        self.records = records
+        self.checked = bytearray(b"\x01" * len(records))
+        self._order = list(range(len(records)))
+        self._loaded = min(FETCH_BATCH, len(self._order))
+        self._filter_text = ""
+        self._sort = (None, Qt.SortOrder.AscendingOrder)
+        self._generation += 1
+        self.endResetModel()
+        self.order_changed.emit()
+
+    # 懒加载
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < len(self._order)
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(FETCH_BATCH, len(self._order) - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns) + 1
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or orientation != Qt.Orientation.Horizontal:
+            return None
+        return "" if section == 0 else self.columns[section - 1][0]
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        record_index = self._order[index.row()]
+        if index.column() == 0:
+            if role == Qt.ItemDataRole.CheckStateRole:
+                return Qt.CheckState.Checked if self.checked[record_index] else Qt.CheckState.Unchecked
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            _, field, display = self.columns[index.column() - 1]
+            return display(self.records[record_index].get(field) or ("" if display is str else 0))
+        if role == Qt.ItemDataRole.TextAlignmentRole and self.columns[index.column() - 1][1] == "size":
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == 0:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if index.column() != 0 or role != Qt.ItemDataRole.CheckStateRole:
+            return False
+        checked = value == Qt.CheckState.Checked.value or value == Qt.CheckState.Checked
+        self.checked[self._order[index.row()]] = 1 if checked else 0
+        self.dataChanged.emit(index, index, [role])
+        self.order_changed.emit()
+        return True
+
+    def set_all_visible(self, checked):
+        """勾选/取消勾选当前筛选结果中的所有行"""
+        value = 1 if checked else 0
+        for record_index in self._order:
+            self.checked[record_index] = value
+        if self._loaded:
+            self.dataChanged.emit(self.index(0, 0), self.index(self._loaded - 1, 0),
+                                  [Qt.ItemDataRole.CheckStateRole])
+        self.order_changed.emit()
+
+    # 后台排序/筛选
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self._sort = (column - 1 if column > 0 else None, order)
+        self._start_task()
+
+    def set_filter(self, text):
+        self._filter_text = text
+        self._start_task()
+
+    def _start_task(self):
+        self._generation += 1
+        task = SortFilterTask(self._generation, self.records, self.columns, self._filter_text, *self._sort)
+        task.done.connect(self._apply_order)
+        # 保持引用直到线程结束，避免运行中的线程被回收
+        self._tasks.add(task)
+        task.finished.connect(lambda: self._tasks.discard(task))
+        task.start()
+
+    def _apply_order(self, generation, order):
+        if generation != self._generation:
+            return  # 已有更新的排序/筛选请求
+        self.beginResetModel()
+        self._order = order
+        self._loaded = min(FETCH_BATCH, len(order))
+        self.endResetModel()
+        self.order_changed.emit()
+
+    # 选择结果
+    def visible_count(self):
+        return len(self._order)
+
+    def selected_records(self):
+        return [record for record, checked in zip(self.records, self.checked) if checked]
+
+    def selected_hashes(self):
+        return {record.get("hash") for record, checked in zip(self.records, self.checked) if checked}
+
+    def selected_torrents(self):
+        """选中种子的 (服务器, hash) 集合；同一 hash 可能出现在多台服务器上"""
+        return {(record.get("server"), record.get("hash"))
+                for record, checked in zip(self.records, self.checked) if checked}
+
+    def all_selected(self):
+        return all(self.checked)
+
+class ResultsView(QWidget):
+    """结果表格：筛选框、全选/全不选按钮、选择统计和虚拟化的表格视图"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.model = ResultsModel(self)
+        self.source_file = None
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        toolbar = QHBoxLayout()
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("筛选（名称、标签、服务器、Tracker消息...）")
+        # 输入停止片刻后再筛选
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(300)
+        self._filter_timer.timeout.connect(lambda: self.model.set_filter(self.filter_edit.text()))
+        self.filter_edit.textChanged.connect(self._filter_timer.start)
+        select_all_btn = QPushButton("全选")
+        select_all_btn.clicked.connect(lambda: self.model.set_all_visible(True))
+        select_none_btn = QPushButton("全不选")
+        select_none_btn.clicked.connect(lambda: self.model.set_all_visible(False))
+        toolbar.addWidget(self.filter_edit)
+        toolbar.addWidget(select_all_btn)
+        toolbar.addWidget(select_none_btn)
+        layout.addLayout(toolbar)
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSortingEnabled(True)
+        self.table.horizontalHeader().setSortIndicatorShown(True)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setAlternatingRowColors(True)
+        self.table.setWordWrap(False)
+        # 固定行高，避免按内容计算每一行的高度
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(22)
+        self.table.verticalHeader().hide()
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        self.summary = QLabel()
+        layout.addWidget(self.summary)
+        self.model.order_changed.connect(self.update_summary)
+        self.update_summary()
+
+    def set_results(self, kind, records, source_file=None):
+        self.source_file = source_file
+        self.filter_edit.blockSignals(True)
+        self.filter_edit.clear()
+        self.filter_edit.blockSignals(False)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.model.set_records(kind, records)
+        self.table.setColumnWidth(0, 28)
+        self.table.setColumnWidth(1, 320 if kind == KIND_LOCAL else 120)
+
+    def clear(self):
+        self.set_results(KIND_LOCAL, [])
+
+    def update_summary(self):
+        selected = self.model.selected_records()
+        total = len(self.model.records)
+        size = sum(record.get("size", 0) for record in selected)
+        shown = f"，显示 {self.model.visible_count()} 个" if self.model.visible_count() != total else ""
+        self.summary.setText(f"共 {total} 个种子{shown}，已选择 {len(selected)} 个（{format_size(size)}）")
+
+    def has_results(self, kind):
+        return self.model.kind == kind and bool(self.model.records)
+
+    def selection(self, kind):
+        """返回选中的种子；未加载该类型结果或全部选中时返回 None（表示不限制）
+
+        本地待迁移种子返回 hash 集合，站点删除的种子返回 (服务器, hash) 集合。
+        """
+        if not self.has_results(kind) or self.model.all_selected():
+            return None
+        if kind == KIND_SITE_DELETED:
+            return self.model.selected_torrents()
+        return self.model.selected_hashes()
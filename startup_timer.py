@@ -0,0 +1,57 @@
+import atexit
+import builtins
+import os
+import sys
+import time
+
+# 设置环境变量 QBC_STARTUP_REPORT=1（或在 GUI 中使用 --startup-report）后，
+# 在退出时（GUI 为窗口显示后）输出类似 -X importtime 的启动耗时报告
+ENV_VAR = "QBC_STARTUP_REPORT"
+
+_start = time.perf_counter()
+_phases = []
+_imports = {}
+_enabled = False
+_original_import = builtins.__import__
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if name in sys.modules or level:
+        return _original_import(name, globals, locals, fromlist, level)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        # 记录包含子模块在内的累计耗时，只记录首次导入
+        _imports.setdefault(name, time.perf_counter() - start)
+
+def enable():
+    """开始记录模块导入耗时"""
+    global _enabled
+    if _enabled:
+        return
+    _enabled = True
+    builtins.__import__ = _timed_import
+    atexit.register(report)
+
+def mark(label):
+    """记录一个启动阶段的时间点"""
+    if _enabled:
+        _phases.append((label, time.perf_counter() - _start))
+
+def report(top=15, stream=None):
+    """输出启动阶段和最慢的模块导入"""
+    global _enabled
+    if not _enabled:
+        return
+    _enabled = False
+    builtins.__import__ = _original_import
+    stream = stream or sys.stderr
+    print("\n=== 启动耗时报告 ===", file=stream)
+    for label, elapsed in _phases:
+        print(f"{elapsed * 1000:9.1f} ms  {label}", file=stream)
+    print(f"\n最慢的 {top} 个模块导入（累计耗时）:", file=stream)
+    for name, elapsed in sorted(_imports.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"{elapsed * 1000:9.1f} ms  {name}", file=stream)
+
+if os.environ.get(ENV_VAR):
+    enable()
@@ -0,0 +1,158 @@
+import base64
+import hashlib
+import math
+
+def _to_bytes(item):
+    return item.encode("utf-8") if isinstance(item, str) else bytes(item)
+
+class BloomFilter:
+    """简单的布隆过滤器，用于向远程匹配端发送紧凑的目标集合
+
+    可能误判（返回存在），但不会漏判，匹配端返回的结果需要在本地再精确核对一次。
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, capacity)
+        self.m = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(_to_bytes(item), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def to_dict(self):
+        return {"m": self.m, "k": self.k, "bits": base64.b64encode(bytes(self.bits)).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data):
+        bloom = cls.__new__(cls)
+        bloom.m = data["m"]
+        bloom.k = data["k"]
+        bloom.bits = bytearray(base64.b64decode(data["bits"]))
+        return bloom
+
+    @classmethod
+    def from_items(cls, items, error_rate=0.01):
+        items = list(items)
+        bloom = cls(len(items), error_rate)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+# 打包文件头：魔数、版本、20字节与32字节哈希的数量
+PACKED_MAGIC = b"QBHS"
+PACKED_VERSION = 1
+HASH_WIDTHS = (20, 32)
+
+class PackedHashSet:
+    """按字节排序打包的 infohash 集合，内存占用接近哈希原始字节数
+
+    v1（20字节）和 v2（32字节）哈希分别存放在两个连续的 bytes 中，查找使用二分法。
+    """
+
+    def __init__(self, hashes=()):
+        buckets = {width: [] for width in HASH_WIDTHS}
+        for torrent_hash in hashes:
+            raw = self._to_raw(torrent_hash)
+            if raw is not None:
+                buckets[len(raw)].append(raw)
+        self._data = {}
+        for width, items in buckets.items():
+            items.sort()
+            # 去重
+            unique = [item for idx, item in enumerate(items) if idx == 0 or item != items[idx - 1]]
+            self._data[width] = b"".join(unique)
+
+    @staticmethod
+    def _to_raw(torrent_hash):
+        if isinstance(torrent_hash, (bytes, bytearray)):
+            raw = bytes(torrent_hash)
+        else:
+            try:
+                raw = bytes.fromhex(torrent_hash)
+            except (ValueError, TypeError):
+                return None
+        return raw if len(raw) in HASH_WIDTHS else None
+
+    def __len__(self):
+        return sum(len(data) // width for width, data in self._data.items())
+
+    def __contains__(self, torrent_hash):
+        raw = self._to_raw(torrent_hash)
+        if raw is None:
+            return False
+        width = len(raw)
+        data = self._data[width]
+        lo, hi = 0, len(data) // width
+        while lo < hi:
+            mid = (lo + hi) // 2
+            item = data[mid * width:(mid + 1) * width]
+            if item < raw:
+                lo = mid + 1
+            elif item > raw:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def __iter__(self):
+        for width, data in self._data.items():
+            for offset in range(0, len(data), width):
+                yield data[offset:offset + width].hex()
+
+    def to_bytes(self):
+        header = PACKED_MAGIC + bytes([PACKED_VERSION])
+        header += b"".join((len(self._data[w]) // w).to_bytes(4, "little") for w in HASH_WIDTHS)
+        return header + b"".join(self._data[w] for w in HASH_WIDTHS)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:4] != PACKED_MAGIC or data[4] != PACKED_VERSION:
+            raise ValueError("无效的哈希集合数据")
+        hash_set = cls.__new__(cls)
+        hash_set._data = {}
+        offset = 5 + 4 * len(HASH_WIDTHS)
+        for idx, width in enumerate(HASH_WIDTHS):
+            count = int.from_bytes(data[5 + idx * 4:9 + idx * 4], "little")
+            hash_set._data[width] = bytes(data[offset:offset + count * width])
+            offset += count * width
+        return hash_set
+
+    def to_base64(self):
+        return base64.b64encode(self.to_bytes()).decode("ascii")
+
+    @classmethod
+    def from_base64(cls, text):
+        return cls.from_bytes(base64.b64decode(text))
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+def build_targets(torrents_to_delete, match_by="name"):
+    """将种子列表转换为只读的目标集合（每次运行只构建一次，各线程共用）
+
+    match_by 为 "hash" 时返回 PackedHashSet，否则返回名称的 frozenset。
+    """
+    if match_by == "hash":
+        return PackedHashSet(
+            target.get("hash", "") for target in torrents_to_delete if isinstance(target, dict)
+        )
+    return frozenset(
+        target.get("name", "") if isinstance(target, dict) else target for target in torrents_to_delete
+    )
@@ -0,0 +1,87 @@
+import json
+import os
+import time
+
+# Tracker状态缓存文件
+TRACKER_CACHE_FILE = "cache/tracker_status.json"
+CACHE_VERSION = 1
+
+# 缓存条目状态
+STATUS_OK = "ok"            # Tracker正常
+STATUS_ERROR = "error"      # Tracker报错（非删种）
+STATUS_SUSPECT = "suspect"  # 疑似被站点删除，等待确认
+STATUS_DELETED = "deleted"  # 已确认被站点删除
+
+# 默认TTL（小时）
+DEFAULT_CACHE_SETTINGS = {
+    "enabled": True,
+    "healthy_ttl_hours": 24,
+    "error_ttl_hours": 1,
+    "reannounce": True,
+    "reannounce_wait": 10
+}
+
+def get_cache_settings(settings=None):
+    """合并用户配置与默认缓存配置"""
+    merged = dict(DEFAULT_CACHE_SETTINGS)
+    if isinstance(settings, dict):
+        merged.update(settings)
+    return merged
+
+def load_tracker_cache(cache_file=TRACKER_CACHE_FILE):
+    """读取Tracker状态缓存，文件不存在或损坏时返回空缓存"""
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return {"version": CACHE_VERSION, "servers": {}}
+        data.setdefault("servers", {})
+        return data
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"version": CACHE_VERSION, "servers": {}}
+
+def save_tracker_cache(cache, cache_file=TRACKER_CACHE_FILE):
+    """原子写入Tracker状态缓存"""
+    cache_dir = os.path.dirname(cache_file)
+    if cache_dir and not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_file, cache_file)
+
+def get_server_cache(cache, server_name):
+    """获取（必要时创建）单个服务器的缓存字典"""
+    return cache["servers"].setdefault(server_name, {})
+
+def needs_check(entry, settings, now=None):
+    """判断缓存条目是否需要重新查询Tracker
+
+    新种子、已过期条目以及疑似/已确认删除的条目都需要重新查询，
+    只有在TTL内的正常或报错条目可以直接跳过。
+    """
+    if not entry:
+        return True
+    status = entry.get("status")
+    if status in (STATUS_SUSPECT, STATUS_DELETED):
+        return True
+    now = now if now is not None else time.time()
+    if status == STATUS_OK:
+        ttl = settings["healthy_ttl_hours"] * 3600
+    else:
+        ttl = settings["error_ttl_hours"] * 3600
+    return now - entry.get("checked", 0) >= ttl
+
+def update_entry(server_cache, torrent_hash, status, msg, now=None):
+    """写入单个种子的最新Tracker状态"""
+    server_cache[torrent_hash] = {
+        "status": status,
+        "msg": msg,
+        "checked": now if now is not None else time.time()
+    }
+
+def prune_server_cache(server_cache, current_hashes):
+    """移除服务器上已不存在的种子条目"""
+    for torrent_hash in list(server_cache):
+        if torrent_hash not in current_hashes:
+            del server_cache[torrent_hash]
@@ -0,0 +1,232 @@
+import json
+import re
+import sys
+import time
+from urllib.parse import urlsplit
+
+# Tracker消息分类
+CATEGORY_UNREGISTERED = "unregistered"  # 种子已被站点删除/未注册
+CATEGORY_BANNED = "banned"              # 账号或客户端被禁止
+CATEGORY_TRANSIENT = "transient"        # 临时错误（超时、维护等）
+
+# 按优先级排列，同一条消息命中多个分类时取靠前的分类
+CATEGORIES = [CATEGORY_UNREGISTERED, CATEGORY_BANNED, CATEGORY_TRANSIENT]
+
+# 默认规则，可在 config.json 的 tracker_rules 中追加或按Tracker主机覆盖
+DEFAULT_TRACKER_RULES = {
+    "default": {
+        CATEGORY_UNREGISTERED: [
+            "torrent not found",
+            "torrent not exists",
+            "torrent does not exist",
+            "torrent not registered",
+            "unregistered torrent",
+            "not registered with this tracker",
+            "infohash not found",
+            "info_hash not found",
+            "torrent has been deleted",
+            "torrent has been nuked",
+            "torrent is deleted",
+            "torrent was removed",
+            "trumped",
+            "种子不存在",
+            "种子已被删除",
+            "种子已删除",
+            "该种子已被删除",
+            "種子不存在",
+            "未注册的种子",
+            "torrent nicht gefunden",
+            "torrent non trouvé"
+        ],
+        CATEGORY_BANNED: [
+            "banned",
+            "client is not allowed",
+            "client not allowed",
+            "client blacklisted",
+            "invalid passkey",
+            "passkey not found",
+            "account disabled",
+            "account is disabled",
+            "用户被禁止",
+            "账号已被禁用",
+            "客户端不被允许",
+            "客户端被禁止"
+        ],
+        CATEGORY_TRANSIENT: [
+            "timed out",
+            "timeout",
+            "connection refused",
+            "service unavailable",
+            "bad gateway",
+            "internal server error",
+            "too many requests",
+            "try again",
+            "maintenance",
+            "服务器维护",
+            "请求超时",
+            "稍后再试"
+        ]
+    },
+    "hosts": {}
+}
+
+# 单个Tracker分类器中缓存的消息数量上限
+MEMO_LIMIT = 100000
+
+# 以英文字母或数字开头/结尾的关键字只按整词匹配，例如 "banned" 不匹配 "unbanned"；
+# 中文等其他文字的关键字没有词边界，仍按子串匹配
+_WORD_CHAR = re.compile(r"[a-z0-9_]")
+
+_PRIORITY = {category: index for index, category in enumerate(CATEGORIES)}
+
+def _trie_pattern(keywords):
+    """把关键字合并为字典树形式的正则表达式
+
+    每个位置只需比较一次首字符，比逐个尝试关键字的多选分支快得多。
+    词首边界写在首字符之后（(?<![a-z0-9_]x)），正则引擎仍可按首字符集合快速跳过不可能匹配的位置。
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node, last_char, top=False):
+        branches = []
+        for char, child in sorted(node.items()):
+            if not char:
+                continue
+            head = re.escape(char)
+            if top and _WORD_CHAR.match(char):
+                head += f"(?<![a-z0-9_]{re.escape(char)})"
+            branches.append(head + build(child, char))
+        if "" in node:
+            # 关键字在此结束；放在最后，优先匹配更长的关键字
+            branches.append("(?![a-z0-9_])" if _WORD_CHAR.match(last_char) else "")
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    return build(trie, "", top=True)
+
+def _compile_rules(rules):
+    """将 {分类: [关键字...]} 编译为 (正则表达式, {关键字: 分类}, {分类: 只含更高优先级关键字的正则表达式})
+
+    同一关键字出现在多个分类中时归入优先级最高的分类。
+    """
+    categories = {}
+    for category in CATEGORIES:
+        for keyword in rules.get(category) or []:
+            if keyword:
+                categories.setdefault(keyword.lower(), category)
+    if not categories:
+        return None
+    higher = {}
+    for category in CATEGORIES:
+        keywords = [keyword for keyword, found in categories.items() if _PRIORITY[found] < _PRIORITY[category]]
+        higher[category] = re.compile(_trie_pattern(keywords)) if keywords else None
+    return re.compile(_trie_pattern(categories)), categories, higher
+
+def _classify_text(rules, text):
+    """命中多个分类时取优先级最高的分类，而不是消息中最靠前的关键字
+
+    大多数消息不命中或只命中一个分类，只需一次搜索；命中较低优先级的分类时，
+    再用只含更高优先级关键字的正则表达式搜索一次。
+    """
+    pattern, categories, higher = rules
+    match = pattern.search(text)
+    category = None
+    while match:
+        category = categories[match.group()]
+        pattern = higher[category]
+        match = pattern.search(text) if pattern is not None else None
+    return category
+
+def _merge_rules(base, extra):
+    merged = {category: list(base.get(category, [])) for category in CATEGORIES}
+    for category in CATEGORIES:
+        merged[category].extend(extra.get(category, []))
+    return merged
+
+class TrackerClassifier:
+    """按Tracker主机预编译的消息分类器"""
+
+    def __init__(self, rules=None):
+        rules = rules if isinstance(rules, dict) else {}
+        default_rules = _merge_rules(DEFAULT_TRACKER_RULES["default"], rules.get("default", {}))
+        self._default = _compile_rules(default_rules)
+        # 主机专用规则叠加在默认规则之上；按主机名从长到短排列，后缀匹配时取最具体的主机
+        self._hosts = {
+            host.lower(): _compile_rules(_merge_rules(default_rules, host_rules))
+            for host, host_rules in sorted(rules.get("hosts", {}).items(), key=lambda item: len(item[0]), reverse=True)
+        }
+        self._host_lookup = {}
+        self._memo = {}
+
+    def _pattern_for_host(self, host):
+        pattern = self._host_lookup.get(host)
+        if pattern is None:
+            pattern = self._default
+            # 支持后缀匹配，例如 example.org 匹配 tracker.example.org（同时配置了 tracker.example.org 时优先使用后者）
+            for configured, host_pattern in self._hosts.items():
+                if host == configured or host.endswith("." + configured):
+                    pattern = host_pattern
+                    break
+            self._host_lookup[host] = pattern
+        return pattern
+
+    def classify(self, msg, host=""):
+        """返回消息所属的分类，未命中时返回 None"""
+        if not msg:
+            return None
+        key = (host, msg)
+        if key in self._memo:
+            return self._memo[key]
+        rules = self._pattern_for_host(host)
+        category = _classify_text(rules, msg.lower()) if rules is not None else None
+        if len(self._memo) >= MEMO_LIMIT:
+            self._memo.clear()
+        self._memo[key] = category
+        return category
+
+    def classify_tracker(self, tracker):
+        """对 torrents_trackers 返回的单个Tracker进行分类"""
+        host = urlsplit(tracker.get("url", "")).hostname or ""
+        return self.classify(tracker.get("msg", ""), host)
+
+def run_corpus(corpus_file, rules=None):
+    """使用测试语料验证分类结果并测量速度，返回未通过的条目数"""
+    with open(corpus_file, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    classifier = TrackerClassifier(rules)
+    failures = 0
+    for case in corpus:
+        result = classifier.classify(case["msg"], case.get("host", ""))
+        if result != case.get("category"):
+            failures += 1
+            print(f"不匹配: {case['msg']!r} (主机: {case.get('host', '')}) 期望 {case.get('category')}，实际 {result}")
+
+    print(f"共 {len(corpus)} 条语料，{failures} 条不匹配")
+
+    # 不重复的消息（未命中缓存）和重复的消息（实际运行中大多数Tracker返回相同的几种消息）分别测速
+    rounds = 200000 // len(corpus) + 1
+    for title, messages in (
+        ("不同消息", [f"{case['msg']} #{i}" for i in range(rounds) for case in corpus]),
+        ("重复消息", [case["msg"] for case in corpus] * rounds)
+    ):
+        classifier = TrackerClassifier(rules)
+        start = time.perf_counter()
+        for msg in messages:
+            classifier.classify(msg, "tracker.example.org")
+        elapsed = time.perf_counter() - start
+        print(f"分类 {len(messages)} 条{title}耗时 {elapsed:.3f} 秒，约每百万条 {elapsed / len(messages) * 1e6:.2f} 秒")
+    return failures
+
+if __name__ == "__main__":
+    corpus_path = sys.argv[1] if len(sys.argv) > 1 else "tracker_messages_corpus.json"
+    rules = None
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            rules = json.load(f).get("tracker_rules")
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    sys.exit(1 if run_corpus(corpus_path, rules) else 0)
@@ -0,0 +1,239 @@
+import startup_timer
+import json
+import argparse
+import sys
+import io
+import codecs
+import threading
+import time
+from qb_client import connect, ServerUnavailable
+from check_local_torrents import get_source_servers, is_target_torrent
+
+DEFAULT_WATCH_SETTINGS = {
+    "interval": 2,         # 每个服务器两次 sync/maindata 请求的间隔（秒）
+    "batch_seconds": 5,    # 发现变化后等待多久再统一处理，合并短时间内的连续变化
+    "retry_seconds": 60    # 连接断开后重新连接的等待时间（秒）
+}
+
+# 从 maindata 中跟踪的种子字段，其余字段（速度、做种数等）的变化忽略
+WATCH_FIELDS = ("name", "tracker", "tags", "category", "progress")
+
+# 设置控制台输出编码为UTF-8
+if sys.platform.startswith('win'):
+    try:
+        import codecs
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer)
+    except (AttributeError, io.UnsupportedOperation):
+        pass
+
+def get_watch_settings(settings=None):
+    """合并用户配置与默认监视配置"""
+    merged = dict(DEFAULT_WATCH_SETTINGS)
+    if isinstance(settings, dict):
+        merged.update(settings)
+    return merged
+
+def load_config():
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            config = json.load(f)
+            if not isinstance(config, dict):
+                raise ValueError("配置文件格式错误：根对象必须是字典类型")
+            return config
+    except json.JSONDecodeError as e:
+        raise ValueError(f"配置文件JSON格式错误: {str(e)}")
+    except FileNotFoundError:
+        raise FileNotFoundError("找不到配置文件 config.json")
+
+class ServerWatcher:
+    """通过 sync/maindata 增量数据跟踪单个服务器上的种子
+
+    qBittorrent 只返回上次请求（rid）之后发生变化的字段，没有变化时响应只有 rid，
+    因此轮询的开销几乎为零。第一次的完整数据作为基准，之后：
+    - Tracker 从可用变为不可用（tracker 字段变为空）的种子交给站点删种检查
+    - 来源服务器上新变为待迁移条件（进度为0、带指定标签/分类）的种子交给远程删除
+    """
+
+    def __init__(self, name, server_config, on_change, settings, stop_event, check_site=True, source=None):
+        self.name = name
+        self.server_config = server_config
+        self.on_change = on_change
+        self.settings = settings
+        self.stop_event = stop_event
+        self.check_site = check_site
+        self.source = source
+        self.rid = 0
+        self.torrents = {}
+        self.ready = False
+
+    def is_target(self, entry):
+        return self.source is not None and is_target_torrent(entry.get("progress"), entry.get("tags"),
+                                                             entry.get("category"), self.source)
+
+    def apply(self, data):
+        """合并一次 maindata 增量，返回 (Tracker 失效的 hash 集合, 新的待迁移 hash 集合)"""
+        previous = self.torrents
+        if data.get("full_update"):
+            # 完整数据（首次请求或服务器重置了 rid）：与之前的状态比较，没有出现的种子已被删除
+            self.torrents = {}
+        else:
+            self.torrents = previous
+            for torrent_hash in data.get("torrents_removed") or []:
+                self.torrents.pop(torrent_hash, None)
+
+        tracker_lost = set()
+        new_targets = set()
+        for torrent_hash, delta in (data.get("torrents") or {}).items():
+            old = previous.get(torrent_hash)
+            entry = dict(old) if old else {}
+            entry.update((field, delta[field]) for field in WATCH_FIELDS if field in delta)
+            self.torrents[torrent_hash] = entry
+            if not self.ready:
+                continue
+            if self.check_site and old and old.get("tracker") and not entry.get("tracker"):
+                tracker_lost.add(torrent_hash)
+            if self.is_target(entry) and not (old and self.is_target(old)):
+                new_targets.add(torrent_hash)
+        self.ready = True
+        return tracker_lost, new_targets
+
+    def run(self):
+        qb = None
+        while not self.stop_event.is_set():
+            try:
+                if qb is None:
+                    qb = connect(self.server_config)
+                    print(f"正在监视服务器 {self.name}")
+                data = qb.sync_maindata(rid=self.rid)
+                self.rid = data.get("rid", 0)
+                tracker_lost, new_targets = self.apply(data)
+                if tracker_lost or new_targets:
+                    self.on_change(self, tracker_lost, new_targets)
+                wait = self.settings["interval"]
+            except ServerUnavailable as e:
+                print(f"{str(e)}，{self.settings['retry_seconds']} 秒后重试")
+                wait = self.settings["retry_seconds"]
+            except Exception as e:
+                print(f"监视服务器 {self.name} 时发生错误: {str(e)}，{self.settings['retry_seconds']} 秒后重新连接")
+                # 重新登录后服务器会返回完整数据，与已有状态比较，不会遗漏断开期间的变化
+                qb = None
+                self.rid = 0
+                wait = self.settings["retry_seconds"]
+            self.stop_event.wait(wait)
+
+def get_watched_servers(config):
+    """返回需要监视的服务器：[(名称, 服务器配置, 是否检查站点删种, 来源配置)]
+
+    本地服务器和所有远程服务器检查站点删种；来源服务器（source_servers，未配置时为本地服务器）
+    同时检查新的待迁移种子。只读取 BT_backup 或只通过代理访问的服务器无法监视。
+    """
+    servers = []
+    by_url = {}
+    if config.get("local_server", {}).get("url"):
+        servers.append(["本地服务器", dict(config["local_server"], name="本地服务器"), True, None])
+    for server in config.get("remote_servers", []):
+        if server.get("url") and not server.get("agent_url"):
+            servers.append([server["name"], server, True, None])
+    for entry in servers:
+        by_url[entry[1]["url"]] = entry
+    for source in get_source_servers(config):
+        if not source.get("url"):
+            continue
+        entry = by_url.get(source["url"])
+        if entry is None:
+            entry = [source["name"], source, False, None]
+            servers.append(entry)
+            by_url[source["url"]] = entry
+        entry[3] = source
+    return [tuple(entry) for entry in servers]
+
+def handle_changes(config, tracker_lost, new_targets, delete):
+    """把发生变化的种子交给已有的检查/删除流程"""
+    if new_targets:
+        from check_local_torrents import check_local_torrents
+        from delete_remote_torrents import delete_remote_torrents
+        hashes = set().union(*new_targets.values())
+        print(f"\n发现 {len(hashes)} 个新的待迁移种子（{', '.join(new_targets)}）")
+        # 重新扫描发生变化的来源（其余来源使用缓存），更新种子列表文件后只处理新的种子
+        if check_local_torrents(refresh=list(new_targets)):
+            delete_remote_torrents(debug_mode=not delete, selected_hashes=hashes)
+
+    if tracker_lost:
+        from check_deleted_torrents import check_deleted_torrents
+        print(f"\n发现 {sum(len(hashes) for hashes in tracker_lost.values())} 个Tracker状态发生变化的种子"
+              f"（{', '.join(tracker_lost)}）")
+        check_deleted_torrents(config["local_server"],
+                               ["local" if name == "本地服务器" else name for name in tracker_lost],
+                               config.get("remote_servers", []), config.get("tracker_cache"),
+                               tracker_rules=config.get("tracker_rules"),
+                               output_format=config.get("output_format", "json"),
+                               delete_confirmed=delete,
+                               throttle_settings=config.get("delete_throttle"),
+                               keep_shared_payload=config.get("keep_shared_payload", False),
+                               pipeline_settings=config.get("pipeline"),
+                               hashes=tracker_lost)
+
+def watch(delete=False, settings=None):
+    """监视所有服务器，种子状态发生变化时只处理变化的种子，直到按 Ctrl+C 退出
+
+    delete 为 False 时站点删除的种子只打标签、远程种子只检查不删除（与调试模式相同）。
+    """
+    config = load_config()
+    settings = get_watch_settings(settings if settings is not None else config.get("watch"))
+    stop_event = threading.Event()
+    lock = threading.Lock()
+    pending = {"tracker_lost": {}, "new_targets": {}, "since": None}
+
+    def on_change(watcher, tracker_lost, new_targets):
+        with lock:
+            for torrent_hash in tracker_lost | new_targets:
+                reason = "Tracker不可用" if torrent_hash in tracker_lost else "新的待迁移种子"
+                print(f"[{watcher.name}] {watcher.torrents[torrent_hash].get('name', torrent_hash)}: {reason}")
+            # 站点删种按服务器名称、待迁移种子按来源名称记录
+            if tracker_lost:
+                pending["tracker_lost"].setdefault(watcher.name, set()).update(tracker_lost)
+            if new_targets:
+                pending["new_targets"].setdefault(watcher.source["name"], set()).update(new_targets)
+            if pending["since"] is None:
+                pending["since"] = time.monotonic()
+
+    servers = get_watched_servers(config)
+    if not servers:
+        print("没有可以监视的服务器（需要配置 WebUI 地址）")
+        return
+    threads = []
+    for name, server_config, check_site, source in servers:
+        watcher = ServerWatcher(name, server_config, on_change, settings, stop_event, check_site, source)
+        thread = threading.Thread(target=watcher.run, name=f"watch-{name}", daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    print(f"监视模式已启动（{len(servers)} 个服务器），按 Ctrl+C 退出")
+    try:
+        while True:
+            time.sleep(0.5)
+            with lock:
+                if pending["since"] is None or time.monotonic() - pending["since"] < settings["batch_seconds"]:
+                    continue
+                tracker_lost, new_targets = pending["tracker_lost"], pending["new_targets"]
+                pending.update(tracker_lost={}, new_targets={}, since=None)
+            # 处理期间各服务器继续监视，新的变化在处理完成后再处理
+            handle_changes(config, tracker_lost, new_targets, delete)
+            print("\n继续监视...")
+    except KeyboardInterrupt:
+        print("\n正在退出监视模式...")
+    finally:
+        stop_event.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='监视服务器的种子变化，只处理发生变化的种子')
+    parser.add_argument('--delete', action='store_true',
+                        help='直接删除确认被站点删除的种子和对应的远程种子（默认只打标签/只检查）')
+    args = parser.parse_args()
+
+    try:
+        watch(delete=args.delete)
+    except Exception as e:
+        print(f"程序执行过程中发生错误: {str(e)}")
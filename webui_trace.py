@@ -0,0 +1,372 @@
+import json
+import argparse
+import base64
+import builtins
+import datetime
+import gzip
+import os
+import re
+import runpy
+import sys
+import threading
+import time
+import io
+import codecs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+TRACE_VERSION = 1
+
+# 回放服务器的起始端口，每个录制的服务器占用一个端口
+DEFAULT_REPLAY_PORT = 18080
+
+# 录制时不发送到服务器、直接返回成功的接口（只检查模式下的额外保护）
+STUB_PATHS = ("/api/v2/torrents/delete",)
+
+# 可以录制的脚本及录制时强制只检查不删除的参数：(需要添加的参数, 需要去掉的参数)
+# 只检查模式下不会通过代理删除、不会加入延迟删除队列，也不会写入删除记录和删除历史
+RECORD_DRY_RUN = {
+    "check_local_torrents.py": ((), ()),
+    "fleet_stats.py": ((), ()),
+    "delete_remote_torrents.py": (("--debug",), ()),
+    "free_space.py": (("--debug",), ()),
+    "check_deleted_torrents.py": ((), ("--delete",)),
+    "watch.py": ((), ("--delete",)),
+    "orphan_scan.py": ((), ("--delete",))
+}
+
+# 请求参数中需要隐藏的字段
+SECRET_PARAMS = {"username", "password"}
+
+# 响应内容中的 Tracker 密钥（passkey 等查询参数，以及 /<密钥>/announce 形式的路径）
+SECRET_PATTERNS = [
+    (re.compile(r"(?i)((?:passkey|authkey|torrent_pass|apikey|secure|token|pk|key)(?:=|%3D))[A-Za-z0-9_\-.]+"),
+     r"\1***"),
+    # 路径中的密钥，包括 magnet_uri 里 URL 编码（%2F）和 JSON 转义（\\/）的形式
+    (re.compile(r"(?i)(/|%2F|\\/)[A-Za-z0-9]{16,}(/|%2F|\\/)announce"), r"\1***\2announce")
+]
+
+# 设置控制台输出编码为UTF-8
+if sys.platform.startswith('win'):
+    try:
+        import codecs
+        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer)
+    except (AttributeError, io.UnsupportedOperation):
+        pass
+
+def scrub_text(text):
+    for pattern, replacement in SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+def scrub_params(params):
+    return [[key, "***" if key in SECRET_PARAMS else scrub_text(value)] for key, value in params]
+
+def base_url(url):
+    """去掉路径和用户信息，只保留 scheme://host:port"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.hostname}" + (f":{parts.port}" if parts.port else "")
+
+def request_params(method, url, body, content_type):
+    """请求的查询参数和表单参数（multipart 上传的内容不记录）"""
+    params = parse_qsl(urlsplit(url).query, keep_blank_values=True)
+    if body and "application/x-www-form-urlencoded" in (content_type or ""):
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", "replace")
+        params += parse_qsl(body, keep_blank_values=True)
+    return params
+
+def exchange_key(method, path, params):
+    """回放时匹配请求的键：方法、路径和排序后的参数（隐藏的字段不参与匹配）"""
+    return json.dumps([method.upper(), path, sorted([key, value] for key, value in params
+                                                    if key not in SECRET_PARAMS)], ensure_ascii=False)
+
+class TraceRecorder:
+    """录制 WebUI 请求与响应到 gzip 压缩的 JSON Lines 文件
+
+    第一行为文件头（各服务器的地址），之后每行一次请求：服务器编号、开始时间、耗时、
+    方法、路径、参数、状态码、Content-Type 和响应内容。用户名、密码、会话 Cookie 以及
+    Tracker 地址中的密钥会被隐藏。录制以只检查模式运行，万一仍有删除请求也不会发送到服务器，
+    直接返回成功并标记 stub。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        trace_dir = os.path.dirname(path)
+        if trace_dir and not os.path.exists(trace_dir):
+            os.makedirs(trace_dir)
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._servers = {}
+        self._started = time.perf_counter()
+        self.count = 0
+        self._write({"version": TRACE_VERSION,
+                     "recorded": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def _server_id(self, url):
+        base = base_url(url)
+        server_id = self._servers.get(base)
+        if server_id is None:
+            server_id = self._servers[base] = len(self._servers)
+            self._write({"server": server_id, "url": base})
+        return server_id
+
+    def record(self, request, response, started, duration, stub=False):
+        params = request_params(request.method, request.url, request.body, request.headers.get("Content-Type"))
+        content_type = response.headers.get("Content-Type", "")
+        entry = {
+            "t": round(started - self._started, 4),
+            "d": round(duration, 4),
+            "m": request.method,
+            "p": urlsplit(request.url).path,
+            "q": scrub_params(params),
+            "s": response.status_code,
+            "ct": content_type
+        }
+        if stub:
+            entry["stub"] = True
+        if "Set-Cookie" in response.headers:
+            entry["cookie"] = True
+        try:
+            entry["b"] = scrub_text(response.content.decode("utf-8"))
+        except UnicodeDecodeError:
+            entry["b64"] = base64.b64encode(response.content).decode("ascii")
+        with self._lock:
+            entry["srv"] = self._server_id(request.url)
+            self._write(entry)
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def _stub_response(request):
+    from requests import Response
+    from requests.structures import CaseInsensitiveDict
+    response = Response()
+    response.status_code = 200
+    response._content = b""
+    response.headers = CaseInsensitiveDict({"Content-Type": "text/plain; charset=UTF-8"})
+    response.encoding = "utf-8"
+    response.url = request.url
+    response.request = request
+    return response
+
+def patch_transport(send):
+    """替换 requests 的底层发送函数（qbittorrentapi 的所有请求都经过这里），返回原函数"""
+    from requests.adapters import HTTPAdapter
+    original = HTTPAdapter.send
+
+    def patched(adapter, request, **kwargs):
+        return send(original, adapter, request, **kwargs)
+
+    HTTPAdapter.send = patched
+    return original
+
+def restore_transport(original):
+    from requests.adapters import HTTPAdapter
+    HTTPAdapter.send = original
+
+def run_script(command):
+    """以 __main__ 方式运行 command[0] 脚本，其余为命令行参数，返回耗时（秒）"""
+    script = command[0]
+    sys.argv = command
+    started = time.perf_counter()
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit:
+        pass
+    return time.perf_counter() - started
+
+def dry_run_command(command):
+    """返回强制只检查不删除的命令行，不支持录制的脚本抛出 ValueError"""
+    script = os.path.basename(command[0])
+    if script not in RECORD_DRY_RUN:
+        raise ValueError(f"不支持录制 {script}，可以录制: {', '.join(RECORD_DRY_RUN)}")
+    add, remove = RECORD_DRY_RUN[script]
+    args = [arg for arg in command[1:] if arg not in remove]
+    args += [arg for arg in add if arg not in args]
+    changed = ([f"去掉 {arg}" for arg in command[1:] if arg in remove]
+               + [f"添加 {arg}" for arg in add if arg not in command[1:]])
+    if changed:
+        print(f"录制时只检查不删除，已{'、'.join(changed)}")
+    return [command[0]] + args
+
+def _decline_input(prompt=""):
+    print(f"{prompt}n（录制时不执行删除）")
+    return "n"
+
+def record(trace_file, command):
+    """以只检查模式运行 command，录制期间的所有 WebUI 请求"""
+    command = dry_run_command(command)
+    recorder = TraceRecorder(trace_file)
+
+    def send(original, adapter, request, **kwargs):
+        started = time.perf_counter()
+        stub = urlsplit(request.url).path in STUB_PATHS
+        response = _stub_response(request) if stub else original(adapter, request, **kwargs)
+        recorder.record(request, response, started, time.perf_counter() - started, stub)
+        return response
+
+    original = patch_transport(send)
+    # 脚本询问是否删除时一律回答否
+    original_input = builtins.input
+    builtins.input = _decline_input
+    try:
+        elapsed = run_script(command)
+    finally:
+        builtins.input = original_input
+        restore_transport(original)
+        recorder.close()
+    print(f"\n已录制 {recorder.count} 个请求（耗时 {elapsed:.1f} 秒）至: {trace_file}")
+
+def load_trace(trace_file):
+    """读取录制文件，返回 ({服务器编号: 地址}, {服务器编号: {请求键: [响应, ...]}})"""
+    servers = {}
+    exchanges = {}
+    with gzip.open(trace_file, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != TRACE_VERSION:
+            raise ValueError(f"不支持的录制文件版本: {header.get('version')}")
+        for line in f:
+            entry = json.loads(line)
+            if "url" in entry:
+                servers[entry["server"]] = entry["url"]
+                continue
+            key = exchange_key(entry["m"], entry["p"], entry["q"])
+            exchanges.setdefault(entry["srv"], {}).setdefault(key, []).append(entry)
+    return servers, exchanges
+
+class ReplayState:
+    """单个服务器的回放状态：相同的请求按录制顺序依次返回，用完后重复最后一个"""
+
+    def __init__(self, exchanges, speed):
+        self.exchanges = exchanges
+        self.speed = speed
+        self.positions = {}
+        self.lock = threading.Lock()
+        self.served = 0
+        self.missed = 0
+
+    def next(self, key):
+        with self.lock:
+            entries = self.exchanges.get(key)
+            if not entries:
+                self.missed += 1
+                return None
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+            self.served += 1
+            return entries[min(position, len(entries) - 1)]
+
+def make_replay_handler(state):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _handle(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length) if length else b""
+            params = request_params(self.command, self.path, body, self.headers.get("Content-Type"))
+            entry = state.next(exchange_key(self.command, urlsplit(self.path).path, params))
+            if entry is None:
+                payload = b"Not Found"
+                self.send_response(404)
+                self.send_header("Content-Type", "text/plain")
+            else:
+                # 按录制时的耗时（除以回放速度）返回
+                time.sleep(entry["d"] / state.speed)
+                payload = base64.b64decode(entry["b64"]) if "b64" in entry else entry["b"].encode("utf-8")
+                self.send_response(entry["s"])
+                if entry["ct"]:
+                    self.send_header("Content-Type", entry["ct"])
+                if entry.get("cookie"):
+                    self.send_header("Set-Cookie", "SID=replay; HttpOnly; path=/")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = _handle
+        do_POST = _handle
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReplayHandler
+
+def replay(trace_file, speed=1.0, port=DEFAULT_REPLAY_PORT, command=None):
+    """在本地回放录制的请求
+
+    每个录制的服务器在 port 起的连续端口上提供服务。指定 command 时运行该脚本，
+    并把发往原服务器地址的请求转到对应的回放端口，结束后输出耗时；否则一直运行到按 Ctrl+C。
+    """
+    servers, exchanges = load_trace(trace_file)
+    states = {}
+    http_servers = []
+    redirects = {}
+    for offset, (server_id, url) in enumerate(sorted(servers.items())):
+        states[server_id] = ReplayState(exchanges.get(server_id, {}), speed)
+        http_server = ThreadingHTTPServer(("127.0.0.1", port + offset), make_replay_handler(states[server_id]))
+        threading.Thread(target=http_server.serve_forever, daemon=True).start()
+        http_servers.append(http_server)
+        redirects[url] = f"http://127.0.0.1:{port + offset}"
+        print(f"回放 {url} -> {redirects[url]}")
+
+    try:
+        if command:
+            def send(original, adapter, request, **kwargs):
+                base = base_url(request.url)
+                if base in redirects:
+                    request.url = redirects[base] + request.url[len(base):]
+                return original(adapter, request, **kwargs)
+
+            original = patch_transport(send)
+            try:
+                elapsed = run_script(command)
+            finally:
+                restore_transport(original)
+            served = sum(state.served for state in states.values())
+            missed = sum(state.missed for state in states.values())
+            print(f"\n回放完成（速度 x{speed:g}）：耗时 {elapsed:.2f} 秒，{served} 个请求，{missed} 个请求未录制")
+        else:
+            print("回放服务器已启动，按 Ctrl+C 退出")
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for http_server in http_servers:
+            http_server.shutdown()
+            http_server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='录制和回放 WebUI 请求，用真实负载离线测试性能',
+                                     epilog='要运行的脚本（.py）及其参数放在最后，例如: '
+                                            'webui_trace.py replay trace.jsonl.gz --speed 4 check_deleted_torrents.py')
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    record_parser = subparsers.add_parser("record", help='以只检查模式运行脚本并录制其 WebUI 请求')
+    record_parser.add_argument("trace", help='录制文件，例如 logs/trace.jsonl.gz')
+
+    replay_parser = subparsers.add_parser("replay", help='在本地回放录制的请求')
+    replay_parser.add_argument("trace", help='录制文件')
+    replay_parser.add_argument("--speed", type=float, default=1.0, help='回放速度倍数（默认按原始耗时）')
+    replay_parser.add_argument("--port", "-p", type=int, default=DEFAULT_REPLAY_PORT, help='起始端口')
+
+    # 第一个 .py 参数及其后的内容是要运行的脚本和它自己的参数
+    argv = sys.argv[1:]
+    split = next((i for i, arg in enumerate(argv) if arg.endswith(".py")), len(argv))
+    args = parser.parse_args(argv[:split])
+    command = argv[split:]
+
+    try:
+        if args.action == "record":
+            if not command:
+                parser.error("请指定要运行的脚本")
+            record(args.trace, command)
+        else:
+            replay(args.trace, args.speed, args.port, command)
+    except Exception as e:
+        print(f"程序执行过程中发生错误: {str(e)}")